@@ -1,12 +1,70 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS  # Allows frontend to call backend
+from flask_migrate import Migrate
+import contextlib
+import json
 import os
-from utils.geocoding import geocode_address
-from utils.routing import calculate_midpoint
+from models import db
+from utils import metrics, resilience
+from utils.group_midpoint import OBJECTIVES, find_group_meeting_points
+from utils.isochrone import find_meeting_region, find_region_pois
+from utils.pipeline import compute_pair_midpoint, dedupe_pairs, geocode_locations, iter_batch_midpoints
 
 app = Flask(__name__)
 CORS(app)  # Enable Cross-Origin Resource Sharing
 
+# Database (routes, meeting points, POIs and the persistent geocoding cache)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///meet_me_halfway.db')
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+db.init_app(app)
+migrate = Migrate(app, db)
+
+# Upper bound on location pairs accepted by /api/midpoint/batch
+BATCH_MAX_PAIRS = 1000
+
+# Upper bound on participants for /api/meeting-points (one travel-time matrix request)
+GROUP_MAX_LOCATIONS = 25
+# Upper bound on the meeting points returned by /api/meeting-points
+GROUP_MAX_MEETING_POINTS = 20
+
+@app.before_request
+def start_request_trace():
+    # Opt-in per-request trace: ?trace=1 or an X-Trace: 1 header
+    if request.args.get('trace') == '1' or request.headers.get('X-Trace') == '1':
+        g.trace = metrics.start_trace(f"{request.method} {request.path}")
+
+@app.before_request
+def start_request_deadline():
+    # Upstream calls made for this request share one latency budget; batch requests
+    # stream for as long as they need and give every pair a budget of its own instead
+    if request.endpoint != 'midpoint_batch':
+        g.budget = resilience.start_deadline(resilience.REQUEST_SLO_SECONDS)
+
+@app.after_request
+def finish_request_trace(response):
+    trace = g.pop('trace', None)
+    if trace is not None:
+        metrics.finish_trace(trace)
+        response.headers['X-Trace-Id'] = trace.id
+    return response
+
+@app.teardown_request
+def finish_request_deadline(exc):
+    budget = g.pop('budget', None)
+    if budget is not None:
+        resilience.finish_deadline(budget)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/traces/<trace_id>', methods=['GET'])
+def request_trace(trace_id):
+    trace = metrics.get_trace(trace_id)
+    if trace is None:
+        return jsonify({'error': 'Unknown trace'}), 404
+    return jsonify(trace)
+
 @app.route('/api/midpoint', methods=['POST'])
 def midpoint():
     data = request.json
@@ -16,15 +74,120 @@ def midpoint():
     if not location1 or not location2:
         return jsonify({'error': 'Missing locations'}), 400
 
-    coords1 = geocode_address(location1)
-    coords2 = geocode_address(location2)
+    coords1, coords2 = geocode_locations(location1, location2)
 
     if not coords1 or not coords2:
         return jsonify({'error': 'Invalid locations'}), 400
 
-    midpoint = calculate_midpoint(coords1, coords2)
+    midpoint = compute_pair_midpoint(coords1, coords2)
     
     return jsonify({'midpoint': midpoint})
 
+@app.route('/api/midpoint/batch', methods=['POST'])
+def midpoint_batch():
+    """
+    Midpoints for many location pairs, streamed back as NDJSON (one line per pair, in
+    completion order) with identical addresses and pairs resolved only once
+    """
+    data = request.json or {}
+    pairs = data.get('pairs')
+
+    if not isinstance(pairs, list) or not pairs:
+        return jsonify({'error': 'Missing pairs'}), 400
+    if len(pairs) > BATCH_MAX_PAIRS:
+        return jsonify({'error': f'At most {BATCH_MAX_PAIRS} pairs are supported'}), 400
+
+    locations = []
+    for pair in pairs:
+        if isinstance(pair, dict):
+            pair = (pair.get('location1'), pair.get('location2'))
+        if not isinstance(pair, (list, tuple)) or len(pair) != 2 or not all(isinstance(loc, str) and loc.strip() for loc in pair):
+            return jsonify({'error': 'Each pair needs location1 and location2'}), 400
+        locations.append(tuple(pair))
+
+    addresses, unique_pairs = dedupe_pairs(locations)
+
+    def generate():
+        # Closed as soon as the client disconnects, so the batch stops scheduling work
+        with contextlib.closing(iter_batch_midpoints(addresses, unique_pairs)) as results:
+            for result in results:
+                for index in result['indices']:
+                    line = {
+                        'index': index,
+                        'location1': locations[index][0],
+                        'location2': locations[index][1],
+                        'midpoint': result['midpoint']
+                    }
+                    if result['error']:
+                        line['error'] = result['error']
+                    yield json.dumps(line) + '\n'
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.headers['X-Unique-Addresses'] = str(len(addresses))
+    response.headers['X-Unique-Pairs'] = str(len(unique_pairs))
+    return response
+
+@app.route('/api/meeting-points', methods=['POST'])
+def group_meeting_points():
+    data = request.json or {}
+    locations = data.get('locations')
+    objective = data.get('objective', 'minmax')
+
+    if not isinstance(locations, list) or len(locations) < 2:
+        return jsonify({'error': 'At least two locations are required'}), 400
+    if len(locations) > GROUP_MAX_LOCATIONS:
+        return jsonify({'error': f'At most {GROUP_MAX_LOCATIONS} locations are supported'}), 400
+    if not all(isinstance(location, str) and location.strip() for location in locations):
+        return jsonify({'error': 'Each location must be a non-empty string'}), 400
+    if objective not in OBJECTIVES:
+        return jsonify({'error': f"objective must be one of {', '.join(OBJECTIVES)}"}), 400
+    try:
+        k = int(data.get('k', 5))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'k must be an integer'}), 400
+
+    coords = geocode_locations(*locations)
+    invalid = [location for location, point in zip(locations, coords) if not point]
+    if invalid:
+        return jsonify({'error': 'Invalid locations', 'locations': invalid}), 400
+
+    k = min(max(k, 1), GROUP_MAX_MEETING_POINTS)
+    meeting_points = find_group_meeting_points(coords, k=k, objective=objective)
+    if meeting_points is None:
+        return jsonify({'error': 'Unable to calculate travel times'}), 502
+
+    return jsonify({'origins': coords, 'meeting_points': meeting_points})
+
+@app.route('/api/meeting-region', methods=['POST'])
+def meeting_region():
+    data = request.json or {}
+    location1 = data.get('location1')
+    location2 = data.get('location2')
+
+    if not location1 or not location2:
+        return jsonify({'error': 'Missing locations'}), 400
+    max_minutes = data.get('max_minutes')
+    if max_minutes is not None:
+        try:
+            max_minutes = float(max_minutes)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'max_minutes must be a number'}), 400
+        if max_minutes <= 0:
+            return jsonify({'error': 'max_minutes must be positive'}), 400
+
+    coords1, coords2 = geocode_locations(location1, location2)
+    if not coords1 or not coords2:
+        return jsonify({'error': 'Invalid locations'}), 400
+
+    region = find_meeting_region(coords1, coords2, max_minutes)
+    if region is None:
+        return jsonify({'error': 'Unable to calculate travel times'}), 502
+
+    return jsonify({
+        'origins': [coords1, coords2],
+        'region': region.to_geojson(),
+        'pois': find_region_pois(region, coords1, coords2)
+    })
+
 if __name__ == '__main__':
     app.run(debug=True, port=5001)
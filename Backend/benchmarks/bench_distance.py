@@ -0,0 +1,62 @@
+"""
+Micro-benchmark: per-segment geopy geodesic loop vs the vectorized distance engine
+
+Run from the Backend directory:
+    python -m benchmarks.bench_distance [--points 10000] [--repeat 5]
+"""
+import argparse
+import time
+
+import numpy as np
+from geopy.distance import geodesic
+
+from utils.distance import polyline_length
+
+def make_route(points: int, seed: int = 42) -> np.ndarray:
+    """
+    Random-walk polyline roughly shaped like a long OSRM overview=full route
+    """
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(scale=0.002, size=(points - 1, 2)) + [0.0005, 0.001]
+    start = np.array([[37.77, -122.42]])
+    return np.vstack([start, start + np.cumsum(steps, axis=0)])
+
+def geodesic_loop(route) -> float:
+    total = 0
+    for i in range(len(route) - 1):
+        total += geodesic(route[i], route[i + 1]).kilometers
+    return total
+
+def best_of(fn, repeat: int):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    route = make_route(args.points)
+    route_list = route.tolist()
+
+    cases = [
+        ('geodesic loop', lambda: geodesic_loop(route_list)),
+        ('vectorized ellipsoidal', lambda: polyline_length(route_list, method='ellipsoidal')),
+        ('vectorized haversine', lambda: polyline_length(route_list, method='haversine')),
+    ]
+
+    baseline_time, baseline_km = best_of(cases[0][1], args.repeat)
+    print(f"{args.points} points, best of {args.repeat}")
+    for name, fn in cases:
+        elapsed, km = best_of(fn, args.repeat)
+        print(f"{name:<24} {elapsed * 1000:9.2f} ms  {km:12.4f} km  "
+              f"x{baseline_time / elapsed:7.1f}  diff {abs(km - baseline_km) * 1000:.4f} m")
+
+if __name__ == '__main__':
+    main()
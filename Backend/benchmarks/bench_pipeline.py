@@ -0,0 +1,183 @@
+"""
+End-to-end load benchmark against local stand-in upstream services (no network access needed)
+
+Drives the /api/midpoint endpoint over HTTP and the pipeline used by main.py
+(geocoding, routing, midpoints, POIs, background DB write) with concurrent clients,
+and reports latency percentiles, throughput, peak Python memory and a per-stage breakdown.
+
+Run from the Backend directory:
+    python -m benchmarks.bench_pipeline [--mode both] [--requests 200] [--concurrency 8]
+        [--addresses 40] [--latency 0.05] [--route-points 2000] [--pois 200]
+"""
+import argparse
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+from benchmarks.stub_services import StubServices, service_urls
+
+def make_pairs(requests: int, addresses: int, seed: int = 7) -> List[Tuple[str, str]]:
+    """
+    Address pairs drawn from a pool of `addresses` (0 makes every address unique, i.e. cold caches)
+    """
+    rng = random.Random(seed)
+    if addresses <= 0:
+        return [(f"{i} Cold Street A", f"{i} Cold Street B") for i in range(requests)]
+    pool = [f"{i} Bench Street" for i in range(max(addresses, 2))]
+    return [tuple(rng.sample(pool, 2)) for _ in range(requests)]
+
+def run_load(call: Callable[[str, str], None], pairs: List[Tuple[str, str]], concurrency: int):
+    """
+    Run call(location1, location2) for every pair with `concurrency` client threads
+    Returns (latencies in seconds, error count, wall time)
+    """
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(pair):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            call(*pair)
+            failed = False
+        except Exception as e:
+            print(f"Error in benchmark request: {str(e)}")
+            failed = True
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            errors += failed
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, pairs))
+    return latencies, errors, time.perf_counter() - start
+
+def report(name: str, latencies: List[float], errors: int, wall: float, peak_bytes: int) -> None:
+    ms = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    print(f"\n== {name} ==")
+    print(f"requests {len(ms)}  errors {errors}  wall {wall:.2f} s  throughput {len(ms) / wall:.1f} req/s")
+    print(f"latency ms  p50 {p50:8.1f}  p95 {p95:8.1f}  p99 {p99:8.1f}  max {ms.max():8.1f}")
+    print(f"peak traced memory {peak_bytes / 2 ** 20:.1f} MiB")
+
+def report_stages() -> None:
+    from utils import metrics
+    snapshot = metrics.snapshot()
+    stages = snapshot.get('stage_latency_seconds', {})
+    fallbacks = snapshot.get('stage_fallbacks_total', {})
+    errors = snapshot.get('stage_errors_total', {})
+    print(f"{'stage':<30}{'calls':>8}{'mean ms':>10}{'errors':>8}{'fallbacks':>11}")
+    for stage, values in sorted(stages.items()):
+        mean = values['sum'] / values['count'] * 1000 if values['count'] else 0.0
+        print(f"{stage:<30}{values['count']:>8}{mean:>10.1f}{errors.get(stage, 0):>8}{fallbacks.get(stage, 0):>11}")
+    for host, values in sorted(snapshot.get('upstream_latency_seconds', {}).items()):
+        mean = values['sum'] / values['count'] * 1000 if values['count'] else 0.0
+        print(f"{'upstream ' + host:<30}{values['count']:>8}{mean:>10.1f}")
+
+def bench_api(app, pairs, concurrency):
+    """
+    POST /api/midpoint to the Flask app served by a threaded local WSGI server
+    """
+    import requests
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)  # No access log line per request
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/api/midpoint"
+    sessions = threading.local()
+
+    def call(location1, location2):
+        if not hasattr(sessions, 'session'):
+            sessions.session = requests.Session()
+        response = sessions.session.post(url, json={'location1': location1, 'location2': location2}, timeout=60)
+        response.raise_for_status()
+        if response.json().get('midpoint') is None:
+            raise Exception("No midpoint in response")
+
+    try:
+        return run_load(call, pairs, concurrency)
+    finally:
+        server.shutdown()
+
+def bench_pipeline(app, pairs, concurrency):
+    """
+    The stages main.py runs for one search, including the background DB write
+    """
+    from utils.persistence import enqueue_search_result, get_writer
+    from utils.pipeline import geocode_locations, process_routes
+    from utils.routing import calculate_route_annotated
+
+    def call(location1, location2):
+        with app.app_context():
+            point1, point2 = geocode_locations(location1, location2)
+            if not point1 or not point2:
+                raise Exception("Geocoding failed")
+            routes = calculate_route_annotated(point1, point2, alternatives=True)
+            results = process_routes(routes[:3], point1, point2)
+            if not any(results):
+                raise Exception("No meeting points")
+            enqueue_search_result(app, location1, location2, point1, point2, results)
+
+    result = run_load(call, pairs, concurrency)
+    get_writer(app).flush()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['api', 'pipeline', 'both'], default='both')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--addresses', type=int, default=40, help='size of the address pool, 0 for all-unique addresses')
+    parser.add_argument('--latency', type=float, default=0.05, help='stub response latency, seconds')
+    parser.add_argument('--jitter', type=float, default=0.02, help='extra uniform random stub latency, seconds')
+    parser.add_argument('--route-points', type=int, default=2000, help='coordinates per stub route')
+    parser.add_argument('--pois', type=int, default=200, help='elements per stub Overpass response')
+    args = parser.parse_args()
+
+    with StubServices(latency=args.latency, jitter=args.jitter, route_points=args.route_points, pois=args.pois) as stubs, \
+            tempfile.TemporaryDirectory() as workdir:
+        # Configuration is read at import time, so it has to be in place before the app is imported
+        os.environ.update(service_urls(stubs.base_url))
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        os.environ['ROUTE_CACHE_DIR'] = ''
+
+        from app import app
+        from models import db
+        from utils import metrics
+        with app.app_context():
+            db.create_all()
+
+        print(f"stubs at {stubs.base_url}: latency {args.latency * 1000:.0f}+{args.jitter * 1000:.0f} ms, "
+              f"{args.route_points} route points, {args.pois} POIs per response")
+        print(f"{args.requests} requests, concurrency {args.concurrency}, "
+              f"address pool {args.addresses or 'unique'}")
+
+        modes = ['api', 'pipeline'] if args.mode == 'both' else [args.mode]
+        for index, mode in enumerate(modes):
+            # Each mode gets its own address pool so that it starts with cold caches
+            pairs = [(f"{mode} {a}", f"{mode} {b}") for a, b in make_pairs(args.requests, args.addresses, seed=index)]
+            metrics.reset()
+            tracemalloc.start()
+            if mode == 'api':
+                latencies, errors, wall = bench_api(app, pairs, args.concurrency)
+            else:
+                latencies, errors, wall = bench_pipeline(app, pairs, args.concurrency)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            report(f"{mode} ({'/api/midpoint' if mode == 'api' else 'main.py pipeline'})", latencies, errors, wall, peak)
+            report_stages()
+
+if __name__ == '__main__':
+    main()
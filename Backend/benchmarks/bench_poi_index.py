@@ -0,0 +1,55 @@
+"""
+Micro-benchmark: radius queries against the offline POI index vs a linear haversine scan
+
+Run from the Backend directory:
+    python -m benchmarks.bench_poi_index [--pois 500000] [--radius 1500] [--queries 1000]
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from tools.build_poi_index import collect_pois, synthetic_elements
+from utils.distance import distances_from
+from utils.poi_index import POIIndex
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pois', type=int, default=500000)
+    parser.add_argument('--radius', type=float, default=1500)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--spread-km', type=float, default=20.0)
+    args = parser.parse_args()
+
+    center = [37.77, -122.42]
+    start = time.perf_counter()
+    built = POIIndex.from_pois(collect_pois(synthetic_elements(args.pois, center, args.spread_km)))
+    print(f"built {len(built)} POIs in {time.perf_counter() - start:.1f} s")
+
+    with tempfile.TemporaryDirectory() as path:
+        built.save(path)
+        index = POIIndex.load(path)
+        points = np.column_stack((np.asarray(index.arrays['lat']), np.asarray(index.arrays['lon'])))
+
+        rng = np.random.default_rng(3)
+        spread = args.spread_km / 111.32 / 2
+        queries = center + rng.uniform(-spread, spread, size=(args.queries, 2))
+
+        cases = [
+            ('kd-tree nearby()', lambda lat, lon: index.nearby(lat, lon, args.radius)),
+            ('kd-tree query() dicts', lambda lat, lon: index.query(lat, lon, args.radius, limit=500)),
+            ('linear haversine scan', lambda lat, lon: np.nonzero(
+                distances_from([lat, lon], points, method='haversine') * 1000 <= args.radius)[0]),
+        ]
+        for name, fn in cases:
+            count = args.queries if 'linear' not in name else max(args.queries // 20, 1)
+            found = 0
+            start = time.perf_counter()
+            for lat, lon in queries[:count]:
+                found += len(fn(lat, lon))
+            elapsed = (time.perf_counter() - start) / count
+            print(f"{name:<24} {elapsed * 1000:8.3f} ms/query  {found / count:8.1f} results")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+"""
+Local stand-ins for the OSRM (route/table), Overpass and Nominatim HTTP APIs
+
+Responses are synthetic but shaped like the real ones, deterministic for a given request,
+and served after a configurable latency. Run standalone to point a dev server at them:
+    python -m benchmarks.stub_services [--latency 0.05] [--route-points 2000] [--pois 200]
+"""
+import argparse
+import hashlib
+import json
+import math
+import multiprocessing
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+from urllib.parse import parse_qs, unquote, urlsplit
+
+# Geocoded addresses land inside this box (San Francisco Bay Area)
+GEOCODE_BOUNDS = (37.3, -122.5, 37.9, -121.9)
+# Average driving speed used for synthetic durations
+STUB_SPEED_KMH = 50.0
+
+POI_TAGS = [
+    {'amenity': 'cafe'}, {'amenity': 'restaurant', 'cuisine': 'pizza'}, {'amenity': 'pub'},
+    {'shop': 'supermarket'}, {'leisure': 'park'}
+]
+
+def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * 6371.0088 * math.asin(math.sqrt(a))
+
+def _seed(*parts: Any) -> int:
+    return int(hashlib.sha1(repr(parts).encode()).hexdigest()[:12], 16)
+
+def _parse_coordinates(path: str) -> List[List[float]]:
+    """
+    [[lat, lon], ...] from the "lon,lat;lon,lat" segment of an OSRM URL path
+    """
+    coords = unquote(path.rsplit('/', 1)[-1])
+    return [[float(lat), float(lon)] for lon, lat in (pair.split(',') for pair in coords.split(';'))]
+
+def osrm_route(points: List[List[float]], route_points: int, alternatives: bool) -> Dict[str, Any]:
+    (lat1, lon1), (lat2, lon2) = points[0], points[-1]
+    routes = []
+    for variant in range(3 if alternatives else 1):
+        # A gently curved polyline; alternatives bend further away from the straight line
+        bend = 0.02 * (variant + 1) * (-1) ** variant
+        rng = random.Random(_seed(lat1, lon1, lat2, lon2, variant))
+        coordinates = []
+        for i in range(route_points):
+            t = i / (route_points - 1)
+            offset = bend * math.sin(math.pi * t)
+            lat = lat1 + (lat2 - lat1) * t + offset + rng.uniform(-1e-4, 1e-4) * (0 < i < route_points - 1)
+            lon = lon1 + (lon2 - lon1) * t - offset
+            coordinates.append([lon, lat])
+
+        distances = [
+            _haversine_km(a[1], a[0], b[1], b[0]) * 1000
+            for a, b in zip(coordinates, coordinates[1:])
+        ]
+        durations = [d / (STUB_SPEED_KMH / 3.6) for d in distances]
+        routes.append({
+            'geometry': {'type': 'LineString', 'coordinates': coordinates},
+            'legs': [{'annotation': {'duration': durations, 'distance': distances}}],
+            'duration': sum(durations),
+            'distance': sum(distances)
+        })
+    return {'code': 'Ok', 'routes': routes}
+
+def osrm_table(points: List[List[float]], sources: List[int], destinations: List[int]) -> Dict[str, Any]:
+    # Road distance is roughly 1.3x the straight line
+    durations = [
+        [_haversine_km(*points[s], *points[d]) * 1.3 / STUB_SPEED_KMH * 3600 for d in destinations]
+        for s in sources
+    ]
+    return {'code': 'Ok', 'durations': durations}
+
+def overpass_elements(query: str, pois: int) -> Dict[str, Any]:
+    """
+    Random POI nodes inside the query's bounding box or around: filter (point or linestring)
+    """
+    around = re.search(r'around:([\d.]+),([-\d.,]+)\)', query)
+    bbox = re.search(r'\(([-\d.]+),([-\d.]+),([-\d.]+),([-\d.]+)\)', query)
+    if around:
+        # A point or a linestring: POIs are spread over its bounding box grown by the radius
+        radius = float(around.group(1))
+        values = [float(value) for value in around.group(2).split(',')]
+        lats, lons = values[0::2], values[1::2]
+        dlat = radius / 111320
+        dlon = dlat / max(math.cos(math.radians(sum(lats) / len(lats))), 0.01)
+        south, west, north, east = min(lats) - dlat, min(lons) - dlon, max(lats) + dlat, max(lons) + dlon
+    elif bbox:
+        south, west, north, east = (float(value) for value in bbox.groups())
+    else:
+        return {'version': 0.6, 'elements': [], 'remark': 'runtime error: no area in query'}
+
+    rng = random.Random(_seed(round(south, 6), round(west, 6), round(north, 6), round(east, 6)))
+    elements = []
+    for i in range(pois):
+        tags = dict(rng.choice(POI_TAGS))
+        tags.update({'name': f"Stub Place {i}", 'addr:street': 'Bench Street', 'addr:housenumber': str(i)})
+        elements.append({
+            'type': 'node',
+            'id': _seed(south, west, i) % 10 ** 10,
+            'lat': rng.uniform(south, north),
+            'lon': rng.uniform(west, east),
+            'tags': tags
+        })
+    return {'version': 0.6, 'elements': elements}
+
+def nominatim_search(query: str) -> List[Dict[str, Any]]:
+    if not query.strip():
+        return []
+    rng = random.Random(_seed(query.strip().lower()))
+    south, west, north, east = GEOCODE_BOUNDS
+    return [{
+        'place_id': _seed(query) % 10 ** 8,
+        'lat': str(rng.uniform(south, north)),
+        'lon': str(rng.uniform(west, east)),
+        'display_name': query,
+        'boundingbox': ['0', '0', '0', '0']
+    }]
+
+def make_handler(latency: float, jitter: float, route_points: int, pois: int):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, payload: Any, status: int = 200) -> None:
+            body = json.dumps(payload).encode()
+            delay = latency + random.uniform(0, jitter)
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # The client gave up (deadline or timeout) while the response was delayed
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            params = parse_qs(url.query)
+            if url.path.startswith('/route/'):
+                alternatives = params.get('alternatives', ['false'])[0] == 'true'
+                self._send_json(osrm_route(_parse_coordinates(url.path), route_points, alternatives))
+            elif url.path.startswith('/table/'):
+                points = _parse_coordinates(url.path)
+                sources = [int(i) for i in params.get('sources', [''])[0].split(';') if i] or list(range(len(points)))
+                destinations = [int(i) for i in params.get('destinations', [''])[0].split(';') if i] or list(range(len(points)))
+                self._send_json(osrm_table(points, sources, destinations))
+            elif url.path.startswith('/search'):
+                self._send_json(nominatim_search(params.get('q', [''])[0]))
+            else:
+                self._send_json({'error': 'not found'}, status=404)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            form = parse_qs(self.rfile.read(length).decode())
+            if urlsplit(self.path).path.startswith('/api/interpreter'):
+                self._send_json(overpass_elements(form.get('data', [''])[0], pois))
+            else:
+                self._send_json({'error': 'not found'}, status=404)
+
+    return StubHandler
+
+def start_stub_server(latency: float = 0.05, jitter: float = 0.0, route_points: int = 2000,
+                      pois: int = 200, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """
+    Serve all three stand-in APIs on one port from a background thread
+    (OSRM under /route and /table, Nominatim under /search, Overpass under /api/interpreter)
+    """
+    server = ThreadingHTTPServer((host, 0), make_handler(latency, jitter, route_points, pois))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def service_urls(base_url: str) -> Dict[str, str]:
+    """
+    Environment variables that point the backend at a stub server
+    """
+    return {
+        'OSRM_URL': base_url,
+        'OVERPASS_URL': f"{base_url}/api/interpreter",
+        'NOMINATIM_URL': base_url,
+        'ROUTING_BACKEND': 'osrm'
+    }
+
+def _serve(ready, options: Dict[str, Any]) -> None:
+    server = start_stub_server(**options)
+    ready.put(f"http://{server.server_address[0]}:{server.server_address[1]}")
+    threading.Event().wait()
+
+class StubServices:
+    """
+    Run the stub server in a separate process, so its CPU time and memory
+    do not show up in the measurements of the process under test
+    """
+
+    def __init__(self, **options):
+        self.options = options
+        self.process = None
+        self.base_url = None
+
+    def __enter__(self) -> 'StubServices':
+        context = multiprocessing.get_context('spawn')
+        ready = context.Queue()
+        self.process = context.Process(target=_serve, args=(ready, self.options), daemon=True)
+        self.process.start()
+        self.base_url = ready.get(timeout=30)
+        return self
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.join()
+        return False
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra uniform random latency, seconds')
+    parser.add_argument('--route-points', type=int, default=2000, help='coordinates per OSRM route')
+    parser.add_argument('--pois', type=int, default=200, help='elements per Overpass response')
+    args = parser.parse_args()
+
+    server = start_stub_server(args.latency, args.jitter, args.route_points, args.pois)
+    base_url = f"http://{server.server_address[0]}:{server.server_address[1]}"
+    for name, value in service_urls(base_url).items():
+        print(f"export {name}={value}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
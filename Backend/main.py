@@ -1,14 +1,39 @@
 import streamlit as st
 import folium
 from streamlit_folium import folium_static
-from utils.geocoding import geocode_address
-from utils.routing import calculate_midpoint, calculate_route, calculate_travel_time
-from utils.poi import find_nearby_pois
-from models import db, Route, MeetingPoint, POI
+from utils.routing import calculate_route_annotated
+from utils.records import Route
+from utils.routing_backends import get_routing_backend
+from utils.pipeline import geocode_locations, iter_route_results
+from utils.persistence import enqueue_search_result, get_writer
+from utils.simplify import simplify_route
+from utils.cache import MISSING, TTLCache
+from utils.cost_calculator import calculate_route_costs
+from utils import metrics, resilience, upstream
 from app import app
 import json
+import os
 from datetime import datetime
-from utils.cost_calculator import calculate_route_costs
+
+# Routes are drawn simplified for this zoom level (the map opens at zoom 10);
+# midpoints and costs always use the full-resolution geometry
+ROUTE_RENDER_ZOOM = 13
+
+# Show a per-stage timing trace of each search below the map
+SHOW_TRACE = os.environ.get('SHOW_TRACE') == '1'
+
+# How long stage results are reused across reruns and sessions, in seconds
+GEOCODE_CACHE_TTL = 24 * 3600
+ROUTE_CACHE_TTL = 3600
+MEETING_POINT_CACHE_TTL = 900
+
+ROUTE_COLORS = ['purple', 'blue', 'green']
+
+# Labels of the POI search modes of utils.pipeline; the corridor is used when the midpoint has nothing nearby
+POI_SEARCH_OPTIONS = {
+    "Near the midpoint": 'auto',
+    "Along the route": 'corridor'
+}
 
 # Page configuration
 st.set_page_config(
@@ -39,8 +64,146 @@ if 'location1' not in st.session_state:
 if 'location2' not in st.session_state:
     st.session_state.location2 = ""
 
-# Initialize Flask app context
-app_ctx = app.app_context()
+@st.cache_resource
+def get_flask_app():
+    """
+    Flask app with its DB engine, plus the shared HTTP session, routing backend and
+    background DB writer, created once per Streamlit server process instead of on every rerun
+    """
+    upstream.get_session()
+    get_routing_backend()
+    get_writer(app)
+    return app
+
+@st.cache_data(ttl=GEOCODE_CACHE_TTL, show_spinner=False)
+def geocode_pair(location1: str, location2: str):
+    # Geocode both locations concurrently
+    return geocode_locations(location1, location2)
+
+class DegradedRoutes(Exception):
+    """
+    Raised out of get_routes so that st.cache_data does not keep a fallback result
+    """
+
+    def __init__(self, routes):
+        super().__init__("Routing served a degraded result")
+        self.routes = routes
+
+@st.cache_data(ttl=ROUTE_CACHE_TTL, show_spinner=False)
+def get_routes(point1: tuple, point2: tuple):
+    routes = calculate_route_annotated(list(point1), list(point2), alternatives=True)[:len(ROUTE_COLORS)]
+    # Routes without annotations can be healthy; only results the routing stage degraded are not kept
+    if resilience.is_degraded('calculate_route'):
+        raise DegradedRoutes(routes)
+    return routes
+
+def find_routes(point1, point2):
+    try:
+        return get_routes(tuple(point1), tuple(point2))
+    except DegradedRoutes as e:
+        return e.routes
+
+@st.cache_resource
+def get_meeting_point_cache() -> TTLCache:
+    """
+    Meeting points per (point1, point2), shared by all sessions
+    Results are rendered while they stream in, so they are stored once complete
+    instead of going through st.cache_data
+    """
+    return TTLCache(maxsize=256, ttl=MEETING_POINT_CACHE_TTL)
+
+def new_map(point1, point2) -> folium.Map:
+    m = folium.Map(location=[(point1[0] + point2[0]) / 2, (point1[1] + point2[1]) / 2], zoom_start=10)
+    m.fit_bounds([point1, point2])
+    return m
+
+def show_map(slot, m: folium.Map) -> None:
+    with slot.container():
+        st.markdown("### 🗺️ Meeting Points Map")
+        folium_static(m, height=600)
+
+def add_route_layer(m: folium.Map, i: int, route: Route) -> None:
+    """
+    Draw one route with its cost popup
+    """
+    route_costs = calculate_route_costs(route)
+
+    # Add route to map with detailed popup
+    route_popup = f"""
+    <div style='min-width: 200px; padding: 10px;'>
+        <h4>Route {ROUTE_COLORS[i].title()}</h4>
+        <p>Distance: {route_costs['distance_miles']:.1f} miles</p>
+        <p>Est. Fuel Cost: ${route_costs['fuel_cost']:.2f}</p>
+        <p>Total Cost: ${route_costs['total_cost']:.2f}</p>
+    </div>
+    """
+
+    folium.PolyLine(
+        simplify_route(route, zoom=ROUTE_RENDER_ZOOM),
+        weight=3,
+        color=ROUTE_COLORS[i],
+        opacity=0.8,
+        popup=folium.Popup(route_popup)
+    ).add_to(m)
+
+def add_meeting_point(m: folium.Map, i: int, result: dict, location1: str, location2: str) -> None:
+    """
+    Draw a route's meeting point and the POIs around it
+    """
+    folium.CircleMarker(
+        result['midpoint'],
+        radius=8,
+        color=ROUTE_COLORS[i],
+        fill=True,
+        popup=f"Meeting point: {result['travel_time1']} min / {result['travel_time2']} min"
+    ).add_to(m)
+
+    # Add POIs near this route's midpoint (or along it, for corridor searches)
+    pois = result['pois']
+
+    if pois:
+        for poi in pois:
+            # Create detailed POI popup
+            poi_popup = f"""
+            <div style='min-width: 200px; padding: 10px;'>
+                <h4>{poi['name']}</h4>
+                <p><i>{poi['type']}</i></p>
+                <p>{poi['address']}</p>
+                <p>Travel time from {location1}: {poi.get('travel_time1', result['travel_time1'])} min</p>
+                <p>Travel time from {location2}: {poi.get('travel_time2', result['travel_time2'])} min</p>
+                {f"<p>Detour: {poi['detour']} min</p>" if 'detour' in poi else ''}
+                <div style='margin-top: 10px;'>
+                    <a href='https://www.google.com/maps/dir/?api=1&destination={poi['lat']},{poi['lon']}' target='_blank'>🗺️ Open in Google Maps</a><br>
+                    <a href='https://www.waze.com/ul?ll={poi['lat']},{poi['lon']}&navigate=yes' target='_blank'>🚗 Open in Waze</a><br>
+                    <a href='http://maps.apple.com/?daddr={poi['lat']},{poi['lon']}' target='_blank'>🍎 Open in Apple Maps</a>
+                </div>
+            </div>
+            """
+
+            folium.Marker(
+                [poi['lat'], poi['lon']],
+                popup=folium.Popup(poi_popup, max_width=300),
+                icon=folium.Icon(color=ROUTE_COLORS[i], icon='info-sign')
+            ).add_to(m)
+
+def add_endpoint_markers(m: folium.Map, point1, point2, location1: str, location2: str) -> None:
+    # Add markers for start and end points
+    folium.Marker(
+        point1,
+        popup=f"Location 1: {location1}",
+        icon=folium.Icon(color='red', icon='info-sign')
+    ).add_to(m)
+
+    folium.Marker(
+        point2,
+        popup=f"Location 2: {location2}",
+        icon=folium.Icon(color='blue', icon='info-sign')
+    ).add_to(m)
+
+# Flask app context for the database; contexts are bound to the script thread, so only
+# the app itself is cached and a (cheap) context is pushed for each run
+flask_app = get_flask_app()
+app_ctx = flask_app.app_context()
 app_ctx.push()
 
 try:
@@ -60,137 +223,85 @@ try:
                 key="loc2",
                 placeholder="Enter address, city, or landmark")
 
-            if st.button("Find Midpoint", key="find_button"):
+            search_mode = st.radio("🔎 Search for places",
+                list(POI_SEARCH_OPTIONS),
+                key="search_mode",
+                horizontal=True)
+
+            find_clicked = st.button("Find Midpoint", key="find_button")
+            map_slot = st.empty()
+
+            if find_clicked:
                 if location1 and location2:
+                    # Every upstream call of the search shares one latency budget
+                    budget = resilience.start_deadline(resilience.REQUEST_SLO_SECONDS)
                     try:
-                        with st.spinner('Finding the best meeting points...'):
-                            # Geocode both locations
-                            point1 = geocode_address(location1)
-                            point2 = geocode_address(location2)
-
-                            if point1 and point2:
-                                # Calculate routes and find meeting points
-                                routes = calculate_route(point1, point2, alternatives=True)
-
-                                if not routes:
-                                    st.error("Unable to calculate routes between the specified locations.")
-                                    st.stop()
-
-                                # Store route in database
-                                route_db = Route(
-                                    start_location=location1,
-                                    end_location=location2,
-                                    start_lat=point1[0],
-                                    start_lon=point1[1],
-                                    end_lat=point2[0],
-                                    end_lon=point2[1]
-                                )
-                                db.session.add(route_db)
-                                db.session.flush()
-
-                                # Process each route
-                                colors = ['purple', 'blue', 'green']
-
-                                # Create map centered on the first route's midpoint
-                                if routes:
-                                    first_route_midpoint = calculate_midpoint(routes[0])
-                                    m = folium.Map(location=[first_route_midpoint[0], first_route_midpoint[1]], zoom_start=10)
-                                else:
-                                    m = folium.Map(location=[0, 0], zoom_start=2)
-
-                                for i, route in enumerate(routes[:3]):
-                                    route_midpoint = calculate_midpoint(route)
-                                    if not route_midpoint:
-                                        continue
-
-                                    # Calculate costs for this route
-                                    route_costs = calculate_route_costs(route)
-
-                                    # Store meeting point
-                                    meeting_point_db = MeetingPoint(
-                                        route_id=route_db.id,
-                                        lat=route_midpoint[0],
-                                        lon=route_midpoint[1],
-                                        travel_time1=calculate_travel_time(point1, route_midpoint),
-                                        travel_time2=calculate_travel_time(point2, route_midpoint)
-                                    )
-                                    db.session.add(meeting_point_db)
-                                    db.session.flush()
-
-                                    # Add route to map with detailed popup
-                                    route_popup = f"""
-                                    <div style='min-width: 200px; padding: 10px;'>
-                                        <h4>Route {colors[i].title()}</h4>
-                                        <p>Distance: {route_costs['distance_miles']:.1f} miles</p>
-                                        <p>Est. Fuel Cost: ${route_costs['fuel_cost']:.2f}</p>
-                                        <p>Total Cost: ${route_costs['total_cost']:.2f}</p>
-                                    </div>
-                                    """
-
-                                    folium.PolyLine(
-                                        route,
-                                        weight=3,
-                                        color=colors[i],
-                                        opacity=0.8,
-                                        popup=folium.Popup(route_popup)
-                                    ).add_to(m)
-
-                                    # Find and add POIs near this route's midpoint
-                                    pois = find_nearby_pois(route_midpoint[0], route_midpoint[1])
-
-                                    if pois:
-                                        for poi in pois:
-                                            # Create detailed POI popup
-                                            poi_popup = f"""
-                                            <div style='min-width: 200px; padding: 10px;'>
-                                                <h4>{poi['name']}</h4>
-                                                <p><i>{poi['type']}</i></p>
-                                                <p>{poi['address']}</p>
-                                                <p>Travel time from {location1}: {meeting_point_db.travel_time1} min</p>
-                                                <p>Travel time from {location2}: {meeting_point_db.travel_time2} min</p>
-                                                <div style='margin-top: 10px;'>
-                                                    <a href='https://www.google.com/maps/dir/?api=1&destination={poi['lat']},{poi['lon']}' target='_blank'>🗺️ Open in Google Maps</a><br>
-                                                    <a href='https://www.waze.com/ul?ll={poi['lat']},{poi['lon']}&navigate=yes' target='_blank'>🚗 Open in Waze</a><br>
-                                                    <a href='http://maps.apple.com/?daddr={poi['lat']},{poi['lon']}' target='_blank'>🍎 Open in Apple Maps</a>
-                                                </div>
-                                            </div>
-                                            """
-
-                                            folium.Marker(
-                                                [poi['lat'], poi['lon']],
-                                                popup=folium.Popup(poi_popup, max_width=300),
-                                                icon=folium.Icon(color=colors[i], icon='info-sign')
-                                            ).add_to(m)
-
-                                # Add markers for start and end points
-                                folium.Marker(
-                                    point1,
-                                    popup=f"Location 1: {location1}",
-                                    icon=folium.Icon(color='red', icon='info-sign')
-                                ).add_to(m)
-
-                                folium.Marker(
-                                    point2,
-                                    popup=f"Location 2: {location2}",
-                                    icon=folium.Icon(color='blue', icon='info-sign')
-                                ).add_to(m)
-
-                                # Commit all database changes
-                                db.session.commit()
-
-                                # Display the map
-                                st.markdown("### 🗺️ Meeting Points Map")
-                                folium_static(m, height=600)
+                        trace = metrics.start_trace('search') if SHOW_TRACE else None
+                        with st.spinner('Finding routes...'):
+                            point1, point2 = geocode_pair(location1, location2)
+                            routes = find_routes(point1, point2) if point1 and point2 else None
+
+                        if point1 and point2:
+                            if not routes:
+                                st.error("Unable to calculate routes between the specified locations.")
+                                st.stop()
+
+                            # First paint: the routes, as soon as routing returns
+                            m = new_map(point1, point2)
+                            for i, route in enumerate(routes):
+                                add_route_layer(m, i, route)
+                            add_endpoint_markers(m, point1, point2, location1, location2)
+                            show_map(map_slot, m)
+
+                            # Then each route's meeting point and POIs as they arrive
+                            cache = get_meeting_point_cache()
+                            poi_search = POI_SEARCH_OPTIONS[search_mode]
+                            key = (tuple(point1), tuple(point2), poi_search)
+                            results = cache.get(key)
+                            if results is MISSING:
+                                results = [None] * len(routes)
+                                with st.spinner('Finding the best meeting points...'):
+                                    for i, result in iter_route_results(routes, point1, point2, poi_search=poi_search):
+                                        results[i] = result
+                                        if result:
+                                            add_meeting_point(m, i, result, location1, location2)
+                                            show_map(map_slot, m)
+                                # Results built from fallbacks are shown but not kept
+                                if not budget.degraded:
+                                    cache.set(key, results)
+                            else:
+                                for i, result in enumerate(results):
+                                    if result:
+                                        add_meeting_point(m, i, result, location1, location2)
+                                show_map(map_slot, m)
+
+                            if budget.degraded:
+                                st.info("Some services were slow or unavailable, so part of these results are estimates.")
+
+                            # Kept in the session so that reruns redisplay it without recomputing anything
+                            st.session_state.search_map = m
+
+                            # Store the route, meeting points and POIs in the background
+                            enqueue_search_result(flask_app, location1, location2, point1, point2, results)
+
+                        if trace:
+                            with st.expander("Request trace"):
+                                st.json(metrics.finish_trace(trace))
 
                     except Exception as e:
                         st.error(f"An error occurred: {str(e)}")
-                        db.session.rollback()
+                    finally:
+                        resilience.finish_deadline(budget)
                 else:
                     st.error("Please enter both locations")
 
+            elif 'search_map' in st.session_state:
+                # Display the map of the latest search
+                show_map(map_slot, st.session_state.search_map)
+
 except Exception as e:
     st.error(f"An unexpected error occurred: {e}")
 
 finally:
     # Clean up Flask context
-    app_ctx.pop()
\ No newline at end of file
+    app_ctx.pop()
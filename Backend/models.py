@@ -39,3 +39,37 @@ class POI(db.Model):
     lon = db.Column(db.Float, nullable=False)
     address = db.Column(db.String(255))
     details = db.Column(db.JSON)
+
+
+class GeocodeCacheEntry(db.Model):
+    __tablename__ = 'geocode_cache'
+
+    id = db.Column(db.Integer, primary_key=True)
+    query = db.Column(db.String(255), nullable=False, unique=True, index=True)  # Normalized address
+    lat = db.Column(db.Float)  # NULL for addresses that could not be resolved (negative cache)
+    lon = db.Column(db.Float)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+class PoiCell(db.Model):
+    __tablename__ = 'poi_cells'
+
+    geohash = db.Column(db.String(12), primary_key=True)
+    fetched_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    pois = db.relationship('CachedPOI', backref='cell', lazy=True, cascade='all, delete-orphan')
+
+
+class CachedPOI(db.Model):
+    __tablename__ = 'cached_pois'
+
+    id = db.Column(db.Integer, primary_key=True)
+    geohash = db.Column(db.String(12), db.ForeignKey('poi_cells.geohash'), nullable=False, index=True)
+    osm_id = db.Column(db.String(32), nullable=False)  # e.g. "node/123456"
+    name = db.Column(db.String(255), nullable=False)
+    type = db.Column(db.String(100))
+    lat = db.Column(db.Float, nullable=False)
+    lon = db.Column(db.Float, nullable=False)
+    address = db.Column(db.String(255))
+    details = db.Column(db.JSON)
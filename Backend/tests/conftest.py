@@ -0,0 +1,15 @@
+import pytest
+from flask import Flask
+from models import db
+
+@pytest.fixture
+def db_app():
+    """
+    Flask app with an in-memory database holding every table, inside its app context
+    """
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
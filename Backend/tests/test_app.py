@@ -0,0 +1,71 @@
+import pytest
+import app as backend
+
+@pytest.fixture
+def client():
+    return backend.app.test_client()
+
+@pytest.mark.parametrize('locations', [['Paris', 5], ['Paris', ''], ['Paris', None], [['Paris'], 'Lyon']])
+def test_meeting_points_rejects_locations_that_are_not_strings(client, monkeypatch, locations):
+    monkeypatch.setattr(backend, 'geocode_locations', lambda *args: pytest.fail('geocoded invalid input'))
+
+    response = client.post('/api/meeting-points', json={'locations': locations})
+
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+def test_meeting_points_clamps_k(client, monkeypatch):
+    requested = []
+    monkeypatch.setattr(backend, 'geocode_locations', lambda *locations: [[48.8, 2.3], [45.7, 4.8]])
+
+    def find(coords, k, objective):
+        requested.append(k)
+        return []
+
+    monkeypatch.setattr(backend, 'find_group_meeting_points', find)
+
+    for k in (10 ** 9, -3):
+        response = client.post('/api/meeting-points', json={'locations': ['Paris', 'Lyon'], 'k': k})
+        assert response.status_code == 200
+
+    assert requested == [backend.GROUP_MAX_MEETING_POINTS, 1]
+
+def test_batch_resolves_identical_addresses_and_pairs_once(client, monkeypatch):
+    import json
+    from utils import pipeline
+
+    geocoded = []
+    routed = []
+
+    def geocode(address):
+        geocoded.append(address)
+        return None if address == 'Nowhere' else [float(len(address)), 0.0]
+
+    def midpoint(point1, point2):
+        routed.append((point1[0], point2[0]))
+        return [(point1[0] + point2[0]) / 2, 0.0]
+
+    monkeypatch.setattr(pipeline, 'geocode_address', geocode)
+    monkeypatch.setattr(pipeline, 'compute_pair_midpoint', midpoint)
+    pairs = [['Paris', 'Lyon'], ['paris ', 'LYON'], {'location1': 'Lyon', 'location2': 'Paris'},
+             ['Paris', 'Nowhere'], ['Paris', 'Lyon']]
+
+    response = client.post('/api/midpoint/batch', json={'pairs': pairs})
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.headers['X-Unique-Addresses'] == '3'
+    assert response.headers['X-Unique-Pairs'] == '3'
+    assert sorted(geocoded) == ['Lyon', 'Nowhere', 'Paris']
+    assert sorted(routed) == [(4.0, 5.0), (5.0, 4.0)]
+
+    by_index = {line['index']: line for line in lines}
+    assert sorted(by_index) == [0, 1, 2, 3, 4]
+    assert by_index[1]['location1'] == 'paris ' and by_index[1]['midpoint'] == [4.5, 0.0]
+    assert by_index[0]['midpoint'] == by_index[4]['midpoint'] == [4.5, 0.0]
+    assert by_index[3]['error'] == 'Invalid locations' and by_index[3]['midpoint'] is None
+
+def test_batch_rejects_malformed_pairs(client):
+    for pairs in ([], [['Paris']], [['Paris', 3]], [{'location1': 'Paris'}]):
+        assert client.post('/api/midpoint/batch', json={'pairs': pairs}).status_code == 400
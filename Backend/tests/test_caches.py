@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+import numpy as np
+from datetime import datetime, timedelta
+from flask import Flask
+from models import db, GeocodeCacheEntry
+from utils import geocoding
+from utils.records import Route
+from utils.route_cache import RouteCache, route_cache_key
+
+def _seconds_left(cache, key):
+    return cache._data[key][1] - time.monotonic()
+
+def test_geocode_database_hit_keeps_the_rows_expiry():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(GeocodeCacheEntry(query='1 main st', lat=40.0, lon=-75.0,
+                                         expires_at=datetime.utcnow() + timedelta(seconds=120)))
+        db.session.commit()
+        geocoding._memory_cache.clear()
+
+        assert geocoding.geocode_address('1 Main St') == [40.0, -75.0]
+
+    assert 100 < _seconds_left(geocoding._memory_cache, '1 main st') <= 120
+
+def test_route_disk_hit_keeps_the_files_expiry(tmp_path):
+    writer = RouteCache(ttl=3600, directory=str(tmp_path))
+    writer.set([40.0, -75.0], [40.1, -75.1], False, [Route([[40.0, -75.0], [40.1, -75.1]])])
+    key = route_cache_key([40.0, -75.0], [40.1, -75.1], False)
+    path = writer._path(key)
+    written = time.time() - 3000
+    os.utime(path, (written, written))
+
+    reader = RouteCache(ttl=3600, directory=str(tmp_path))
+    routes = reader.get([40.0, -75.0], [40.1, -75.1], False)
+
+    assert len(routes) == 1 and len(routes[0]) == 2
+    assert 580 < _seconds_left(reader.memory, key) <= 600
+
+def test_route_cache_key_snaps_nearby_endpoints():
+    key = route_cache_key([40.00012, -75.00049], [40.1, -75.1], False)
+
+    assert key == '40.000,-75.000;40.100,-75.100;alt=0'
+    assert route_cache_key([40.0004, -75.0001], [40.1, -75.1], False) == key
+    assert route_cache_key([40.0006, -75.0001], [40.1, -75.1], False) != key
+    assert route_cache_key([40.0, -75.0], [40.1, -75.1], True) != key
+
+def test_routes_round_trip_packed_as_float32():
+    route = Route([[40.0, -75.0], [40.05, -75.05], [40.1, -75.1]], durations=[30.5, 40.0], distances=[700.0, 800.0])
+    cache = RouteCache(ttl=60)
+
+    cache.set([40.0, -75.0], [40.1, -75.1], False, [route, Route([[40.0, -75.0], [40.1, -75.1]])])
+    cached = cache.get([40.0002, -75.0002], [40.1, -75.1], False)
+
+    assert len(cached) == 2
+    assert np.allclose(cached[0].coordinates, route.coordinates, atol=1e-5)
+    assert cached[0].durations.tolist() == [30.5, 40.0]
+    assert cached[0].distances.tolist() == [700.0, 800.0]
+    assert cached[1].durations is None
+    # float32 pairs: 8 bytes per point, 4 per annotation
+    assert cache.memory.bytes == 3 * 8 + 2 * 4 + 2 * 4 + 2 * 8
+    assert cache.get([40.0, -75.0], [40.1, -75.1], True) is None
+
+def test_route_cache_stays_within_its_byte_budget():
+    route = Route(np.column_stack((np.linspace(40.0, 40.1, 100), np.linspace(-75.0, -75.1, 100))))
+    cache = RouteCache(max_bytes=2000, ttl=60)
+
+    for i in range(5):
+        cache.set([40.0 + i, -75.0], [40.1, -75.1], False, [route])
+
+    # 800 bytes per entry: only the two most recent fit
+    assert cache.memory.bytes <= 2000
+    assert cache.get([40.0, -75.0], [40.1, -75.1], False) is None
+    assert cache.get([44.0, -75.0], [40.1, -75.1], False) is not None
+    assert cache.memory.stats()['evictions'] == 3
+
+def test_refusing_an_oversized_value_drops_the_previous_one():
+    from utils.cache import MISSING, TTLCache
+
+    cache = TTLCache(max_bytes=10, sizeof=len)
+    cache.set('key', 'small')
+    cache.set('key', 'far too large for the cache')
+
+    assert cache.get('key') is MISSING
+    assert cache.bytes == 0
+
+def test_geocode_stats_are_updated_under_the_stats_lock(monkeypatch):
+    monkeypatch.setattr(geocoding, '_db_stats', {'hits': 0, 'misses': 0, 'errors': 0})
+    monkeypatch.setattr(geocoding, '_upstream_calls', 0)
+    monkeypatch.setattr(geocoding.upstream, 'call_with_retries', lambda fn, **kwargs: None)
+
+    def lookup():
+        geocoding._count_db('misses')
+        geocoding._geocode_upstream('1 Main St')
+
+    # Pool threads wait for the lock instead of racing a concurrent update or snapshot
+    with geocoding._stats_lock:
+        thread = threading.Thread(target=lookup)
+        thread.start()
+        thread.join(0.1)
+        assert thread.is_alive()
+        assert geocoding._db_stats['misses'] == 0
+    thread.join()
+
+    stats = geocoding.get_geocode_cache_stats()
+    assert stats['database']['misses'] == 1
+    assert stats['upstream_calls'] == 1
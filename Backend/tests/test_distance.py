@@ -0,0 +1,70 @@
+import math
+import numpy as np
+import pytest
+from utils.distance import (EARTH_RADIUS_KM, cumulative_distances, distance, ellipsoidal_distances,
+                            haversine_distances, polyline_distances, polyline_length)
+
+def _dms(degrees, minutes, seconds):
+    sign = -1 if degrees < 0 else 1
+    return sign * (abs(degrees) + minutes / 60 + seconds / 3600)
+
+def test_vincenty_matches_the_reference_geodesic():
+    # Flinders Peak to Buninyong, the worked example of Vincenty (1975): 54 972.271 m
+    flinders = [_dms(-37, 57, 3.72030), _dms(144, 25, 29.52440)]
+    buninyong = [_dms(-37, 39, 10.15610), _dms(143, 55, 35.38390)]
+
+    assert distance(flinders, buninyong, method='ellipsoidal') == pytest.approx(54.972271, abs=1e-6)
+
+@pytest.mark.parametrize('point1, point2, expected_km', [
+    ([0.0, 0.0], [0.0, 1.0], 111.319491),     # One degree along the equator
+    ([0.0, 0.0], [90.0, 0.0], 10001.965729),  # Meridian quadrant
+    ([51.5, -0.1], [51.5, -0.1], 0.0)
+])
+def test_vincenty_known_distances(point1, point2, expected_km):
+    assert distance(point1, point2, method='ellipsoidal') == pytest.approx(expected_km, abs=1e-6)
+
+def test_vincenty_falls_back_for_nearly_antipodal_points():
+    distances = ellipsoidal_distances([0.0, 0.0], [0.0, 0.0], [0.5, 0.0], [179.7, 1.0])
+
+    assert np.all(np.isfinite(distances))
+    assert distances[0] == pytest.approx(haversine_distances(0.0, 0.0, 0.5, 179.7), rel=1e-2)
+    assert distances[1] == pytest.approx(111.319491, abs=1e-6)
+
+def test_haversine_is_vectorized_over_arrays():
+    lat2 = np.array([1.0, 2.0, 3.0])
+
+    distances = haversine_distances(0.0, 0.0, lat2, 0.0)
+
+    assert np.allclose(distances, lat2 * math.radians(1) * EARTH_RADIUS_KM)
+
+def test_polyline_lengths_add_up_per_segment():
+    line = [[0.0, 0.0], [1.0, 0.0], [1.0, 1.0]]
+
+    cumulative = cumulative_distances(line)
+
+    assert cumulative[0] == 0.0
+    assert cumulative[-1] == pytest.approx(polyline_length(line))
+    assert cumulative[1] == pytest.approx(math.radians(1) * EARTH_RADIUS_KM)
+
+def test_polyline_distances_to_segments_and_ends():
+    line = [[0.0, 0.0], [0.0, 1.0]]
+    points = [[0.01, 0.5],    # Beside the middle of the segment
+              [0.0, 0.25],    # On it
+              [0.0, 1.01],    # Beyond its end
+              [-0.02, -0.01]]
+
+    distances = polyline_distances(points, line)
+
+    km_per_degree = math.radians(1) * EARTH_RADIUS_KM
+    assert distances == pytest.approx([0.01 * km_per_degree, 0.0, 0.01 * km_per_degree,
+                                       math.hypot(0.02, 0.01) * km_per_degree], rel=1e-4)
+    assert np.all(polyline_distances(points, []) == np.inf)
+    assert distances[0] == pytest.approx(polyline_distances([[0.01, 0.5]], [[0.0, 0.5]])[0])
+
+def test_route_costs_use_the_ellipsoidal_length():
+    from utils.cost_calculator import calculate_route_costs
+
+    costs = calculate_route_costs([[0.0, 0.0], [0.0, 0.5], [0.0, 1.0]])
+
+    assert costs['distance_km'] == round(111.319491, 2)
+    assert costs['distance_miles'] == round(111.319491 * 0.621371, 2)
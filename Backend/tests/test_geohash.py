@@ -0,0 +1,25 @@
+import math
+from utils import geohash
+
+def test_encode_matches_the_reference_geohash():
+    # Example of the original geohash.org announcement
+    assert geohash.encode(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+    assert geohash.encode(51.5007, -0.1246, 6) == 'gcpuvp'
+
+def test_bbox_contains_the_point_and_has_the_cell_size():
+    south, west, north, east = geohash.bbox(geohash.encode(48.8584, 2.2945, 6))
+    height, width = geohash.cell_size(6)
+
+    assert south <= 48.8584 < north and west <= 2.2945 < east
+    assert math.isclose(north - south, height) and math.isclose(east - west, width)
+
+def test_cells_cover_the_whole_circle():
+    lat, lon, radius = 51.5, -0.12, 1500
+    cells = set(geohash.cells_covering(lat, lon, radius, 6))
+
+    dlat = radius / 111320.0
+    dlon = radius / (111320.0 * math.cos(math.radians(lat)))
+    for i in range(-10, 11):
+        for j in range(-10, 11):
+            assert geohash.encode(lat + dlat * i / 10, lon + dlon * j / 10, 6) in cells
+    assert len(cells) == len(geohash.cells_covering(lat, lon, radius, 6))
@@ -0,0 +1,65 @@
+import math
+import numpy as np
+import pytest
+from utils import group_midpoint
+
+def _fake_matrix(calls, unreachable=()):
+    """
+    Travel-time matrix proportional to the straight-line distance in degrees
+    """
+    def matrix(sources, destinations):
+        calls.append((len(sources), len(destinations)))
+        return [[None if (i, j) in unreachable else 100 * math.dist(source, destination)
+                 for j, destination in enumerate(destinations)]
+                for i, source in enumerate(sources)]
+    return matrix
+
+ORIGINS = [[48.0, 2.0], [48.0, 2.6], [48.5, 2.1]]
+
+@pytest.mark.parametrize('objective', ['minmax', 'variance'])
+def test_meeting_points_are_the_best_candidates_for_the_objective(monkeypatch, objective):
+    calls = []
+    monkeypatch.setattr(group_midpoint, 'calculate_travel_time_matrix', _fake_matrix(calls))
+
+    points = group_midpoint.find_group_meeting_points(ORIGINS, k=3, objective=objective)
+
+    candidates = group_midpoint.candidate_grid(ORIGINS)
+    times = [[100 * math.dist(origin, candidate) for origin in ORIGINS] for candidate in candidates]
+    if objective == 'minmax':
+        expected = sorted(times, key=lambda t: (max(t), np.var(t)))[:3]
+    else:
+        expected = sorted(times, key=lambda t: (np.var(t), max(t)))[:3]
+
+    assert calls == [(3, group_midpoint.GROUP_GRID_SIZE ** 2)]
+    assert [point['travel_times'] for point in points] == [[round(t) for t in row] for row in expected]
+    assert points[0]['max_time'] == round(max(expected[0]))
+    assert points[0]['variance'] == round(float(np.var(expected[0])), 2)
+
+def test_objectives_trade_the_longest_trip_against_the_spread(monkeypatch):
+    monkeypatch.setattr(group_midpoint, 'calculate_travel_time_matrix', _fake_matrix([]))
+
+    minmax = group_midpoint.find_group_meeting_points(ORIGINS, k=1, objective='minmax')[0]
+    variance = group_midpoint.find_group_meeting_points(ORIGINS, k=1, objective='variance')[0]
+
+    assert minmax['max_time'] <= variance['max_time']
+    assert variance['variance'] <= minmax['variance']
+
+def test_unreachable_candidates_are_skipped_and_the_table_stays_bounded(monkeypatch):
+    calls = []
+    origins = [[48.0 + i * 0.01, 2.0] for i in range(25)]
+    monkeypatch.setattr(group_midpoint, 'calculate_travel_time_matrix', _fake_matrix(calls, unreachable={(3, 0)}))
+
+    points = group_midpoint.find_group_meeting_points(origins, k=100)
+
+    sources, destinations = calls[0]
+    assert sources + destinations <= group_midpoint.GROUP_MAX_TABLE_SIZE
+    assert len(points) == destinations - 1
+
+def test_failed_matrix_and_bad_input(monkeypatch):
+    monkeypatch.setattr(group_midpoint, 'calculate_travel_time_matrix', lambda sources, destinations: None)
+
+    assert group_midpoint.find_group_meeting_points(ORIGINS) is None
+    with pytest.raises(ValueError):
+        group_midpoint.find_group_meeting_points(ORIGINS, objective='fastest')
+    with pytest.raises(ValueError):
+        group_midpoint.find_group_meeting_points(ORIGINS[:1])
@@ -0,0 +1,65 @@
+import math
+import numpy as np
+from utils import isochrone
+from utils.road_graph import make_grid_graph
+from utils.routing_backends import LocalGraphBackend
+
+def _graph_region(monkeypatch, max_minutes):
+    graph = make_grid_graph(40, 40, spacing=0.002)
+    monkeypatch.setattr(isochrone, 'get_routing_backend', lambda: LocalGraphBackend(graph))
+    point1, point2 = graph.nodes[0].tolist(), graph.nodes[40 * 40 - 1].tolist()
+    settled1 = graph.dijkstra(0)
+    settled2 = graph.dijkstra(40 * 40 - 1)
+    times = np.array([[settled1[node], settled2[node]] for node in range(len(graph.nodes))]) / 60 * 0.91
+    return graph, isochrone.find_meeting_region(point1, point2, max_minutes), times
+
+def test_graph_region_rasterizes_the_nodes_reachable_from_both(monkeypatch):
+    graph, region, times = _graph_region(monkeypatch, max_minutes=10)
+
+    inside = times.max(axis=1) <= 10
+    assert 0 < inside.sum() < len(times)
+    cells = {region._cell(lat, lon) for lat, lon in graph.nodes[inside]}
+    # Exactly the cells holding a node within the limit, each with its fairest node's times
+    assert set(region.cells) == cells
+    for cell, cell_times in region.cells.items():
+        members = [i for i in np.nonzero(inside)[0] if region._cell(*graph.nodes[i]) == cell]
+        assert max(cell_times) == min(times[i].max() for i in members)
+    # Cells are ISOCHRONE_CELL_M square
+    assert math.isclose(region.lat_step * 111320, isochrone.ISOCHRONE_CELL_M)
+    assert math.isclose(region.lon_step * math.cos(math.radians(region.south)), region.lat_step)
+
+def test_graph_region_without_a_limit_uses_the_slack(monkeypatch):
+    _, region, times = _graph_region(monkeypatch, max_minutes=None)
+
+    fairest = times.max(axis=1).min()
+    expected = max(fairest * (1 + isochrone.ISOCHRONE_SLACK), fairest + isochrone.ISOCHRONE_MIN_SLACK_MINUTES)
+    assert math.isclose(region.max_minutes, expected, rel_tol=1e-9)
+    assert math.isclose(max(region.cells[region.best_cell()]), fairest, rel_tol=1e-9)
+
+def test_matrix_region_keeps_the_cells_within_the_limit(monkeypatch):
+    calls = []
+
+    def matrix(sources, destinations):
+        calls.append(len(destinations))
+        return [[100 * math.dist(source, destination) for destination in destinations] for source in sources]
+
+    monkeypatch.setattr(isochrone, 'get_routing_backend', lambda: object())
+    monkeypatch.setattr(isochrone, 'calculate_travel_time_matrix', matrix)
+    isochrone._grid_cache.clear()
+
+    region = isochrone.find_meeting_region([48.0, 2.0], [48.2, 2.2], max_minutes=16)
+    again = isochrone.find_meeting_region([48.0, 2.0], [48.2, 2.2], max_minutes=20)
+
+    assert calls == [isochrone.ISOCHRONE_GRID_SIZE ** 2]
+    assert region.cells and all(max(times) <= 16 for times in region.cells.values())
+    assert len(again.cells) > len(region.cells)
+    assert region.contains(48.1, 2.1)
+    assert not region.contains(48.0, 2.0)
+
+    feature = region.to_geojson()
+    assert feature['geometry']['type'] == 'MultiPolygon'
+    assert len(feature['geometry']['coordinates']) == feature['properties']['cells'] == len(region.cells)
+    ring = feature['geometry']['coordinates'][0][0]
+    assert ring[0] == ring[-1] and len(ring) == 5
+    best = feature['properties']['best']
+    assert region.contains(best['lat'], best['lon'])
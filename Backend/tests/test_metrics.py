@@ -0,0 +1,85 @@
+import pytest
+from utils import metrics
+
+@pytest.fixture
+def clean_metrics(monkeypatch):
+    metrics.reset()
+    monkeypatch.setattr(metrics, '_caches', {})
+    yield
+    metrics.reset()
+
+def _families(text):
+    """
+    {metric family: [sample lines]}, checking that every family is contiguous and typed once
+    """
+    families = {}
+    current = None
+    for line in text.splitlines():
+        if line.startswith('# TYPE '):
+            current = line.split()[2]
+            assert current not in families
+            families[current] = []
+        else:
+            assert line.split('{')[0].startswith(current)
+            families[current].append(line)
+    return families
+
+def test_histograms_are_cumulative(clean_metrics):
+    for seconds in (0.003, 0.02, 0.02, 0.7, 45.0):
+        metrics.observe('stage_latency_seconds', 'stage', 'geocode_address', seconds)
+
+    lines = _families(metrics.render_prometheus())['stage_latency_seconds']
+
+    buckets = {line.split('le="')[1].split('"')[0]: int(line.rsplit(' ', 1)[1]) for line in lines if '_bucket' in line}
+    assert buckets['0.005'] == 1
+    assert buckets['0.025'] == 3
+    assert buckets['1'] == 4
+    assert buckets['30'] == 4
+    assert buckets['+Inf'] == 5
+    assert list(buckets.values()) == sorted(buckets.values())
+    assert 'stage_latency_seconds_count{stage="geocode_address"} 5' in lines
+    assert float(next(line for line in lines if '_sum' in line).rsplit(' ', 1)[1]) == pytest.approx(45.743)
+
+def test_timed_stages_counters_and_caches_render(clean_metrics):
+    @metrics.timed('calculate_route')
+    def route(fail):
+        if fail:
+            raise RuntimeError('down')
+
+    route(False)
+    with pytest.raises(RuntimeError):
+        route(True)
+    metrics.record_fallback('calculate_route')
+    metrics.register_cache('geocode', lambda: {'hits': 3, 'misses': 1})
+    metrics.register_cache('broken', lambda: 1 / 0)
+
+    families = _families(metrics.render_prometheus())
+
+    assert families['stage_calls_total'] == ['stage_calls_total{stage="calculate_route"} 2']
+    assert families['stage_errors_total'] == ['stage_errors_total{stage="calculate_route"} 1']
+    assert families['stage_fallbacks_total'] == ['stage_fallbacks_total{stage="calculate_route"} 1']
+    assert 'stage_latency_seconds' in families
+    assert families['cache_hits_total'] == ['cache_hits_total{cache="geocode"} 3']
+    assert families['cache_misses_total'] == ['cache_misses_total{cache="geocode"} 1']
+    assert families['cache_hit_ratio'] == ['cache_hit_ratio{cache="geocode"} 0.75']
+
+def test_metrics_endpoint(clean_metrics):
+    import app as backend
+
+    metrics.increment('upstream_requests_total', 'host', 'router.project-osrm.org')
+    response = backend.app.test_client().get('/metrics')
+
+    assert response.status_code == 200
+    assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+    assert 'upstream_requests_total{host="router.project-osrm.org"} 1' in response.get_data(as_text=True)
+
+def test_traces_record_the_stages_of_a_request(clean_metrics):
+    trace = metrics.start_trace('search')
+    with metrics.timer('geocode_address'):
+        pass
+    metrics.record_fallback('calculate_route')
+    finished = metrics.finish_trace(trace)
+
+    assert [span['stage'] for span in finished['spans']] == ['geocode_address', 'calculate_route']
+    assert finished['spans'][1]['event'] == 'fallback'
+    assert metrics.get_trace(trace.id)['id'] == trace.id
@@ -0,0 +1,63 @@
+from sqlalchemy import event
+from models import db, MeetingPoint, POI, Route
+from utils.persistence import SearchResultWriter, save_search_result
+from utils.records import POI as POIRecord
+
+def _result(lat, pois):
+    return {'midpoint': [lat, 2.0], 'travel_time1': 10, 'travel_time2': 12, 'pois': pois}
+
+def _cafe(name):
+    return POIRecord(f'node/{len(name)}', name, 'Cafe', 48.0, 2.0, '1 Rue', cuisine='french')
+
+def test_search_results_round_trip_with_ids_in_order(db_app):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        results = [
+            _result(48.1, [_cafe('First'), {'name': 'Second', 'type': 'Bar', 'lat': 48.1, 'lon': 2.1, 'address': ''}]),
+            None,
+            _result(48.2, []),
+            _result(48.3, [_cafe('Third')])
+        ]
+        route_id = save_search_result('Paris', 'Lyon', [48.8, 2.3], [45.7, 4.8], results)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    def inserts(table):
+        return sum(statement.startswith(f'INSERT INTO {table} ') for statement in statements)
+
+    # POIs go in one executemany. SQLite cannot order the RETURNING rows of a multi-row INSERT,
+    # so SQLAlchemy sends meeting points row by row there (in one statement on PostgreSQL).
+    assert inserts('routes') == 1
+    assert inserts('pois') == 1
+    assert inserts('meeting_points') <= 3
+
+    route = db.session.get(Route, route_id)
+    assert (route.start_location, route.end_location, route.end_lat) == ('Paris', 'Lyon', 45.7)
+    meeting_points = sorted(route.meeting_points, key=lambda point: point.id)
+    assert [point.lat for point in meeting_points] == [48.1, 48.2, 48.3]
+    # POIs are attached to the meeting point of their own result
+    assert [[poi.name for poi in point.pois] for point in meeting_points] == [['First', 'Second'], [], ['Third']]
+    assert meeting_points[0].pois[0].details['cuisine'] == 'french'
+    assert meeting_points[0].pois[1].details == {}
+
+def test_a_search_without_results_stores_the_route_only(db_app):
+    route_id = save_search_result('Paris', 'Lyon', [48.8, 2.3], [45.7, 4.8], [None])
+
+    assert db.session.get(Route, route_id) is not None
+    assert db.session.query(MeetingPoint).count() == 0
+    assert db.session.query(POI).count() == 0
+
+def test_writer_persists_queued_searches(db_app):
+    writer = SearchResultWriter(db_app)
+
+    writer.enqueue('Paris', 'Lyon', [48.8, 2.3], [45.7, 4.8], [_result(48.1, [_cafe('First')])])
+    writer.enqueue('Nice', 'Lyon', [43.7, 7.3], [45.7, 4.8], [])
+    writer.flush()
+
+    assert [route.start_location for route in db.session.query(Route).order_by(Route.id)] == ['Paris', 'Nice']
+    assert db.session.query(POI).count() == 1
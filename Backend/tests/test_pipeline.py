@@ -0,0 +1,81 @@
+import threading
+import time
+from utils import pipeline
+
+def test_closing_a_batch_cancels_pending_geocodes(monkeypatch):
+    geocoded = []
+    lock = threading.Lock()
+
+    def slow_geocode(address):
+        time.sleep(0.05)
+        with lock:
+            geocoded.append(address)
+        return None
+
+    monkeypatch.setattr(pipeline, 'geocode_address', slow_geocode)
+    pairs = [(f'{i} Main St', f'{i} Oak Ave') for i in range(40)]
+    addresses, unique_pairs = pipeline.dedupe_pairs(pairs)
+
+    results = pipeline.iter_batch_midpoints(addresses, unique_pairs)
+    assert next(results)['error'] == 'Invalid locations'
+    results.close()
+
+    time.sleep(0.2)
+    assert len(geocoded) < len(addresses)
+
+def test_batch_geocodes_do_not_use_the_shared_executor(monkeypatch):
+    threads = set()
+
+    def geocode(address):
+        threads.add(threading.current_thread().name)
+        return None
+
+    monkeypatch.setattr(pipeline, 'geocode_address', geocode)
+    addresses, unique_pairs = pipeline.dedupe_pairs([('1 Main St', '2 Oak Ave'), ('3 Elm St', '4 Pine Rd')])
+
+    assert len(list(pipeline.iter_batch_midpoints(addresses, unique_pairs))) == 2
+    assert threads and all(name.startswith('batch-geocode') for name in threads)
+
+def test_route_results_overlap_their_upstream_calls(monkeypatch):
+    from utils import resilience
+    from utils.records import Route
+
+    budgets = []
+
+    def travel_time(origin, midpoint):
+        budgets.append(resilience.remaining())
+        time.sleep(0.2)
+        return 10
+
+    def ranked_pois(midpoint, point1, point2, radius, route, poi_search):
+        time.sleep(0.2)
+        return [{'name': f'POI near {midpoint[0]:.2f}'}]
+
+    monkeypatch.setattr(pipeline, 'calculate_travel_time', travel_time)
+    monkeypatch.setattr(pipeline, 'find_ranked_pois', ranked_pois)
+    routes = [Route([[48.0, 2.0], [48.2, 2.2]], durations=[60], distances=[1000]),
+              Route([[48.0, 2.0], [48.4, 2.4]], durations=[60], distances=[1000]),
+              Route([[48.0, 2.0]])]
+
+    start = time.monotonic()
+    with resilience.deadline(10):
+        results = pipeline.process_routes(routes, [48.0, 2.0], [48.4, 2.4])
+    elapsed = time.monotonic() - start
+
+    # Six calls of 0.2 s each, all in flight at once
+    assert elapsed < 0.5
+    assert [result['midpoint'] for result in results[:2]] == [[48.1, 2.1], [48.2, 2.2]]
+    assert results[1]['pois'] == [{'name': 'POI near 48.20'}]
+    assert results[0]['travel_time1'] == results[0]['travel_time2'] == 10
+    assert results[2] is None
+    # Worker threads run inside the caller's budget
+    assert len(budgets) == 4 and all(left is not None for left in budgets)
+
+def test_geocode_locations_keeps_the_order(monkeypatch):
+    def geocode(address):
+        time.sleep(0.1 if address == 'first' else 0)
+        return [len(address), 0.0]
+
+    monkeypatch.setattr(pipeline, 'geocode_address', geocode)
+
+    assert pipeline.geocode_locations('first', 'second!', 'x') == [[5, 0.0], [7, 0.0], [1, 0.0]]
@@ -0,0 +1,145 @@
+import json
+from utils import poi
+
+class FakeResponse:
+    def __init__(self, elements):
+        self.body = json.dumps({'version': 0.6, 'elements': elements}).encode()
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.body), chunk_size):
+            yield self.body[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+def _elements(kind, count):
+    return [
+        {'type': kind, 'id': i, 'lat': 48.0 + i * 1e-5, 'lon': 2.0, 'center': {'lat': 48.0, 'lon': 2.0 + i * 1e-5},
+         'tags': {'amenity': 'cafe', 'name': f'{kind} {i}'}}
+        for i in range(count)
+    ]
+
+def _fetch(monkeypatch, elements, limit):
+    queries = []
+
+    def post(url, data, **kwargs):
+        queries.append(data['data'])
+        return FakeResponse(elements)
+
+    monkeypatch.setattr(poi.upstream, 'post', post)
+    pois, complete = poi._fetch_overpass('48,2,49,3', limit=limit)
+    return pois, complete, queries[0]
+
+def test_unlimited_query_keeps_every_poi_and_is_complete(monkeypatch):
+    pois, complete, query = _fetch(monkeypatch, _elements('node', 600) + _elements('way', 10), None)
+
+    assert len(pois) == 610
+    assert complete
+    assert 'out qt;' in query
+
+def test_limit_applies_to_each_output_statement(monkeypatch):
+    pois, complete, query = _fetch(monkeypatch, _elements('node', 300) + _elements('way', 300), 500)
+    assert len(pois) == 600
+    assert complete
+    assert 'out qt 500;' in query
+
+    _, complete, _ = _fetch(monkeypatch, _elements('node', 500), 500)
+    assert not complete
+
+def test_overlapping_searches_fetch_each_cell_once(monkeypatch):
+    import threading
+    import time
+    from utils import geohash
+
+    fetched = []
+    lock = threading.Lock()
+
+    def fetch_cells(cells):
+        with lock:
+            fetched.extend(cells)
+        time.sleep(0.2)
+        return {cell: [] for cell in cells}, True
+
+    monkeypatch.setattr(poi, '_fetch_cells', fetch_cells)
+    monkeypatch.setattr(poi, 'get_poi_index', lambda: None)
+    poi._cell_cache.clear()
+
+    # About 2 km apart, so the cells covering both searches overlap without being identical
+    searches = [(51.5000, -0.1200), (51.5000, -0.0912)]
+    cells = [set(geohash.cells_covering(lat, lon, 1500, poi.POI_CELL_PRECISION)) for lat, lon in searches]
+    assert cells[0] & cells[1] and cells[0] != cells[1]
+
+    threads = [threading.Thread(target=poi.find_nearby_pois, args=search) for search in searches]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join(5)
+
+    assert sorted(fetched) == sorted(cells[0] | cells[1])
+
+def test_corridor_search_counts_pois_without_printing(monkeypatch, capsys):
+    from utils import metrics
+
+    monkeypatch.setattr(poi, 'get_poi_index', lambda: None)
+    monkeypatch.setattr(poi, '_fetch_overpass', lambda area, categories, limit=None: (
+        [{'name': 'Cafe', 'lat': 48.0, 'lon': 2.005}, {'name': 'Far', 'lat': 48.5, 'lon': 2.0}], True))
+    before = metrics.snapshot().get('pois_found_total', {}).get('find_pois_along', 0)
+
+    pois = poi.find_pois_along([[48.0, 2.0], [48.0, 2.01]], width=500)
+
+    assert [p['name'] for p in pois] == ['Cafe']
+    assert 'POIs along route' not in capsys.readouterr().out
+    assert metrics.snapshot()['pois_found_total']['find_pois_along'] == before + 1
+
+def _cafe(osm_id, lat, lon):
+    return poi.POI(f'node/{osm_id}', f'Cafe {osm_id}', 'Cafe', lat, lon, '')
+
+def test_nearby_searches_reuse_cached_cells(monkeypatch):
+    fetches = []
+
+    def fetch_overpass(area, categories=poi.POI_CATEGORIES, limit=None):
+        fetches.append(area)
+        return [_cafe(1, 51.5001, -0.1201), _cafe(2, 51.52, -0.12)], True
+
+    monkeypatch.setattr(poi, '_fetch_overpass', fetch_overpass)
+    monkeypatch.setattr(poi, 'get_poi_index', lambda: None)
+    poi._cell_cache.clear()
+
+    first = poi.find_nearby_pois(51.5, -0.12, 500)
+    second = poi.find_nearby_pois(51.5002, -0.1202, 400)
+
+    assert [p['name'] for p in first] == ['Cafe 1']
+    assert [p['name'] for p in second] == ['Cafe 1']
+    # One bounding-box query for all cells of the first search, none for the second
+    assert len(fetches) == 1
+
+def test_truncated_cells_are_served_but_not_cached(monkeypatch):
+    fetches = []
+
+    def fetch_overpass(area, categories=poi.POI_CATEGORIES, limit=None):
+        fetches.append(area)
+        return [_cafe(1, 48.0001, 2.0001)], False
+
+    monkeypatch.setattr(poi, '_fetch_overpass', fetch_overpass)
+    monkeypatch.setattr(poi, 'get_poi_index', lambda: None)
+    poi._cell_cache.clear()
+
+    assert len(poi.find_nearby_pois(48.0, 2.0, 300)) == 1
+    assert len(poi.find_nearby_pois(48.0, 2.0, 300)) == 1
+    assert len(fetches) == 2
+
+def test_cells_round_trip_through_the_database(db_app):
+    from utils import geohash
+
+    cell = geohash.encode(48.0, 2.0, poi.POI_CELL_PRECISION)
+    poi._store_cells({cell: [_cafe(7, 48.0, 2.0)], 'u0000z': []})
+
+    loaded = poi._load_cells([cell, 'u0000z', 'u0000y'])
+
+    assert set(loaded) == {cell, 'u0000z'}
+    assert [dict(p) for p in loaded[cell]] == [dict(_cafe(7, 48.0, 2.0))]
+    assert loaded['u0000z'] == []
@@ -0,0 +1,106 @@
+import numpy as np
+from utils.distance import polyline_distances
+from utils.poi_index import POIIndex
+
+def _index(lat, lon):
+    return POIIndex.from_pois([
+        {'osm_id': f'node/{i}', 'name': f'POI {i}', 'type': 'Cafe', 'lat': float(a), 'lon': float(b),
+         'address': '', 'details': {}, 'tags': ['amenity=cafe']}
+        for i, (a, b) in enumerate(zip(lat, lon))
+    ], leaf_size=16)
+
+def test_along_matches_brute_force_for_a_diagonal_line():
+    rng = np.random.default_rng(7)
+    lat = rng.uniform(37.0, 38.0, 20000)
+    lon = rng.uniform(-123.0, -122.0, 20000)
+    index = _index(lat, lon)
+    t = np.linspace(0, 1, 40)
+    line = np.column_stack((37.05 + 0.9 * t + 0.01 * np.sin(t * 20), -122.95 + 0.9 * t))
+
+    indices, distances = index.along(line, 1500)
+
+    expected = polyline_distances(np.column_stack((lat, lon)), line) * 1000
+    found = [int(poi.osm_id.split('/')[1]) for poi in index.records(indices)]
+    assert sorted(found) == sorted(np.nonzero(expected <= 1500)[0].tolist())
+    assert np.allclose(distances, expected[found])
+    assert np.all(np.diff(distances) >= 0)
+
+def test_along_a_single_point_is_a_radius_search():
+    rng = np.random.default_rng(3)
+    lat = rng.uniform(48.8, 48.9, 2000)
+    lon = rng.uniform(2.3, 2.4, 2000)
+    index = _index(lat, lon)
+
+    indices, _ = index.along([[48.85, 2.35]], 800)
+
+    expected = polyline_distances(np.column_stack((lat, lon)), [[48.85, 2.35]]) * 1000
+    assert len(indices) == int((expected <= 800).sum())
+
+def test_covers_the_extract_area_only(tmp_path):
+    index = _index([48.80, 48.90], [2.30, 2.40])
+    assert index.bbox == [48.80, 2.30, 48.90, 2.40]
+    assert index.covers([[48.85, 2.35]], 1000)
+    assert not index.covers([[48.85, 2.35]], 20000)
+    assert not index.covers([[48.85, 2.35], [48.95, 2.35]])
+
+    index.save(str(tmp_path))
+    loaded = POIIndex.load(str(tmp_path))
+    assert loaded.bbox == index.bbox
+
+    wider = POIIndex.from_pois([], bbox=[48.0, 2.0, 49.0, 3.0])
+    assert wider.covers([[48.5, 2.5]], 1000)
+
+def test_searches_outside_the_index_use_overpass(monkeypatch):
+    from utils import poi
+
+    index = _index([48.80, 48.85, 48.90], [2.30, 2.35, 2.40])
+    fetched = []
+    monkeypatch.setattr(poi, 'get_poi_index', lambda: index)
+    monkeypatch.setattr(poi, '_fetch_overpass', lambda area, *args, **kwargs: (fetched.append(area), ([], True))[1])
+
+    assert len(poi.find_nearby_pois(48.85, 2.35, 1000)) == 1
+    assert not fetched
+
+    assert poi.find_pois_along([[40.0, -75.0], [40.1, -75.1]], 1000) == []
+    assert fetched and fetched[0].startswith('around:1000,')
+
+def test_category_searches_match_any_tag_of_a_poi(tmp_path):
+    import json
+    from tools.build_poi_index import collect_pois, geojson_elements
+
+    features = [
+        {'type': 'Feature', 'id': 'node/1', 'geometry': {'type': 'Point', 'coordinates': [2.35, 48.85]},
+         'properties': {'name': 'Cafe in the park', 'amenity': 'cafe', 'leisure': 'park'}},
+        {'type': 'Feature', 'id': 'way/2', 'geometry': {'type': 'Point', 'coordinates': [2.351, 48.851]},
+         'properties': {'name': 'Corner shop', 'shop': 'convenience', 'amenity': 'atm'}},
+        {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [2.352, 48.852]},
+         'properties': {'name': 'Pub', 'amenity': 'pub', 'osm_id': 'n3'}},
+        {'type': 'Feature', 'id': 'node/abc', 'geometry': {'type': 'Point', 'coordinates': [2.353, 48.853]},
+         'properties': {'name': 'Bad id', 'amenity': 'bar'}}
+    ]
+    path = tmp_path / 'extract.geojson'
+    path.write_text(json.dumps({'type': 'FeatureCollection', 'features': features}))
+
+    pois = collect_pois(geojson_elements(str(path)))
+    assert [poi['osm_id'] for poi in pois] == ['node/1', 'way/2', 'node/3']
+    index = POIIndex.from_pois(pois)
+
+    def names(categories):
+        return sorted(poi.name for poi in index.query(48.85, 2.35, 1000, categories))
+
+    assert names({'leisure': ['park']}) == ['Cafe in the park']
+    assert names({'amenity': ['cafe']}) == ['Cafe in the park']
+    # Values outside the default categories, on category keys, are indexed too
+    assert names({'amenity': ['atm']}) == ['Corner shop']
+    assert names({'amenity': ['cafe', 'pub'], 'shop': ['supermarket']}) == ['Cafe in the park', 'Pub']
+    assert names(None) == ['Cafe in the park', 'Corner shop', 'Pub']
+
+def test_indexes_with_one_tag_per_point_still_load(tmp_path):
+    index = _index([48.85, 48.851], [2.35, 2.351])
+    index.save(str(tmp_path))
+    (tmp_path / 'tag_offsets.npy').unlink()
+
+    loaded = POIIndex.load(str(tmp_path))
+
+    assert len(loaded.query(48.85, 2.35, 1000, {'amenity': ['cafe']})) == 2
+    assert loaded.query(48.85, 2.35, 1000, {'amenity': ['pub']}) == []
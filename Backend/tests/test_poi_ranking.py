@@ -0,0 +1,54 @@
+import heapq
+import random
+from utils import poi_ranking
+
+def _pois(count):
+    return [{'name': f'POI {i}', 'lat': 48.0 + i * 1e-3, 'lon': 2.0} for i in range(count)]
+
+def _matrix(calls, times):
+    def matrix(sources, destinations):
+        calls.append((len(sources), len(destinations)))
+        return [[times[i][0] if times[i] else None for i in range(len(destinations))],
+                [times[i][1] if times[i] else None for i in range(len(destinations))]]
+    return matrix
+
+def test_top_k_matches_a_full_sort_by_score(monkeypatch):
+    rng = random.Random(4)
+    times = [(rng.uniform(5, 60), rng.uniform(5, 60)) for _ in range(150)]
+    times[7] = None  # Unreachable
+    calls = []
+    monkeypatch.setattr(poi_ranking, 'calculate_travel_time_matrix', _matrix(calls, times))
+
+    ranked = poi_ranking.rank_pois_by_fairness(_pois(150), [48.0, 2.0], [48.5, 2.5], k=10)
+
+    # One request, capped to the table size, nearest candidates first
+    assert calls == [(2, poi_ranking.POI_RANKING_MAX_CANDIDATES)]
+    scores = {i: abs(t[0] - t[1]) + 0.25 * (t[0] + t[1])
+              for i, t in enumerate(times[:poi_ranking.POI_RANKING_MAX_CANDIDATES]) if t}
+    expected = heapq.nsmallest(10, scores, key=scores.get)
+    assert [poi['name'] for poi in ranked] == [f'POI {i}' for i in expected]
+    assert [poi['score'] for poi in ranked] == [round(scores[i], 2) for i in expected]
+    assert ranked[0]['travel_time1'] == round(times[expected[0]][0])
+
+def test_fair_pois_beat_nearer_but_lopsided_ones(monkeypatch):
+    monkeypatch.setattr(poi_ranking, 'calculate_travel_time_matrix', _matrix([], [(2, 40), (20, 22), (15, 30)]))
+
+    ranked = poi_ranking.rank_pois_by_fairness(_pois(3), [48.0, 2.0], [48.5, 2.5])
+
+    assert [poi['name'] for poi in ranked] == ['POI 1', 'POI 2', 'POI 0']
+
+def test_failed_matrix_returns_the_nearest_pois_unranked(monkeypatch):
+    monkeypatch.setattr(poi_ranking, 'calculate_travel_time_matrix', lambda sources, destinations: None)
+
+    ranked = poi_ranking.rank_pois_by_fairness(_pois(20), [48.0, 2.0], [48.5, 2.5], k=5)
+
+    assert [poi['name'] for poi in ranked] == [f'POI {i}' for i in range(5)]
+    assert all('score' not in poi for poi in ranked)
+    assert poi_ranking.rank_pois_by_fairness([], [48.0, 2.0], [48.5, 2.5]) == []
+
+def test_detour_ranking_measures_against_the_route(monkeypatch):
+    monkeypatch.setattr(poi_ranking, 'calculate_travel_time_matrix', _matrix([], [(30, 32), (20, 50), (31, 31)]))
+
+    ranked = poi_ranking.rank_pois_by_detour(_pois(3), [48.0, 2.0], [48.5, 2.5], route_minutes=60)
+
+    assert [(poi['name'], poi['detour']) for poi in ranked] == [('POI 2', 2), ('POI 0', 2), ('POI 1', 10)]
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+from utils.records import Route
+
+def test_route_lists_are_owned_by_the_caller():
+    route = Route([[48.0, 2.0], [48.1, 2.1], [48.2, 2.2]], durations=[10, 20], distances=[100, 200])
+
+    points = route.tolist()
+    points[0][0] = 0.0
+    points.append([1.0, 1.0])
+
+    assert route.tolist() == [[48.0, 2.0], [48.1, 2.1], [48.2, 2.2]]
+    assert list(route) == route.tolist()
+
+def test_route_arrays_are_read_only():
+    route = Route([[48.0, 2.0], [48.1, 2.1]], durations=[10], distances=[100])
+
+    with pytest.raises(ValueError):
+        np.asarray(route)[0, 0] = 0.0
+    with pytest.raises(ValueError):
+        route.durations[0] = 0.0
+    assert route[0:2].duration == 10.0
@@ -0,0 +1,71 @@
+import contextvars
+import pytest
+from utils import resilience, upstream
+
+def _open_breaker(host: str) -> resilience.CircuitBreaker:
+    breaker = resilience.get_breaker(host)
+    breaker.reset_seconds = 0
+    for _ in range(breaker.failure_threshold):
+        breaker.allow()
+        breaker.record(False)
+    assert breaker.opened_at is not None
+    return breaker
+
+def test_probe_is_not_taken_when_the_deadline_has_passed():
+    breaker = _open_breaker('expired.breaker.test')
+
+    with resilience.deadline(0):
+        with pytest.raises(resilience.DeadlineExceeded):
+            upstream.request('GET', 'http://expired.breaker.test/')
+
+    assert not breaker.probing
+    assert breaker.allow() is True
+
+def test_probe_is_released_when_the_call_fails_locally(monkeypatch):
+    breaker = _open_breaker('local-error.breaker.test')
+
+    class FailingSession:
+        def request(self, *args, **kwargs):
+            raise ValueError('bad request body')
+
+    monkeypatch.setattr(upstream, 'get_session', lambda: FailingSession())
+    with pytest.raises(ValueError):
+        upstream.request('GET', 'http://local-error.breaker.test/')
+    assert not breaker.probing
+
+    def fail():
+        raise KeyError('parse error')
+
+    with pytest.raises(KeyError):
+        upstream.call_with_retries(fail, host='local-error.breaker.test')
+    assert not breaker.probing
+    assert breaker.allow() is True
+
+def test_probe_outcome_closes_the_circuit():
+    breaker = _open_breaker('probe.breaker.test')
+
+    assert upstream.call_with_retries(lambda: 'ok', host='probe.breaker.test') == 'ok'
+    assert breaker.state == 'closed'
+    assert breaker.allow() is False
+
+def test_finishing_from_another_context_restores_the_enclosing_budget():
+    with resilience.deadline(10) as outer:
+        inner = resilience.start_deadline(5)
+        # e.g. a Streamlit rerun finishing the budget in a copied context
+        context = contextvars.copy_context()
+        context.run(resilience.finish_deadline, inner)
+        assert context.run(resilience._current_budget.get) is outer
+        resilience.finish_deadline(inner)
+        assert resilience._current_budget.get() is outer
+    assert resilience._current_budget.get() is None
+
+def test_is_degraded_reads_the_current_budget():
+    assert not resilience.is_degraded()
+
+    with resilience.deadline(10):
+        assert not resilience.is_degraded('calculate_route')
+        resilience.record_fallback('geocode_address')
+        assert resilience.is_degraded()
+        assert not resilience.is_degraded('calculate_route')
+        resilience.record_fallback('calculate_route')
+        assert resilience.is_degraded('calculate_route')
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from utils.distance import distances_from
+from utils.road_graph import RoadGraph, make_grid_graph
+from utils.routing_backends import LocalGraphBackend, RoutingBackend
+
+def test_nearest_node_matches_a_linear_scan():
+    rng = np.random.default_rng(5)
+    graphs = [
+        make_grid_graph(30, 40),
+        RoadGraph.from_edges(rng.uniform([40.0, -75.0], [40.5, -74.5], (5000, 2)), []),
+        RoadGraph.from_edges([[48.85, 2.35]], [])
+    ]
+    # Points inside and well outside the graphs
+    points = np.column_stack((rng.uniform(39.5, 41.0, 200), rng.uniform(-75.5, -74.0, 200)))
+
+    for graph in graphs:
+        for lat, lon in points:
+            expected = distances_from([lat, lon], graph.nodes).min()
+            node = graph.nearest_node(lat, lon)
+            assert np.isclose(distances_from([lat, lon], graph.nodes[[node]])[0], expected)
+
+def _expected_seconds(graph, rows, cols, speed_kmh=50.0):
+    """
+    Fastest time from the south-west corner of make_grid_graph to each node: north first, then
+    east along the target row, whose longitude edges are the shortest of the rectangle
+    """
+    def seconds(a, b):
+        return float(distances_from(graph.nodes[a], graph.nodes[[b]])[0]) * 1000 / (speed_kmh / 3.6)
+
+    lat_edge = seconds(0, cols)
+    return {
+        row * cols + col: row * lat_edge + col * seconds(row * cols, row * cols + 1)
+        for row in range(rows) for col in range(cols)
+    }
+
+def test_grid_graph_shortest_paths_and_durations():
+    graph = make_grid_graph(12, 15)
+    expected = _expected_seconds(graph, 12, 15)
+
+    for target in (1, 15, 14, 12 * 15 - 1, 7 * 15 + 9):
+        seconds, edges = graph.shortest_path(0, target)
+        assert np.isclose(seconds, expected[target], rtol=1e-5)
+        assert np.isclose(float(graph.durations[edges].sum()), seconds, rtol=1e-5)
+        nodes = graph.path_nodes(0, edges)
+        assert nodes[0] == 0 and nodes[-1] == target
+        assert len(edges) == target // 15 + target % 15
+
+    settled = graph.dijkstra(0)
+    assert all(np.isclose(settled[node], cost, rtol=1e-5) for node, cost in expected.items())
+
+def test_local_backend_matches_the_grid_graph():
+    graph = make_grid_graph(10, 10)
+    backend = LocalGraphBackend(graph)
+    expected = _expected_seconds(graph, 10, 10)
+    origin = graph.nodes[0].tolist()
+    # Slightly off the nodes, so the points have to be snapped
+    destinations = [(graph.nodes[node] + 0.001).tolist() for node in (9, 55, 99)]
+
+    route = backend.routes(origin, destinations[2])[0]
+    assert len(route) == 19
+    assert np.allclose(route.coordinates[[0, -1]], graph.nodes[[0, 99]])
+    assert np.isclose(route.duration, expected[99], rtol=1e-5)
+    assert np.isclose(backend.duration(origin, destinations[1]), expected[55], rtol=1e-5)
+
+    matrix = backend.table([origin, graph.nodes[99].tolist()], destinations)
+    assert np.allclose(matrix[0], [expected[9], expected[55], expected[99]], rtol=1e-5)
+    assert matrix[1][2] == 0.0
+    assert np.isclose(matrix[1][0], graph.shortest_path(99, 9)[0], rtol=1e-5)
+
+    isolated = LocalGraphBackend(RoadGraph.from_edges([[40.0, -75.0], [40.5, -75.5]], []))
+    assert isolated.table([[40.0, -75.0]], [[40.5, -75.5]]) == [[None]]
+
+    with pytest.raises(TypeError):
+        RoutingBackend()
@@ -0,0 +1,32 @@
+import pytest
+from utils import routing
+
+def _linear_matrix(calls, equal_time_index, minutes_per_point):
+    def matrix(sources, destinations):
+        calls.append(len(destinations))
+        # Candidates are [i, 0] points, so the latitude is the route index
+        return [[point[0] * minutes_per_point for point in destinations],
+                [(2 * equal_time_index - point[0]) * minutes_per_point for point in destinations]]
+    return matrix
+
+@pytest.mark.parametrize('minutes_per_point', [0.01, 1.0])
+def test_midpoint_search_converges_within_the_tolerance(monkeypatch, minutes_per_point):
+    calls = []
+    monkeypatch.setattr(routing, 'calculate_travel_time_matrix', _linear_matrix(calls, 1837, minutes_per_point))
+    route = [[float(i), 0.0] for i in range(5000)]
+
+    index = routing.calculate_midpoint(route)[0]
+
+    # Time difference at the chosen point: 2 * minutes_per_point per point away from 1837
+    assert abs(index - 1837) * 2 * minutes_per_point <= max(routing.MIDPOINT_TOLERANCE_MINUTES, 2 * minutes_per_point)
+    assert 2 <= len(calls) <= 1 + routing.MIDPOINT_MAX_REFINE_ROUNDS
+    assert all(count <= max(len(routing.MIDPOINT_PERCENTAGES), routing.MIDPOINT_REFINE_SAMPLES) for count in calls)
+
+def test_midpoint_search_stops_once_within_the_tolerance(monkeypatch):
+    calls = []
+    monkeypatch.setattr(routing, 'calculate_travel_time_matrix', _linear_matrix(calls, 2500, 0.2))
+    route = [[float(i), 0.0] for i in range(5000)]
+
+    # The coarse round already samples the 50% point
+    assert routing.calculate_midpoint(route) == [2500.0, 0.0]
+    assert len(calls) == 1
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from utils.distance import polyline_distances
+from utils.simplify import douglas_peucker_mask, simplify_route, tolerance_for_zoom
+
+def _wiggly_route(count=2000, seed=5):
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0, 1, count)
+    # About 11 km north-east with meanders and ~5 m of GPS-like noise
+    lat = 48.0 + 0.1 * t + 0.002 * np.sin(t * 40) + rng.normal(0, 4.5e-5, count)
+    lon = 2.0 + 0.1 * t + rng.normal(0, 4.5e-5, count)
+    return np.column_stack((lat, lon))
+
+@pytest.mark.parametrize('tolerance_m', [5, 25, 100])
+def test_douglas_peucker_keeps_every_point_within_the_tolerance(tolerance_m):
+    route = _wiggly_route()
+
+    simplified = simplify_route(route, tolerance_m=tolerance_m)
+
+    deviations = polyline_distances(route, simplified) * 1000
+    # The simplifier measures in its own local projection; allow for the difference
+    assert deviations.max() <= tolerance_m * 1.01
+    assert simplified[0] == route[0].tolist() and simplified[-1] == route[-1].tolist()
+    assert 2 < len(simplified) < len(route)
+
+def test_larger_tolerances_keep_fewer_points():
+    route = _wiggly_route()
+
+    counts = [len(simplify_route(route, tolerance_m=tolerance)) for tolerance in (1, 10, 50, 200)]
+
+    assert counts == sorted(counts, reverse=True)
+    assert counts[0] > counts[-1]
+
+def test_straight_lines_collapse_and_spikes_survive():
+    line = np.column_stack((np.linspace(48.0, 48.1, 50), np.full(50, 2.0)))
+    assert douglas_peucker_mask(line, 1.0).sum() == 2
+
+    line[25, 1] += 0.001  # ~74 m sideways
+    assert douglas_peucker_mask(line, 50.0)[25]
+    assert not douglas_peucker_mask(line, 100.0)[25]
+
+def test_visvalingam_drops_small_details_only():
+    route = _wiggly_route()
+
+    simplified = simplify_route(route, tolerance_m=25, method='visvalingam')
+
+    assert 2 < len(simplified) < len(route)
+    assert (polyline_distances(route, simplified) * 1000).max() < 200
+
+def test_zoom_tolerance():
+    assert tolerance_for_zoom(0) == pytest.approx(156543.03392)
+    assert tolerance_for_zoom(10, lat=60.0) == pytest.approx(156543.03392 / 2 / 1024)
+    zoomed_in = simplify_route(_wiggly_route(), zoom=16)
+    zoomed_out = simplify_route(_wiggly_route(), zoom=10)
+    assert len(zoomed_out) < len(zoomed_in)
+
+def test_bad_arguments():
+    with pytest.raises(ValueError):
+        simplify_route(_wiggly_route())
+    with pytest.raises(ValueError):
+        simplify_route(_wiggly_route(), tolerance_m=10, method='radial')
+    assert simplify_route([[48.0, 2.0]], tolerance_m=10) == [[48.0, 2.0]]
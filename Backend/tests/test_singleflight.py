@@ -0,0 +1,141 @@
+import threading
+import time
+import pytest
+from utils import resilience
+from utils.singleflight import SingleFlight
+
+def test_waiters_share_the_leaders_degraded_stages():
+    flight = SingleFlight('degraded-test')
+    started = threading.Event()
+    release = threading.Event()
+    budgets = {}
+    calls = []
+
+    def fallback():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        resilience.record_fallback('calculate_travel_time')
+        return 42
+
+    def search(name):
+        with resilience.deadline(10) as budget:
+            budgets[name] = budget
+            assert flight.do('key', fallback) == 42
+
+    leader = threading.Thread(target=search, args=('leader',))
+    leader.start()
+    started.wait(5)
+    waiter = threading.Thread(target=search, args=('waiter',))
+    waiter.start()
+    # Give the waiter time to join the leader's call
+    time.sleep(0.2)
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+
+    assert len(calls) == 1
+    assert budgets['leader'].degraded == {'calculate_travel_time'}
+    assert budgets['waiter'].degraded == {'calculate_travel_time'}
+
+def _hold(flight, keys, fn):
+    started = threading.Event()
+    release = threading.Event()
+
+    def run():
+        def held(claimed):
+            started.set()
+            release.wait(5)
+            return fn(claimed)
+        flight.do_many(keys, held)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    started.wait(5)
+    return thread, release
+
+def test_processes_with_overlapping_keys_fetch_shared_keys_once(tmp_path):
+    # Two groups on the same lock directory stand in for two worker processes
+    first = SingleFlight('cells', cross_process=True, lock_dir=str(tmp_path))
+    second = SingleFlight('cells', cross_process=True, lock_dir=str(tmp_path))
+    assert len({first._stripe(key) for key in 'abc'}) == 3
+    shared_cache = {}
+    fetched = []
+
+    def fetch(claimed):
+        found = {key: shared_cache[key] for key in claimed if key in shared_cache}
+        for key in claimed:
+            if key not in found:
+                fetched.append(key)
+                found[key] = shared_cache[key] = key.upper()
+        return found
+
+    thread, release = _hold(first, ['a', 'b'], fetch)
+    other = threading.Thread(target=lambda: second.do_many(['b', 'c'], fetch))
+    other.start()
+    time.sleep(0.2)
+    release.set()
+    thread.join(5)
+    other.join(5)
+
+    assert sorted(fetched) == ['a', 'b', 'c']
+
+def test_process_lock_wait_is_bounded_by_the_deadline(tmp_path):
+    first = SingleFlight('cells', cross_process=True, lock_dir=str(tmp_path))
+    second = SingleFlight('cells', cross_process=True, lock_dir=str(tmp_path))
+    thread, release = _hold(first, ['a'], lambda claimed: {'a': 1})
+
+    start = time.monotonic()
+    with resilience.deadline(0.3):
+        assert second.do('a', lambda: 2) == 2
+    elapsed = time.monotonic() - start
+    release.set()
+    thread.join(5)
+
+    assert 0.25 < elapsed < 1
+
+def test_threads_share_a_stripe_lock(tmp_path, monkeypatch):
+    monkeypatch.setattr('utils.singleflight.SINGLEFLIGHT_LOCK_STRIPES', 1)
+    flight = SingleFlight('cells', cross_process=True, lock_dir=str(tmp_path))
+    both_running = threading.Barrier(2, timeout=2)
+
+    def fetch():
+        # Fails with BrokenBarrierError if unrelated keys were serialized on the stripe
+        both_running.wait()
+        return True
+
+    results = []
+    threads = [threading.Thread(target=lambda key=key: results.append(flight.do(key, fetch))) for key in 'ab']
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == [True, True]
+    assert flight._stripes == {}
+
+def test_waiters_give_up_at_their_own_deadline():
+    flight = SingleFlight('slow-test')
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return 1
+
+    # A leader without a deadline, like a batch geocode
+    leader = threading.Thread(target=lambda: flight.do('key', slow))
+    leader.start()
+    started.wait(5)
+
+    start = time.monotonic()
+    with resilience.deadline(0.2):
+        with pytest.raises(resilience.DeadlineExceeded):
+            flight.do('key', slow)
+        assert flight.do_many(['key', 'other'], lambda claimed: {key: 2 for key in claimed}) == {'other': 2}
+    elapsed = time.monotonic() - start
+    release.set()
+    leader.join(5)
+
+    assert elapsed < 1
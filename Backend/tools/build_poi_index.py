@@ -0,0 +1,191 @@
+"""
+Bulk-load POIs from an OpenStreetMap extract into the memory-mapped index used by find_nearby_pois
+
+Run from the Backend directory:
+    python -m tools.build_poi_index OUTPUT_DIR --geojson extract.geojson
+    python -m tools.build_poi_index OUTPUT_DIR --pbf region-latest.osm.pbf   (needs the osmium package)
+    python -m tools.build_poi_index OUTPUT_DIR --synthetic 100000 [--center 37.77,-122.42] [--spread-km 20]
+
+Only elements matching utils.poi.POI_CATEGORIES with a name are kept; ways and polygons are
+reduced to the center of their bounding box, like Overpass 'out center'.
+GeoJSON features take their tags from properties (flat or under "tags") and their OSM id from
+the feature id ("node/123") or the @id / osm_type + osm_id properties ("123", "n123" and
+"node/123" are all accepted); features whose id is not numeric are skipped.
+Every POI keeps all its tags under the category keys, so that searches with other categories
+(find_nearby_pois(categories=...)) match on any of them.
+
+--bbox south,west,north,east records the area the extract covers (by default the extent of its
+POIs); searches reaching outside it are sent to Overpass instead.
+
+Then start the app with POI_INDEX_PATH=OUTPUT_DIR.
+"""
+import argparse
+import random
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from utils.json_stream import JSONArrayStream
+from utils.poi import POI_CATEGORIES, category_tags, match_category, parse_element
+from utils.poi_index import OSM_TYPES, POIIndex
+
+# "node/123", "n123" or a bare "123"
+OSM_ID_PATTERN = re.compile(r'(node|way|relation|[nwr])?/?(\d+)')
+OSM_TYPE_ABBREVIATIONS = {'n': 'node', 'w': 'way', 'r': 'relation'}
+
+def _center(coordinates) -> Optional[List[float]]:
+    """
+    [lat, lon] center of the bounding box of nested GeoJSON [lon, lat] coordinates
+    """
+    points = []
+    stack = [coordinates]
+    while stack:
+        item = stack.pop()
+        if len(item) >= 2 and all(isinstance(value, (int, float)) for value in item[:2]):
+            points.append(item)
+        else:
+            stack.extend(item)
+    if not points:
+        return None
+    lons = [point[0] for point in points]
+    lats = [point[1] for point in points]
+    return [(min(lats) + max(lats)) / 2, (min(lons) + max(lons)) / 2]
+
+def parse_osm_id(value: Any, default_type: str = 'node') -> Optional[Tuple[str, int]]:
+    """
+    (osm_type, numeric id) of an OSM id in one of the usual GeoJSON forms, or None
+    """
+    match = OSM_ID_PATTERN.fullmatch(str(value).strip())
+    if not match:
+        return None
+    osm_type = OSM_TYPE_ABBREVIATIONS.get(match.group(1), match.group(1) or default_type)
+    if osm_type not in OSM_TYPES:
+        return None
+    return osm_type, int(match.group(2))
+
+def _element(osm_type: str, osm_id: int, lat: float, lon: float, tags: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Element shaped like Overpass output: nodes carry lat/lon, ways and relations a center
+    """
+    if osm_type == 'node':
+        return {'type': osm_type, 'id': osm_id, 'lat': lat, 'lon': lon, 'tags': tags}
+    return {'type': osm_type, 'id': osm_id, 'center': {'lat': lat, 'lon': lon}, 'tags': tags}
+
+def geojson_elements(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Overpass-style elements from a GeoJSON FeatureCollection, streamed feature by feature
+    """
+    def chunks():
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(1 << 20)
+                if not chunk:
+                    return
+                yield chunk
+
+    skipped = 0
+    for number, feature in enumerate(JSONArrayStream(chunks(), 'features')):
+        properties = feature.get('properties') or {}
+        tags = properties.get('tags') or {key: value for key, value in properties.items() if isinstance(value, str)}
+
+        osm = ('node', number)
+        feature_id = str(feature.get('id') or properties.get('@id') or '')
+        if '/' in feature_id:
+            osm = parse_osm_id(feature_id)
+        elif properties.get('osm_id') is not None:
+            osm = parse_osm_id(properties['osm_id'], properties.get('osm_type', 'node'))
+        if osm is None:
+            skipped += 1
+            continue
+
+        geometry = feature.get('geometry') or {}
+        center = _center(geometry.get('coordinates') or [])
+        if center is None:
+            continue
+        yield _element(osm[0], osm[1], center[0], center[1], tags)
+
+    if skipped:
+        print(f"Skipped {skipped} features without a numeric OSM id")
+
+def pbf_elements(path: str) -> List[Dict[str, Any]]:
+    """
+    Overpass-style elements for the matching nodes and ways of an OSM PBF extract
+    """
+    try:
+        import osmium
+    except ImportError:
+        raise SystemExit("Reading PBF files requires the osmium package (pip install osmium)")
+
+    elements = []
+
+    class Handler(osmium.SimpleHandler):
+        def node(self, node):
+            tags = {tag.k: tag.v for tag in node.tags}
+            if match_category(tags) and node.location.valid():
+                elements.append(_element('node', node.id, node.location.lat, node.location.lon, tags))
+
+        def way(self, way):
+            tags = {tag.k: tag.v for tag in way.tags}
+            if not match_category(tags):
+                return
+            center = _center([[n.location.lon, n.location.lat] for n in way.nodes if n.location.valid()])
+            if center:
+                elements.append(_element('way', way.id, center[0], center[1], tags))
+
+    # locations=True keeps node locations so that way centers can be computed
+    Handler().apply_file(path, locations=True)
+    return elements
+
+def synthetic_elements(count: int, center: List[float], spread_km: float, seed: int = 1) -> Iterator[Dict[str, Any]]:
+    rng = random.Random(seed)
+    tags = [f"{key}={value}" for key, values in POI_CATEGORIES.items() for value in values]
+    spread = spread_km / 111.32
+    for i in range(count):
+        key, value = rng.choice(tags).split('=')
+        yield {
+            'type': 'node',
+            'id': i + 1,
+            'lat': center[0] + rng.uniform(-spread, spread),
+            'lon': center[1] + rng.uniform(-spread, spread),
+            'tags': {key: value, 'name': f"Place {i + 1}"}
+        }
+
+def collect_pois(elements) -> List[Dict[str, Any]]:
+    pois = []
+    seen = set()
+    for element in elements:
+        poi = parse_element(element) if match_category(element['tags']) else None
+        if not poi or poi['osm_id'] in seen:
+            continue
+        seen.add(poi['osm_id'])
+        pois.append(dict(poi, tags=category_tags(element['tags'])))
+    return pois
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('output')
+    parser.add_argument('--geojson')
+    parser.add_argument('--pbf')
+    parser.add_argument('--synthetic', type=int, metavar='COUNT')
+    parser.add_argument('--center', default='37.77,-122.42', help='lat,lon of the synthetic POIs')
+    parser.add_argument('--spread-km', type=float, default=20.0)
+    parser.add_argument('--bbox', help='south,west,north,east covered by the extract')
+    args = parser.parse_args()
+
+    if args.geojson:
+        elements = geojson_elements(args.geojson)
+    elif args.pbf:
+        elements = pbf_elements(args.pbf)
+    elif args.synthetic:
+        elements = synthetic_elements(args.synthetic, [float(value) for value in args.center.split(',')], args.spread_km)
+    else:
+        parser.error("one of --geojson, --pbf or --synthetic is required")
+
+    bbox = [float(value) for value in args.bbox.split(',')] if args.bbox else None
+    if bbox is not None and len(bbox) != 4:
+        parser.error("--bbox needs south,west,north,east")
+    index = POIIndex.from_pois(collect_pois(elements), bbox=bbox)
+    index.save(args.output)
+    print(f"Wrote {len(index)} POIs ({len(index.tags)} categories, tree depth {index.depth}) to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Preprocess a road network into the memory-mapped graph format used by the local routing backend
+
+Run from the Backend directory:
+    python -m tools.build_road_graph OUTPUT_DIR --nodes nodes.csv --edges edges.csv
+    python -m tools.build_road_graph OUTPUT_DIR --synthetic-grid 50x50
+
+nodes.csv columns: id,lat,lon
+edges.csv columns: source,target,duration_s,distance_m[,oneway]  (oneway defaults to 1)
+
+Then start the app with ROUTING_BACKEND=local ROAD_GRAPH_PATH=OUTPUT_DIR.
+"""
+import argparse
+import csv
+
+from utils.road_graph import RoadGraph, make_grid_graph
+
+def read_csv_graph(nodes_path: str, edges_path: str) -> RoadGraph:
+    index = {}
+    nodes = []
+    with open(nodes_path, newline='') as f:
+        for row in csv.DictReader(f):
+            index[row['id']] = len(nodes)
+            nodes.append([float(row['lat']), float(row['lon'])])
+
+    edges = []
+    with open(edges_path, newline='') as f:
+        for row in csv.DictReader(f):
+            source, target = index[row['source']], index[row['target']]
+            duration, distance = float(row['duration_s']), float(row['distance_m'])
+            edges.append((source, target, duration, distance))
+            if row.get('oneway', '1').strip() in ('0', 'false', 'no'):
+                edges.append((target, source, duration, distance))
+    return RoadGraph.from_edges(nodes, edges)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('output')
+    parser.add_argument('--nodes')
+    parser.add_argument('--edges')
+    parser.add_argument('--synthetic-grid', metavar='ROWSxCOLS')
+    args = parser.parse_args()
+
+    if args.synthetic_grid:
+        rows, cols = (int(value) for value in args.synthetic_grid.lower().split('x'))
+        graph = make_grid_graph(rows, cols)
+    elif args.nodes and args.edges:
+        graph = read_csv_graph(args.nodes, args.edges)
+    else:
+        parser.error("either --synthetic-grid or both --nodes and --edges are required")
+
+    graph.save(args.output)
+    print(f"Wrote {graph.node_count} nodes and {len(graph.targets)} edges to {args.output}")
+
+if __name__ == '__main__':
+    main()
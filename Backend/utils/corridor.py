@@ -0,0 +1,65 @@
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from utils.distance import cumulative_distances
+from utils.poi import find_pois_along
+from utils.poi_ranking import rank_pois_by_detour
+from utils.records import Route
+from utils.simplify import simplify_route
+
+# Part of the route searched in corridor mode, as fractions of its travel time
+CORRIDOR_SECTION = (0.4, 0.6)
+# How far from the route a POI may be, in meters
+CORRIDOR_WIDTH_M = int(os.environ.get('CORRIDOR_WIDTH_M', '1500'))
+# Initial simplification tolerance of the corridor line; doubled until it has few enough points
+CORRIDOR_SIMPLIFY_TOLERANCE_M = 100
+# Each point becomes a coordinate pair in the Overpass around filter
+CORRIDOR_MAX_POINTS = 100
+
+def route_section(coordinates: Sequence[Sequence[float]], durations: Optional[Sequence[float]] = None,
+                  section: Tuple[float, float] = CORRIDOR_SECTION) -> np.ndarray:
+    """
+    The part of a [lat, lon] polyline between two fractions of its travel time
+    Falls back to fractions of its length when there are no per-segment durations.
+    Both ends are interpolated inside their segments.
+    """
+    coords = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+    if len(coords) < 2:
+        return coords
+
+    if durations is not None and len(durations) == len(coords) - 1:
+        cumulative = np.concatenate(([0.0], np.cumsum(np.asarray(durations, dtype=float))))
+    else:
+        cumulative = cumulative_distances(coords)
+    total = cumulative[-1]
+    if not np.isfinite(total) or total <= 0:
+        return coords[:1]
+
+    start, end = total * section[0], total * section[1]
+    inside = np.nonzero((cumulative > start) & (cumulative < end))[0]
+    ends = [np.interp(value, cumulative, coords[:, axis]) for value in (start, end) for axis in (0, 1)]
+    return np.vstack(([ends[0], ends[1]], coords[inside], [ends[2], ends[3]]))
+
+def corridor_line(route: Route, section: Tuple[float, float] = CORRIDOR_SECTION) -> List[List[float]]:
+    """
+    Simplified [lat, lon] line of the middle section of a route from calculate_route_annotated,
+    with at most CORRIDOR_MAX_POINTS points
+    """
+    line = route_section(route.coordinates, route.durations, section)
+    tolerance = CORRIDOR_SIMPLIFY_TOLERANCE_M
+    simplified = simplify_route(line, tolerance_m=tolerance)
+    while len(simplified) > CORRIDOR_MAX_POINTS:
+        tolerance *= 2
+        simplified = simplify_route(line, tolerance_m=tolerance)
+    return simplified
+
+def find_corridor_pois(route: Route, point1: List[float], point2: List[float],
+                       width: int = CORRIDOR_WIDTH_M) -> List[Dict[str, Any]]:
+    """
+    POIs along the middle section of a route, ranked by the detour they add to the trip
+    Uses one spatial query over the simplified section and one travel-time matrix request
+    """
+    pois = find_pois_along(corridor_line(route), width)
+    # Same adjustment as calculate_travel_time_matrix
+    route_minutes = route.duration / 60 * 0.91 if route.duration else None
+    return rank_pois_by_detour(pois, point1, point2, route_minutes)
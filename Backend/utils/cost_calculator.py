@@ -1,6 +1,6 @@
 from typing import Dict, Any, Optional
 import requests
-from geopy.distance import geodesic
+from utils.distance import polyline_length
 
 def calculate_route_costs(route: list, fuel_price_per_gallon: float = 3.50) -> Dict[str, Any]:
     """
@@ -15,12 +15,8 @@ def calculate_route_costs(route: list, fuel_price_per_gallon: float = 3.50) -> D
             'total_cost': 0
         }
 
-    # Calculate total distance in kilometers
-    total_distance_km = 0
-    for i in range(len(route) - 1):
-        point1 = route[i]
-        point2 = route[i + 1]
-        total_distance_km += geodesic(point1, point2).kilometers
+    # Calculate total distance in kilometers (vectorized over all segments)
+    total_distance_km = polyline_length(route, method='ellipsoidal')
 
     # Convert to miles
     total_distance_miles = total_distance_km * 0.621371
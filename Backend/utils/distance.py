@@ -0,0 +1,143 @@
+import numpy as np
+from typing import List, Optional, Sequence
+
+# Mean Earth radius (IUGG) used by the haversine mode
+EARTH_RADIUS_KM = 6371.0088
+
+# WGS-84 ellipsoid used by the ellipsoidal mode
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+
+VINCENTY_MAX_ITERATIONS = 200
+VINCENTY_TOLERANCE = 1e-12
+
+def haversine_distances(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """
+    Great-circle distances in kilometers between arrays of points on a spherical Earth
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=float)) for value in (lat1, lon1, lat2, lon2))
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def ellipsoidal_distances(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """
+    Distances in kilometers between arrays of points on the WGS-84 ellipsoid (Vincenty's inverse formula)
+    Nearly antipodal pairs where the iteration does not converge fall back to haversine
+    """
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(*(np.asarray(value, dtype=float) for value in (lat1, lon1, lat2, lon2)))
+
+    f = WGS84_F
+    L = np.radians(lon2 - lon1)
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    sinU1, cosU1 = np.sin(U1), np.cos(U1)
+    sinU2, cosU2 = np.sin(U2), np.cos(U2)
+
+    lam = L
+    converged = np.zeros(L.shape, dtype=bool)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(VINCENTY_MAX_ITERATIONS):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(cosU2 * sin_lam, cosU1 * sinU2 - sinU1 * cosU2 * cos_lam)
+            cos_sigma = sinU1 * sinU2 + cosU1 * cosU2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cosU1 * cosU2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            # Equatorial lines have cos2_alpha == 0
+            cos_2sigma_m = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sinU1 * sinU2 / cos2_alpha)
+
+            C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+            lam_prev = lam
+            lam = L + (1 - C) * f * sin_alpha * (
+                sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2))
+            )
+            converged = np.abs(lam - lam_prev) < VINCENTY_TOLERANCE
+            if converged.all():
+                break
+
+        u2 = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+        A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+        B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+        delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+            - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)
+        ))
+        distances = WGS84_B * A * (sigma - delta_sigma) / 1000
+
+    failed = ~converged | ~np.isfinite(distances)
+    if failed.any():
+        distances = np.where(failed, haversine_distances(lat1, lon1, lat2, lon2), distances)
+    return distances
+
+def _pairwise(method: str):
+    if method == 'haversine':
+        return haversine_distances
+    if method == 'ellipsoidal':
+        return ellipsoidal_distances
+    raise ValueError(f"Unknown distance method: {method}")
+
+def segment_distances(coords: Sequence[Sequence[float]], method: str = 'haversine') -> np.ndarray:
+    """
+    Distances in kilometers between consecutive [lat, lon] points of a polyline
+    Returns an array with one entry per segment (len(coords) - 1)
+    """
+    points = np.asarray(coords, dtype=float).reshape(-1, 2)
+    if len(points) < 2:
+        return np.zeros(0)
+
+    return _pairwise(method)(points[:-1, 0], points[:-1, 1], points[1:, 0], points[1:, 1])
+
+def cumulative_distances(coords: Sequence[Sequence[float]], method: str = 'haversine') -> np.ndarray:
+    """
+    Distance in kilometers from the first point of a polyline to every point (starts at 0)
+    """
+    return np.concatenate(([0.0], np.cumsum(segment_distances(coords, method))))
+
+def polyline_length(coords: Sequence[Sequence[float]], method: str = 'haversine') -> float:
+    """
+    Total length of a polyline in kilometers
+    """
+    return float(segment_distances(coords, method).sum())
+
+def distances_from(origin: Sequence[float], points: Sequence[Sequence[float]], method: str = 'haversine') -> np.ndarray:
+    """
+    Distances in kilometers from one [lat, lon] origin to many points
+    """
+    targets = np.asarray(points, dtype=float).reshape(-1, 2)
+    return _pairwise(method)(origin[0], origin[1], targets[:, 0], targets[:, 1])
+
+def polyline_distances(points: Sequence[Sequence[float]], line: Sequence[Sequence[float]],
+                       reference_lat: Optional[float] = None) -> np.ndarray:
+    """
+    Distance in kilometers from every [lat, lon] point to the nearest point of a polyline
+    Uses a local equirectangular projection around the line (or around reference_lat, so that pieces
+    of a longer line are measured like the whole), accurate for corridors of a few kilometers
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    line = np.asarray(line, dtype=float).reshape(-1, 2)
+    if not len(points) or not len(line):
+        return np.full(len(points), np.inf)
+
+    if reference_lat is None:
+        reference_lat = line[:, 0].mean()
+    scale = np.array([1.0, np.cos(np.radians(reference_lat))]) * np.radians(1) * EARTH_RADIUS_KM
+    xy = points * scale
+    starts = line[:-1] * scale if len(line) > 1 else line * scale
+    segments = (line[1:] * scale - starts) if len(line) > 1 else np.zeros((1, 2))
+
+    # (points, segments) projections, clamped to the segment ends
+    offsets = xy[:, None, :] - starts[None, :, :]
+    lengths2 = np.einsum('ij,ij->i', segments, segments)
+    t = np.divide(np.einsum('pij,ij->pi', offsets, segments), lengths2,
+                  out=np.zeros(offsets.shape[:2]), where=lengths2 > 0)
+    nearest = offsets - np.clip(t, 0.0, 1.0)[:, :, None] * segments[None, :, :]
+    return np.sqrt(np.einsum('pij,pij->pi', nearest, nearest)).min(axis=1)
+
+def distance(point1: List[float], point2: List[float], method: str = 'haversine') -> float:
+    """
+    Distance in kilometers between two [lat, lon] points
+    """
+    return float(_pairwise(method)(point1[0], point1[1], point2[0], point2[1]))
@@ -1,13 +1,114 @@
+import os
+import re
+import threading
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+from flask import has_app_context
 from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut
+from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from models import db, GeocodeCacheEntry
+from utils import metrics, upstream
+from utils.cache import MISSING, TTLCache
+from utils.singleflight import SingleFlight
 
+# Resolved addresses rarely move; unresolved ones are retried sooner
+GEOCODE_TTL = 30 * 24 * 3600
+GEOCODE_NEGATIVE_TTL = 24 * 3600
+GEOCODE_MEMORY_CACHE_SIZE = 4096
+
+# Nominatim endpoint (scheme and host, optionally with a port) for self-hosted or stand-in servers
+NOMINATIM_URL = os.environ.get('NOMINATIM_URL', "https://nominatim.openstreetmap.org")
+_nominatim = urlsplit(NOMINATIM_URL)
+NOMINATIM_HOST = _nominatim.hostname
+
+_memory_cache = TTLCache(maxsize=GEOCODE_MEMORY_CACHE_SIZE, ttl=GEOCODE_TTL)
+# Updated from request and pool threads
+_db_stats = {'hits': 0, 'misses': 0, 'errors': 0}
+_upstream_calls = 0
+_stats_lock = threading.Lock()
+_geolocator = None
+# Concurrent lookups of the same address share one database/Nominatim lookup
+_flight = SingleFlight('geocode', cross_process=True)
+
+def _count_db(outcome: str) -> None:
+    with _stats_lock:
+        _db_stats[outcome] += 1
+
+def _db_stats_snapshot() -> Dict[str, int]:
+    with _stats_lock:
+        return dict(_db_stats)
+
+metrics.register_cache('geocode_memory', _memory_cache.stats)
+metrics.register_cache('geocode_database', _db_stats_snapshot)
+
+def normalize_address(address: str) -> str:
+    """
+    Build the cache key for an address: Unicode-normalized, case-folded,
+    with whitespace and comma spacing collapsed
+    """
+    key = unicodedata.normalize("NFKC", address).casefold()
+    key = re.sub(r"\s*,\s*", ", ", key)
+    key = re.sub(r"\s+", " ", key)
+    return key.strip(" ,.")
+
+@metrics.timed('geocode_address')
 def geocode_address(address):
     """
     Convert address to coordinates using Nominatim geocoder
+    Lookups go through an in-process LRU and a persistent database cache first;
+    unresolved addresses are cached too (negative caching)
+    """
+    key = normalize_address(address)
+    if not key:
+        return None
+
+    cached = _memory_cache.get(key)
+    if cached is not MISSING:
+        return list(cached) if cached else None
+
+    coords = _flight.do(key, lambda: _resolve(key, address))
+    return list(coords) if coords else None
+
+def _resolve(key: str, address: str):
     """
+    Look the address up in the database cache, then in Nominatim, filling both cache tiers
+    """
+    cached = _lookup_persistent(key)
+    if cached is not MISSING:
+        coords, ttl = cached
+        # Expire from memory together with the database row, not a full TTL after this lookup
+        _memory_cache.set(key, coords, ttl=ttl)
+        return coords
+
+    coords = _geocode_upstream(address)
+
+    ttl = GEOCODE_TTL if coords else GEOCODE_NEGATIVE_TTL
+    _memory_cache.set(key, tuple(coords) if coords else None, ttl=ttl)
+    _store_persistent(key, coords, ttl)
+    return coords
+
+def _get_geolocator() -> Nominatim:
+    global _geolocator
+    if _geolocator is None:
+        _geolocator = Nominatim(user_agent="meeting_point_finder", domain=_nominatim.netloc,
+                                scheme=_nominatim.scheme or "https", timeout=upstream.HTTP_TIMEOUT)
+    return _geolocator
+
+def _geocode_upstream(address):
+    global _upstream_calls
+    with _stats_lock:
+        _upstream_calls += 1
     try:
-        geolocator = Nominatim(user_agent="meeting_point_finder")
-        location = geolocator.geocode(address)
+        # Rate limited to Nominatim's 1 request per second, retried with backoff
+        location = upstream.call_with_retries(
+            lambda: _get_geolocator().geocode(address, timeout=upstream.call_timeout(upstream.HTTP_TIMEOUT, NOMINATIM_HOST)),
+            host=NOMINATIM_HOST,
+            retry_on=(GeocoderTimedOut, GeocoderUnavailable)
+        )
         if location:
             return [location.latitude, location.longitude]
         return None
@@ -15,3 +116,64 @@ def geocode_address(address):
         raise Exception("Geocoding service timed out. Please try again.")
     except Exception as e:
         raise Exception(f"Error geocoding address: {str(e)}")
+
+def _lookup_persistent(key: str):
+    """
+    Return ((lat, lon) or None for a cached negative result, seconds until the entry expires),
+    or MISSING
+    """
+    if not has_app_context():
+        return MISSING
+
+    try:
+        with Session(db.engine) as session:
+            entry = session.query(GeocodeCacheEntry).filter_by(query=key).first()
+    except SQLAlchemyError as e:
+        _count_db('errors')
+        print(f"Error reading geocode cache: {str(e)}")
+        return MISSING
+
+    now = datetime.utcnow()
+    if entry is None or entry.expires_at <= now:
+        _count_db('misses')
+        return MISSING
+
+    _count_db('hits')
+    ttl = (entry.expires_at - now).total_seconds()
+    if entry.lat is None or entry.lon is None:
+        return None, ttl
+    return (entry.lat, entry.lon), ttl
+
+def _store_persistent(key: str, coords: Optional[List[float]], ttl: float) -> None:
+    if not has_app_context():
+        return
+
+    now = datetime.utcnow()
+    try:
+        with Session(db.engine) as session:
+            entry = session.query(GeocodeCacheEntry).filter_by(query=key).first()
+            if entry is None:
+                entry = GeocodeCacheEntry(query=key)
+                session.add(entry)
+            entry.lat = coords[0] if coords else None
+            entry.lon = coords[1] if coords else None
+            entry.created_at = now
+            entry.expires_at = now + timedelta(seconds=ttl)
+            session.commit()
+    except SQLAlchemyError as e:
+        # A concurrent writer may have inserted the same key; the cache is best effort
+        _count_db('errors')
+        print(f"Error writing geocode cache: {str(e)}")
+
+def get_geocode_cache_stats() -> Dict[str, Any]:
+    """
+    Hit/miss counters for both cache tiers and the number of upstream Nominatim calls
+    """
+    with _stats_lock:
+        database = dict(_db_stats)
+        upstream_calls = _upstream_calls
+    return {
+        'memory': _memory_cache.stats(),
+        'database': database,
+        'upstream_calls': upstream_calls
+    }
@@ -0,0 +1,92 @@
+import math
+from typing import List, Tuple
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {char: i for i, char in enumerate(_BASE32)}
+
+def encode(lat: float, lon: float, precision: int = 6) -> str:
+    """
+    Geohash of a point at the given precision (number of base32 characters)
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        rng, coord = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if coord >= mid:
+            value = (value << 1) | 1
+            rng[0] = mid
+        else:
+            value <<= 1
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = 0
+            value = 0
+    return "".join(chars)
+
+def bbox(geohash: str) -> Tuple[float, float, float, float]:
+    """
+    Bounding box of a geohash cell as (south, west, north, east)
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (value >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """
+    Height and width of a cell in degrees as (lat_degrees, lon_degrees)
+    """
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+def cells_covering(lat: float, lon: float, radius_m: float, precision: int = 6) -> List[str]:
+    """
+    Geohash cells that intersect the bounding box of a circle of radius_m meters around a point
+    """
+    dlat = radius_m / 111320.0
+    dlon = radius_m / (111320.0 * max(math.cos(math.radians(lat)), 1e-6))
+    south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    west, east = max(lon - dlon, -180.0), min(lon + dlon, 180.0)
+
+    height, width = cell_size(precision)
+    cells = []
+    # Step from the cell containing the south-west corner in whole cells
+    row_lat = math.floor((south + 90.0) / height) * height - 90.0
+    while row_lat < north:
+        col_lon = math.floor((west + 180.0) / width) * width - 180.0
+        while col_lon < east:
+            cells.append(encode(row_lat + height / 2, col_lon + width / 2, precision))
+            col_lon += width
+        row_lat += height
+    return cells
+
+def union_bbox(geohashes: List[str]) -> Tuple[float, float, float, float]:
+    """
+    Smallest (south, west, north, east) box containing all the given cells
+    """
+    boxes = [bbox(geohash) for geohash in geohashes]
+    return (
+        min(box[0] for box in boxes),
+        min(box[1] for box in boxes),
+        max(box[2] for box in boxes),
+        max(box[3] for box in boxes)
+    )
@@ -0,0 +1,83 @@
+import heapq
+import math
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from utils.routing import calculate_travel_time_matrix
+
+# Candidate cells per side of the search grid laid over the participants' bounding box
+GROUP_GRID_SIZE = 8
+# Fraction of the bounding box added on each side so the grid is not clamped to the extremes
+GROUP_GRID_PADDING = 0.1
+# OSRM's default max-table-size: origins plus candidates must fit in one table request
+GROUP_MAX_TABLE_SIZE = 100
+
+OBJECTIVES = ('minmax', 'variance')
+
+def padded_bounds(origins: List[List[float]]) -> Tuple[float, float, float, float]:
+    """
+    (south, west, north, east) of the origins' bounding box, padded by GROUP_GRID_PADDING
+    """
+    points = np.asarray(origins, dtype=float)
+    south, west = points.min(axis=0)
+    north, east = points.max(axis=0)
+    pad_lat = max((north - south) * GROUP_GRID_PADDING, 0.005)
+    pad_lon = max((east - west) * GROUP_GRID_PADDING, 0.005)
+    return float(south - pad_lat), float(west - pad_lon), float(north + pad_lat), float(east + pad_lon)
+
+def candidate_grid(origins: List[List[float]], grid_size: int = GROUP_GRID_SIZE) -> List[List[float]]:
+    """
+    Centers of a grid_size x grid_size grid of cells over the padded bounding box of the origins
+    """
+    south, west, north, east = padded_bounds(origins)
+
+    lat_step = (north - south) / grid_size
+    lon_step = (east - west) / grid_size
+    return [
+        [south + (row + 0.5) * lat_step, west + (col + 0.5) * lon_step]
+        for row in range(grid_size)
+        for col in range(grid_size)
+    ]
+
+def find_group_meeting_points(origins: List[List[float]], k: int = 5, objective: str = 'minmax',
+                              grid_size: int = GROUP_GRID_SIZE) -> Optional[List[Dict[str, Any]]]:
+    """
+    Find the k candidate points that are fairest for N participants
+    Travel times from every origin to every grid cell come from one travel-time matrix request.
+    objective 'minmax' minimizes the longest trip, 'variance' minimizes the spread of trip times
+    (ties are broken by the other measure). Returns None if the matrix could not be computed.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective: {objective}")
+    if len(origins) < 2:
+        raise ValueError("At least two origins are required")
+
+    # Keep origins + candidates within a single table request
+    max_grid = int(math.sqrt(max(GROUP_MAX_TABLE_SIZE - len(origins), 1)))
+    candidates = candidate_grid(origins, max(1, min(grid_size, max_grid)))
+
+    matrix = calculate_travel_time_matrix(origins, candidates)
+    if not matrix:
+        return None
+
+    scored = []
+    for column, candidate in enumerate(candidates):
+        times = [row[column] for row in matrix]
+        if any(time is None for time in times):
+            continue
+
+        longest = max(times)
+        variance = float(np.var(times))
+        key = (longest, variance) if objective == 'minmax' else (variance, longest)
+        scored.append((key, column, candidate, times))
+
+    best = heapq.nsmallest(k, scored, key=lambda item: item[:2])
+    return [
+        {
+            'lat': candidate[0],
+            'lon': candidate[1],
+            'travel_times': [round(time) for time in times],
+            'max_time': round(max(times)),
+            'variance': round(float(np.var(times)), 2)
+        }
+        for _, _, candidate, times in best
+    ]
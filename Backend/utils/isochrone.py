@@ -0,0 +1,211 @@
+import math
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from utils import metrics
+from utils.cache import MISSING, TTLCache
+from utils.distance import distances_from
+from utils.group_midpoint import GROUP_MAX_TABLE_SIZE, padded_bounds
+from utils.poi import find_nearby_pois
+from utils.poi_ranking import rank_pois_by_fairness
+from utils.road_graph import RoadGraph
+from utils.routing import calculate_travel_time_matrix
+from utils.routing_backends import LocalGraphBackend, get_routing_backend
+
+# Cells per side of the travel-time grid sampled with one table request (2 origins + 81 cells)
+ISOCHRONE_GRID_SIZE = int(math.sqrt(GROUP_MAX_TABLE_SIZE - 2))
+# Cell size used to turn the nodes reached on the local road graph into a region
+ISOCHRONE_CELL_M = 250
+# Without an explicit limit, T is the fairest reachable time plus this fraction (or at least the minutes below)
+ISOCHRONE_SLACK = 0.2
+ISOCHRONE_MIN_SLACK_MINUTES = 5
+# Upper bound on the POI search around the fairest point of the region, in meters
+ISOCHRONE_MAX_POI_RADIUS = 5000
+ISOCHRONE_GRID_TTL = 3600
+
+# Travel-time grids by origins; only the limit T changes between requests for the same pair
+_grid_cache = TTLCache(maxsize=256, ttl=ISOCHRONE_GRID_TTL)
+metrics.register_cache('isochrone_grid', _grid_cache.stats)
+
+class MeetingRegion:
+    """
+    Grid cells reachable from both origins within max_minutes
+    cells maps (row, col) to the (travel_time1, travel_time2) minutes of the fairest point sampled in the cell
+    """
+
+    def __init__(self, south: float, west: float, lat_step: float, lon_step: float,
+                 cells: Dict[Tuple[int, int], Tuple[float, float]], max_minutes: float):
+        self.south = south
+        self.west = west
+        self.lat_step = lat_step
+        self.lon_step = lon_step
+        self.cells = cells
+        self.max_minutes = max_minutes
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor((lat - self.south) / self.lat_step)), int(math.floor((lon - self.west) / self.lon_step))
+
+    def contains(self, lat: float, lon: float) -> bool:
+        return self._cell(lat, lon) in self.cells
+
+    def cell_center(self, cell: Tuple[int, int]) -> List[float]:
+        return [self.south + (cell[0] + 0.5) * self.lat_step, self.west + (cell[1] + 0.5) * self.lon_step]
+
+    def best_cell(self) -> Optional[Tuple[int, int]]:
+        """
+        Cell with the smallest longer trip (ties broken by the total)
+        """
+        if not self.cells:
+            return None
+        return min(self.cells, key=lambda cell: (max(self.cells[cell]), sum(self.cells[cell])))
+
+    def to_geojson(self) -> Dict[str, Any]:
+        """
+        GeoJSON Feature with one square polygon per cell ([lon, lat] order)
+        """
+        polygons = []
+        for row, col in sorted(self.cells):
+            south = self.south + row * self.lat_step
+            west = self.west + col * self.lon_step
+            north, east = south + self.lat_step, west + self.lon_step
+            polygons.append([[[west, south], [east, south], [east, north], [west, north], [west, south]]])
+
+        properties = {'max_minutes': round(self.max_minutes), 'cells': len(self.cells)}
+        best = self.best_cell()
+        if best is not None:
+            time1, time2 = self.cells[best]
+            properties['best'] = {'lat': self.cell_center(best)[0], 'lon': self.cell_center(best)[1],
+                                  'travel_time1': round(time1), 'travel_time2': round(time2)}
+        return {
+            'type': 'Feature',
+            'geometry': {'type': 'MultiPolygon', 'coordinates': polygons},
+            'properties': properties
+        }
+
+def _limit(times: np.ndarray, max_minutes: Optional[float]) -> Optional[float]:
+    """
+    The requested limit, or the fairest reachable time plus the slack
+    """
+    if max_minutes is not None:
+        return max_minutes
+    if not len(times):
+        return None
+    fairest = float(times.max(axis=1).min())
+    return max(fairest * (1 + ISOCHRONE_SLACK), fairest + ISOCHRONE_MIN_SLACK_MINUTES)
+
+def _graph_times(graph: RoadGraph, point1: List[float], point2: List[float],
+                 max_minutes: Optional[float]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    [lat, lon] of the graph nodes reached from both origins and their (n, 2) travel times in minutes
+    One bounded Dijkstra per origin; without a limit the bound is the largest automatic limit possible,
+    derived from the direct travel time between the origins
+    """
+    source1 = graph.nearest_node(point1[0], point1[1])
+    source2 = graph.nearest_node(point2[0], point2[1])
+
+    # Same adjustment as calculate_travel_time
+    if max_minutes is not None:
+        budget = max_minutes * 60 / 0.91
+    else:
+        path = graph.shortest_path(source1, source2)
+        if path is None:
+            return np.zeros((0, 2)), np.zeros((0, 2))
+        # The fairest node on the direct route is about half of it away from both origins
+        half = path[0] / 2
+        budget = max(half * (1 + ISOCHRONE_SLACK), half + ISOCHRONE_MIN_SLACK_MINUTES * 60 / 0.91) * 1.05
+
+    reached1 = graph.dijkstra(source1, max_cost=budget)
+    reached2 = graph.dijkstra(source2, max_cost=budget)
+    nodes = np.fromiter((node for node in reached1 if node in reached2), dtype=np.int64)
+    times = np.array([[reached1[node], reached2[node]] for node in nodes.tolist()], dtype=float).reshape(-1, 2)
+    return np.asarray(graph.nodes[nodes], dtype=float).reshape(-1, 2), times / 60 * 0.91
+
+def _grid_times(point1: List[float], point2: List[float], grid_size: int):
+    """
+    Travel times from both origins to the centers of a grid over their padded bounding box,
+    from one (cached) travel-time matrix request
+    Returns (south, west, lat_step, lon_step, {(row, col): (t1, t2)}) or None if the request failed
+    """
+    key = (*(round(float(value), 5) for value in (*point1[:2], *point2[:2])), grid_size)
+    cached = _grid_cache.get(key)
+    if cached is not MISSING:
+        return cached
+
+    south, west, north, east = padded_bounds([point1, point2])
+    lat_step = (north - south) / grid_size
+    lon_step = (east - west) / grid_size
+    cells = [(row, col) for row in range(grid_size) for col in range(grid_size)]
+    centers = [[south + (row + 0.5) * lat_step, west + (col + 0.5) * lon_step] for row, col in cells]
+
+    matrix = calculate_travel_time_matrix([point1, point2], centers)
+    if not matrix:
+        return None
+
+    times = {
+        cell: (time1, time2)
+        for cell, time1, time2 in zip(cells, matrix[0], matrix[1])
+        if time1 is not None and time2 is not None
+    }
+    result = (south, west, lat_step, lon_step, times)
+    _grid_cache.set(key, result)
+    return result
+
+@metrics.timed('meeting_region')
+def find_meeting_region(point1: List[float], point2: List[float], max_minutes: Optional[float] = None,
+                        grid_size: int = ISOCHRONE_GRID_SIZE) -> Optional[MeetingRegion]:
+    """
+    Region reachable from both origins within max_minutes of driving (intersection of their isochrones)
+    On the local routing backend this takes one bounded Dijkstra per origin, rasterized to
+    ISOCHRONE_CELL_M cells; otherwise one travel-time matrix request over a grid_size x grid_size grid.
+    Without max_minutes the limit is the fairest reachable time plus ISOCHRONE_SLACK.
+    Returns None if the travel times could not be computed
+    """
+    backend = get_routing_backend()
+    if isinstance(backend, LocalGraphBackend):
+        points, times = _graph_times(backend.graph, point1, point2, max_minutes)
+        limit = _limit(times, max_minutes)
+        if limit is None:
+            return None
+
+        inside = times.max(axis=1) <= limit
+        points, times = points[inside], times[inside]
+        south, west = points.min(axis=0) if len(points) else (point1[0], point1[1])
+        lat_step = ISOCHRONE_CELL_M / 111320
+        lon_step = lat_step / max(math.cos(math.radians(south)), 0.01)
+
+        # The fairest node of each cell: sort by the longer trip and keep the first per cell
+        order = np.lexsort((times.sum(axis=1), times.max(axis=1)))
+        rows = np.floor((points[order, 0] - south) / lat_step).astype(np.int64)
+        cols = np.floor((points[order, 1] - west) / lon_step).astype(np.int64)
+        _, first = np.unique(np.column_stack((rows, cols)), axis=0, return_index=True)
+        cells = {(int(rows[i]), int(cols[i])): tuple(times[order[i]].tolist()) for i in first}
+        return MeetingRegion(float(south), float(west), lat_step, lon_step, cells, limit)
+
+    grid = _grid_times(point1, point2, grid_size)
+    if grid is None:
+        return None
+
+    south, west, lat_step, lon_step, cell_times = grid
+    limit = _limit(np.array(list(cell_times.values()), dtype=float).reshape(-1, 2), max_minutes)
+    if limit is None:
+        return None
+    cells = {cell: times for cell, times in cell_times.items() if max(times) <= limit}
+    return MeetingRegion(south, west, lat_step, lon_step, cells, limit)
+
+def find_region_pois(region: MeetingRegion, point1: List[float], point2: List[float]) -> List[Dict[str, Any]]:
+    """
+    POIs inside a meeting region, ranked by fairness with one travel-time matrix request
+    The search is centered on the fairest cell and covers the region up to ISOCHRONE_MAX_POI_RADIUS
+    """
+    best = region.best_cell()
+    if best is None:
+        return []
+
+    center = region.cell_center(best)
+    centers = [region.cell_center(cell) for cell in region.cells]
+    # Farthest cell center plus half a cell diagonal
+    half_cell = float(distances_from(center, [[center[0] + region.lat_step / 2, center[1] + region.lon_step / 2]])[0])
+    radius = (float(distances_from(center, centers).max()) + half_cell) * 1000
+    radius = int(min(radius, ISOCHRONE_MAX_POI_RADIUS))
+
+    pois = [poi for poi in find_nearby_pois(center[0], center[1], radius) if region.contains(poi['lat'], poi['lon'])]
+    return rank_pois_by_fairness(pois, point1, point2)
@@ -0,0 +1,69 @@
+import codecs
+import json
+import re
+from typing import Any, Iterable, Iterator
+
+_decoder = json.JSONDecoder()
+_SEPARATORS = re.compile(r'[\s,]*')
+# Characters kept while searching for the array key, in case it is split across chunks
+_KEY_SEARCH_OVERLAP = 256
+
+class JSONArrayStream:
+    """
+    Incrementally parse the array stored under `key` in a streamed JSON document,
+    yielding each item as soon as it has fully arrived
+    Only the item currently being received is buffered, so consumers can stop early
+    without downloading or parsing the rest of the response. The key is located by
+    searching for '"key": [' and must not appear as a string value before the array.
+    After iteration, `found` tells whether the array was present and `finished` whether
+    it was read to its end; read_tail() returns the raw text that follows it.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], key: str):
+        self._chunks = iter(chunks)
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._array_start = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self._tail = ''
+        self.found = False
+        self.finished = False
+
+    def __iter__(self) -> Iterator[Any]:
+        buffer = ''
+        position = None
+
+        for chunk in self._chunks:
+            buffer += self._text_decoder.decode(chunk)
+
+            if position is None:
+                match = self._array_start.search(buffer)
+                if not match:
+                    buffer = buffer[-_KEY_SEARCH_OVERLAP:]
+                    continue
+                self.found = True
+                position = match.end()
+
+            while True:
+                position = _SEPARATORS.match(buffer, position).end()
+                if position >= len(buffer):
+                    break
+                if buffer[position] == ']':
+                    self.finished = True
+                    self._tail = buffer[position + 1:]
+                    return
+                try:
+                    item, position_after = _decoder.raw_decode(buffer, position)
+                except ValueError:
+                    break  # Item incomplete, wait for the next chunk
+                position = position_after
+                yield item
+
+            buffer = buffer[position:]
+            position = 0
+
+    def read_tail(self) -> str:
+        """
+        Read the rest of the document after the array (e.g. trailing status fields)
+        """
+        for chunk in self._chunks:
+            self._tail += self._text_decoder.decode(chunk)
+        return self._tail + self._text_decoder.decode(b'', final=True)
@@ -0,0 +1,237 @@
+import contextvars
+import functools
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Latency histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Finished traces kept for /metrics/traces/<id>
+TRACE_HISTORY = 100
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+_lock = threading.Lock()
+# {(metric name, label name, label value): Histogram}
+_histograms: Dict[Tuple[str, str, str], Histogram] = {}
+# {(metric name, label name, label value): count}
+_counters: Dict[Tuple[str, str, str], int] = {}
+# {cache name: function returning {'hits': ..., 'misses': ...}}
+_caches: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+def observe(metric: str, label: str, value: str, seconds: float) -> None:
+    with _lock:
+        key = (metric, label, value)
+        if key not in _histograms:
+            _histograms[key] = Histogram()
+        _histograms[key].observe(seconds)
+
+def increment(metric: str, label: str, value: str, amount: int = 1) -> None:
+    with _lock:
+        key = (metric, label, value)
+        _counters[key] = _counters.get(key, 0) + amount
+
+def record_error(stage: str) -> None:
+    increment('stage_errors_total', 'stage', stage)
+
+def record_fallback(stage: str) -> None:
+    """
+    Count a call that returned a degraded result (direct line, geodesic estimate, fallback POIs...)
+    """
+    increment('stage_fallbacks_total', 'stage', stage)
+    _add_span_event(stage, 'fallback')
+
+def register_cache(name: str, stats: Callable[[], Dict[str, Any]]) -> None:
+    """
+    Expose a cache's hit/miss counters; stats() must return a dict with 'hits' and 'misses'
+    """
+    _caches[name] = stats
+
+class Trace:
+    """
+    Per-request record of every instrumented stage, shared with worker threads
+    through the context variable that holds it
+    """
+
+    def __init__(self, name: str = ''):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.duration = None
+        self.spans: List[Dict[str, Any]] = []
+
+    def add(self, stage: str, start: float, seconds: float, error: Optional[str] = None) -> None:
+        span = {
+            'stage': stage,
+            'start_ms': round((start - self.started) * 1000, 3),
+            'duration_ms': round(seconds * 1000, 3),
+            'thread': threading.current_thread().name
+        }
+        if error:
+            span['error'] = error
+        self.spans.append(span)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'name': self.name,
+            'started_at': self.started_at,
+            'duration_ms': round(self.duration * 1000, 3) if self.duration is not None else None,
+            'spans': sorted(self.spans, key=lambda span: span['start_ms'])
+        }
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar('trace', default=None)
+_finished_traces = deque(maxlen=TRACE_HISTORY)
+
+def start_trace(name: str = '') -> Trace:
+    trace = Trace(name)
+    trace.token = _current_trace.set(trace)
+    return trace
+
+def finish_trace(trace: Trace) -> Dict[str, Any]:
+    trace.duration = time.perf_counter() - trace.started
+    try:
+        _current_trace.reset(trace.token)
+    except ValueError:
+        _current_trace.set(None)  # Finished from a different context
+    _finished_traces.append(trace)
+    return trace.to_dict()
+
+def get_trace(trace_id: str) -> Optional[Dict[str, Any]]:
+    for trace in list(_finished_traces):
+        if trace.id == trace_id:
+            return trace.to_dict()
+    return None
+
+def _add_span_event(stage: str, event: str) -> None:
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.spans.append({
+            'stage': stage,
+            'event': event,
+            'start_ms': round((time.perf_counter() - trace.started) * 1000, 3)
+        })
+
+class timer:
+    """
+    Context manager recording one stage: latency histogram, call count, errors and trace span
+    """
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        observe('stage_latency_seconds', 'stage', self.stage, seconds)
+        increment('stage_calls_total', 'stage', self.stage)
+        if exc_type is not None:
+            record_error(self.stage)
+
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(self.stage, self.start, seconds, str(exc) if exc is not None else None)
+        return False
+
+def timed(stage: str):
+    """
+    Decorator form of timer()
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def snapshot() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """
+    Current values as {metric: {label value: {'count', 'sum'} or count}}
+    """
+    with _lock:
+        result: Dict[str, Dict[str, Any]] = {}
+        for (metric, _, value), histogram in _histograms.items():
+            result.setdefault(metric, {})[value] = {'count': histogram.count, 'sum': histogram.sum}
+        for (metric, _, value), count in _counters.items():
+            result.setdefault(metric, {})[value] = count
+        return result
+
+def reset() -> None:
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+def render_prometheus() -> str:
+    """
+    All metrics in the Prometheus text exposition format
+    """
+    with _lock:
+        histograms = {key: (list(h.counts), h.sum, h.count, h.buckets) for key, h in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    seen_types = set()
+
+    for (metric, label, value), (counts, total, count, buckets) in sorted(histograms.items()):
+        if metric not in seen_types:
+            lines.append(f"# TYPE {metric} histogram")
+            seen_types.add(metric)
+        cumulative = 0
+        for bound, bucket_count in zip(list(buckets) + ['+Inf'], counts):
+            cumulative += bucket_count
+            le = bound if bound == '+Inf' else _format_value(bound)
+            lines.append(f'{metric}_bucket{{{label}="{value}",le="{le}"}} {cumulative}')
+        lines.append(f'{metric}_sum{{{label}="{value}"}} {total}')
+        lines.append(f'{metric}_count{{{label}="{value}"}} {count}')
+
+    for (metric, label, value), count in sorted(counters.items()):
+        if metric not in seen_types:
+            lines.append(f"# TYPE {metric} counter")
+            seen_types.add(metric)
+        lines.append(f'{metric}{{{label}="{value}"}} {count}')
+
+    cache_stats = {}
+    for name, stats_fn in sorted(_caches.items()):
+        try:
+            stats = stats_fn()
+        except Exception:
+            continue
+        hits, misses = stats.get('hits', 0), stats.get('misses', 0)
+        cache_stats[name] = (hits, misses, hits / (hits + misses) if hits + misses else 0.0)
+
+    # Each metric family has to be contiguous in the exposition format
+    for column, (metric, metric_type) in enumerate((('cache_hits_total', 'counter'),
+                                                    ('cache_misses_total', 'counter'),
+                                                    ('cache_hit_ratio', 'gauge'))):
+        if not cache_stats:
+            break
+        lines.append(f"# TYPE {metric} {metric_type}")
+        for name, values in cache_stats.items():
+            lines.append(f'{metric}{{cache="{name}"}} {values[column]}')
+
+    return "\n".join(lines) + "\n"
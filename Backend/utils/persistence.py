@@ -0,0 +1,120 @@
+import queue
+import threading
+from typing import Any, Dict, List, Optional
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from models import db, Route, MeetingPoint, POI
+from utils import metrics
+
+# Searches waiting to be written by the background writer before enqueue blocks
+WRITE_QUEUE_SIZE = 1000
+
+@metrics.timed('db_commit')
+def save_search_result(location1: str, location2: str, point1: List[float], point2: List[float],
+                       results: List[Optional[Dict[str, Any]]]) -> int:
+    """
+    Persist a whole search (the Route, its MeetingPoints and their POIs) in one transaction
+    with one bulk INSERT per table; generated ids come back through RETURNING
+    results are the per-route dicts produced by utils.pipeline.process_routes
+    Returns the id of the new Route
+    """
+    results = [result for result in results if result]
+
+    with Session(db.engine) as session, session.begin():
+        route_id = session.scalars(
+            insert(Route).returning(Route.id),
+            [{
+                'start_location': location1,
+                'end_location': location2,
+                'start_lat': point1[0],
+                'start_lon': point1[1],
+                'end_lat': point2[0],
+                'end_lon': point2[1]
+            }]
+        ).one()
+
+        if not results:
+            return route_id
+
+        meeting_point_ids = session.scalars(
+            insert(MeetingPoint).returning(MeetingPoint.id, sort_by_parameter_order=True),
+            [
+                {
+                    'route_id': route_id,
+                    'lat': result['midpoint'][0],
+                    'lon': result['midpoint'][1],
+                    'travel_time1': result['travel_time1'],
+                    'travel_time2': result['travel_time2']
+                }
+                for result in results
+            ]
+        ).all()
+
+        poi_rows = [
+            {
+                'meeting_point_id': meeting_point_id,
+                'name': poi['name'],
+                'type': poi['type'],
+                'lat': poi['lat'],
+                'lon': poi['lon'],
+                'address': poi['address'],
+                'details': poi.get('details') or {}
+            }
+            for meeting_point_id, result in zip(meeting_point_ids, results)
+            for poi in result['pois'] or []
+        ]
+        if poi_rows:
+            # executemany; no ids are needed back
+            session.execute(insert(POI), poi_rows)
+
+    return route_id
+
+class SearchResultWriter:
+    """
+    Write-behind queue: searches are persisted by a background thread so that request
+    handlers never hold a database connection while waiting on upstream services
+    """
+
+    def __init__(self, app, maxsize: int = WRITE_QUEUE_SIZE):
+        self.app = app
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._run, name='search-writer', daemon=True)
+        self._thread.start()
+
+    def enqueue(self, *args, **kwargs) -> None:
+        self._queue.put((args, kwargs))
+
+    def flush(self) -> None:
+        """
+        Block until every queued search has been written
+        """
+        self._queue.join()
+
+    def _run(self) -> None:
+        while True:
+            args, kwargs = self._queue.get()
+            try:
+                with self.app.app_context():
+                    save_search_result(*args, **kwargs)
+            except Exception as e:
+                print(f"Error saving search result: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_writer(app) -> SearchResultWriter:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = SearchResultWriter(app)
+    return _writer
+
+def enqueue_search_result(app, location1: str, location2: str, point1: List[float], point2: List[float],
+                          results: List[Optional[Dict[str, Any]]]) -> None:
+    """
+    Queue a search for save_search_result on the background writer
+    """
+    get_writer(app).enqueue(location1, location2, point1, point2, results)
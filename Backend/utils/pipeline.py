@@ -0,0 +1,229 @@
+import contextvars
+import os
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from utils.geocoding import geocode_address, normalize_address
+from utils.routing import calculate_midpoint, calculate_route_annotated, calculate_travel_time
+from utils.poi import find_nearby_pois
+from utils.poi_ranking import rank_pois_by_fairness
+from utils.corridor import find_corridor_pois
+from utils.cost_calculator import calculate_route_costs
+from utils.records import Route
+from utils import resilience
+
+# Upper bound on concurrent upstream calls made by one process
+PIPELINE_MAX_WORKERS = int(os.environ.get('PIPELINE_MAX_WORKERS', '12'))
+
+# Upper bound on location pairs routed at the same time by batch requests
+BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', '8'))
+# Batch geocodes mostly wait on Nominatim's 1 request/s limit, so they get a small pool of their
+# own instead of holding the shared workers that interactive searches need
+BATCH_GEOCODE_WORKERS = int(os.environ.get('BATCH_GEOCODE_WORKERS', '2'))
+
+# 'radius' searches around the midpoint, 'corridor' along the middle of the route,
+# 'auto' searches the radius first and the corridor when that finds nothing
+POI_SEARCH_MODES = ('auto', 'radius', 'corridor')
+
+_executor = ThreadPoolExecutor(max_workers=PIPELINE_MAX_WORKERS, thread_name_prefix='pipeline')
+_batch_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS, thread_name_prefix='batch')
+_batch_geocode_executor = ThreadPoolExecutor(max_workers=BATCH_GEOCODE_WORKERS, thread_name_prefix='batch-geocode')
+
+def submit(fn: Callable, *args, **kwargs) -> Future:
+    """
+    Run fn on the shared bounded executor, carrying over the caller's context
+    (including the Flask app context, which lives in a context variable)
+    """
+    context = contextvars.copy_context()
+    return _executor.submit(context.run, fn, *args, **kwargs)
+
+def geocode_locations(*addresses: str) -> List[Optional[List[float]]]:
+    """
+    Geocode several addresses concurrently, preserving their order
+    """
+    futures = [submit(geocode_address, address) for address in addresses]
+    return [future.result() for future in futures]
+
+def find_ranked_pois(midpoint: List[float], point1: List[float], point2: List[float], radius: int = 1500,
+                     route: Optional[Route] = None, poi_search: str = 'radius') -> List[Dict[str, Any]]:
+    """
+    POIs near a midpoint, ranked by fairness for both origins with one travel-time matrix call
+    With a route and poi_search 'corridor' (or 'auto' when the radius has no POIs), POIs along
+    the middle of the route are ranked by detour instead
+    """
+    if poi_search not in POI_SEARCH_MODES:
+        raise ValueError(f"Unknown POI search mode: {poi_search}")
+
+    if route is None or poi_search == 'radius':
+        return rank_pois_by_fairness(find_nearby_pois(midpoint[0], midpoint[1], radius), point1, point2)
+
+    if poi_search == 'auto':
+        pois = find_nearby_pois(midpoint[0], midpoint[1], radius)
+        if pois:
+            return rank_pois_by_fairness(pois, point1, point2)
+    return find_corridor_pois(route, point1, point2)
+
+def process_routes(routes: List[Route], point1: List[float], point2: List[float],
+                   radius: int = 1500, poi_search: str = 'radius') -> List[Optional[Dict[str, Any]]]:
+    """
+    Compute the meeting point of every route returned by calculate_route_annotated and
+    fetch its travel times and nearby POIs, overlapping all upstream calls
+    Returns one result dict per route (None when no midpoint could be found) with the keys
+    'route' (the Route), 'midpoint', 'costs', 'travel_time1', 'travel_time2' and 'pois' (fairness-ranked,
+    with per-POI travel times when available); poi_search is passed to find_ranked_pois
+    """
+    results = [None] * len(routes)
+    for index, result in iter_route_results(routes, point1, point2, radius, poi_search):
+        results[index] = result
+    return results
+
+def iter_route_results(routes: List[Route], point1: List[float], point2: List[float],
+                       radius: int = 1500, poi_search: str = 'radius') -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+    """
+    Same as process_routes, but yields (route index, result) for each route as soon as
+    its travel times and POIs have arrived, in completion order
+    """
+    pending = {}
+    skipped = []
+    for index, route in enumerate(routes):
+        # Interpolated from the route annotations, no network I/O
+        midpoint = calculate_midpoint(route)
+        if not midpoint:
+            skipped.append(index)
+            continue
+
+        pending[index] = {
+            'route': route,
+            'midpoint': midpoint,
+            'travel_time1': submit(calculate_travel_time, point1, midpoint),
+            'travel_time2': submit(calculate_travel_time, point2, midpoint),
+            'pois': submit(find_ranked_pois, midpoint, point1, point2, radius, route, poi_search)
+        }
+
+    for index in skipped:
+        yield index, None
+
+    owners = {}
+    for index, item in pending.items():
+        for key in ('travel_time1', 'travel_time2', 'pois'):
+            owners[item[key]] = index
+    remaining = {index: 3 for index in pending}
+
+    for future in as_completed(owners):
+        index = owners[future]
+        remaining[index] -= 1
+        if remaining[index]:
+            continue
+
+        item = pending[index]
+        yield index, {
+            'route': item['route'],
+            'midpoint': item['midpoint'],
+            'costs': calculate_route_costs(item['route']),
+            'travel_time1': item['travel_time1'].result(),
+            'travel_time2': item['travel_time2'].result(),
+            'pois': item['pois'].result()
+        }
+
+def compute_pair_midpoint(point1: List[float], point2: List[float]) -> Optional[List[float]]:
+    """
+    Equal-time meeting point on the primary route between two geocoded points
+    """
+    routes = calculate_route_annotated(point1, point2)
+    if not routes:
+        return None
+    return calculate_midpoint(routes[0])
+
+def dedupe_pairs(pairs: Sequence[Tuple[str, str]]) -> Tuple[Dict[str, str], Dict[Tuple[str, str], List[int]]]:
+    """
+    Collapse identical addresses and pairs by normalized address
+    Returns ({address key: address}, {(key1, key2): [indices of the pair in the request]})
+    """
+    addresses = {}
+    unique_pairs = {}
+    for index, (location1, location2) in enumerate(pairs):
+        key1 = normalize_address(location1)
+        key2 = normalize_address(location2)
+        addresses.setdefault(key1, location1)
+        addresses.setdefault(key2, location2)
+        unique_pairs.setdefault((key1, key2), []).append(index)
+    return addresses, unique_pairs
+
+def _when_all_done(futures: List[Future], callback: Callable[[], None]) -> None:
+    pending = set(futures)
+    remaining = [len(pending)]
+    lock = threading.Lock()
+
+    def on_done(_):
+        with lock:
+            remaining[0] -= 1
+            finished = remaining[0] == 0
+        if finished:
+            callback()
+
+    for future in pending:
+        future.add_done_callback(on_done)
+
+def iter_batch_midpoints(addresses: Dict[str, str], unique_pairs: Dict[Tuple[str, str], List[int]]) -> Iterator[Dict[str, Any]]:
+    """
+    Geocode every unique address once (on BATCH_GEOCODE_WORKERS threads), then route every unique
+    pair as soon as both of its addresses are resolved, at most BATCH_MAX_WORKERS pairs at a time,
+    each within its own REQUEST_SLO_SECONDS budget
+    Yields {'indices', 'midpoint', 'error'} for each unique pair in completion order. Closing the
+    generator (e.g. when the client disconnects) cancels the geocodes and pairs not yet started.
+    """
+    context = contextvars.copy_context()
+    results = queue.Queue()
+    geocodes = {
+        key: _batch_geocode_executor.submit(context.copy().run, geocode_address, address)
+        for key, address in addresses.items()
+    }
+    tasks = []
+    cancelled = threading.Event()
+    lock = threading.Lock()
+
+    def start_pair(pair: Tuple[str, str], indices: List[int]) -> None:
+        if cancelled.is_set():
+            return
+        try:
+            futures = [geocodes[pair[0]], geocodes[pair[1]]]
+            errors = [future.exception() for future in futures]
+            if any(errors):
+                error = next(str(e) for e in errors if e)
+                results.put({'indices': indices, 'midpoint': None, 'error': error})
+                return
+
+            point1, point2 = (future.result() for future in futures)
+            if not point1 or not point2:
+                results.put({'indices': indices, 'midpoint': None, 'error': 'Invalid locations'})
+                return
+
+            with lock:
+                if cancelled.is_set():
+                    return
+                task = _batch_executor.submit(context.copy().run, resilience.call_with_deadline,
+                                              resilience.REQUEST_SLO_SECONDS, compute_pair_midpoint, point1, point2)
+                tasks.append(task)
+            task.add_done_callback(lambda done: results.put({
+                'indices': indices,
+                'midpoint': done.result() if not done.exception() else None,
+                'error': str(done.exception()) if done.exception() else None
+            }))
+        except Exception as e:
+            results.put({'indices': indices, 'midpoint': None, 'error': str(e)})
+
+    for pair, indices in unique_pairs.items():
+        _when_all_done(
+            [geocodes[pair[0]], geocodes[pair[1]]],
+            lambda pair=pair, indices=indices: start_pair(pair, indices)
+        )
+
+    try:
+        for _ in range(len(unique_pairs)):
+            yield results.get()
+    finally:
+        with lock:
+            cancelled.set()
+        for future in [*geocodes.values(), *tasks]:
+            future.cancel()
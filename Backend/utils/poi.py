@@ -1,120 +1,440 @@
-import requests
-import time
-from typing import List, Dict, Any
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Tuple
+from flask import has_app_context
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, selectinload
+from models import db, PoiCell, CachedPOI
+from utils import geohash, metrics, resilience, upstream
+from utils.cache import MISSING, TTLCache
+from utils.distance import distances_from, polyline_distances
+from utils.json_stream import JSONArrayStream
+from utils.poi_index import POIIndex
+from utils.records import POI
+from utils.singleflight import SingleFlight
 
-def find_nearby_pois(lat: float, lon: float, radius: int = 1500) -> List[Dict[Any, Any]]:
+# Overpass API endpoint
+OVERPASS_URL = os.environ.get('OVERPASS_URL', "https://overpass-api.de/api/interpreter")
+# Slightly above the [timeout:25] the query asks the server for
+OVERPASS_TIMEOUT = 30
+# Upper bound on elements per output statement of corridor queries. Overpass truncates in
+# quadtile order, not by distance, so radius and cell queries are not limited: their area is
+# already bounded, and a truncated response could drop the POIs closest to the midpoint
+OVERPASS_RESULT_LIMIT = int(os.environ.get('OVERPASS_RESULT_LIMIT', '500'))
+
+# OSM tag values searched for each key
+POI_CATEGORIES = {
+    'amenity': ['cafe', 'restaurant', 'fast_food', 'pub', 'bar'],
+    'shop': ['mall', 'supermarket', 'convenience'],
+    'leisure': ['park', 'fitness_centre']
+}
+
+# POIs are cached per geohash cell; precision 6 cells are about 1.2 km x 0.6 km
+POI_CELL_PRECISION = 6
+POI_CELL_TTL = 7 * 24 * 3600
+POI_MEMORY_CACHE_SIZE = 4096
+
+# Offline POI index built by tools.build_poi_index; when set, searches are answered from it without network I/O
+POI_INDEX_PATH = os.environ.get('POI_INDEX_PATH', '')
+
+_cell_cache = TTLCache(maxsize=POI_MEMORY_CACHE_SIZE, ttl=POI_CELL_TTL)
+metrics.register_cache('poi_cells', _cell_cache.stats)
+# Concurrent searches missing the same cells share one database lookup and Overpass query per cell
+_cells_flight = SingleFlight('poi_cells', cross_process=True)
+_category_flight = SingleFlight('poi_categories')
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_poi_index() -> Optional[POIIndex]:
+    """
+    Process-wide offline POI index configured by POI_INDEX_PATH, or None
+    """
+    global _index
+    if _index is None and POI_INDEX_PATH:
+        with _index_lock:
+            if _index is None:
+                try:
+                    _index = POIIndex.load(POI_INDEX_PATH)
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Error loading POI index: {str(e)}")
+                    return None
+    return _index
+
+@metrics.timed('find_nearby_pois')
+def find_nearby_pois(lat: float, lon: float, radius: int = 1500,
+                     categories: Optional[Dict[str, List[str]]] = None) -> List[POI]:
     """
     Find points of interest near a given location using OpenStreetMap's Overpass API
-    Returns a list of POIs with their details
+    POIs are cached per geohash cell (in memory and in the database); only cells that are
+    missing or stale are fetched from Overpass, with a single bounding-box query.
+    With POI_INDEX_PATH configured, searches inside the area of the offline index are answered
+    from it without network I/O; searches reaching outside it still use Overpass.
+    categories ({tag key: [values]}) overrides POI_CATEGORIES; such searches bypass the cache.
+    Returns a list of POIs with their details, sorted by distance
     """
-    # Overpass API endpoint
-    overpass_url = "https://overpass-api.de/api/interpreter"
+    index = get_poi_index()
+    if index is not None and index.covers([[lat, lon]], radius):
+        # Capped like a corridor response, but always the nearest POIs
+        return index.query(lat, lon, radius, categories if categories != POI_CATEGORIES else None,
+                           limit=OVERPASS_RESULT_LIMIT)
+
+    if categories is not None and categories != POI_CATEGORIES:
+        key = (lat, lon, radius, tuple((tag, tuple(values)) for tag, values in sorted(categories.items())))
+        try:
+            pois, _ = _category_flight.do(key, lambda: _fetch_overpass(f"around:{radius},{lat},{lon}", categories, limit=None))
+        except Exception as e:
+            print(f"Error finding POIs: {str(e)}")
+            metrics.record_error('find_nearby_pois')
+            return _get_fallback_pois(lat, lon)
+        if pois is None:
+            return _get_fallback_pois(lat, lon)
+        return _within_radius(pois, lat, lon, radius)
+
+    cells = geohash.cells_covering(lat, lon, radius, POI_CELL_PRECISION)
+
+    cell_pois = {}
+    missing = []
+    for cell in cells:
+        cached = _cell_cache.get(cell)
+        if cached is MISSING:
+            missing.append(cell)
+        else:
+            cell_pois[cell] = cached
+
+    if missing:
+        # Cells another search is already fetching are awaited rather than fetched again
+        found = _cells_flight.do_many(missing, lambda claimed: _resolve_cells(claimed)[0])
+        failed = len(found) < len(missing)
+        cell_pois.update(found)
+        # Serve whatever the cache had; only fall back when there is nothing at all
+        if failed and not cell_pois:
+            return _get_fallback_pois(lat, lon)
+        if failed:
+            resilience.mark_degraded('find_nearby_pois')
+
+    pois = _within_radius([poi for pois in cell_pois.values() for poi in pois], lat, lon, radius)
+
+    print(f"Found {len(pois)} POIs")
+    return pois
 
-    # Define the search query for various amenities
-    overpass_query = f"""
+@metrics.timed('find_pois_along')
+def find_pois_along(line: List[List[float]], width: int = 1500,
+                    categories: Optional[Dict[str, List[str]]] = None) -> List[Dict[str, Any]]:
+    """
+    Find points of interest within width meters of a [lat, lon] polyline
+    The line should already be simplified: it is sent to Overpass as a single around filter,
+    or looked up in the offline index when POI_INDEX_PATH is configured and covers the corridor.
+    Results are not cached and there is no placeholder fallback; failures return an empty list.
+    Returns a list of POIs with a 'corridor_distance' (meters), nearest to the line first
+    """
+    if not line:
+        return []
+
+    index = get_poi_index()
+    if index is not None and index.covers(line, width):
+        pois = index.query_along(line, width, categories if categories != POI_CATEGORIES else None,
+                                 limit=OVERPASS_RESULT_LIMIT)
+    else:
+        area = f"around:{width}," + ",".join(f"{lat:.6f},{lon:.6f}" for lat, lon in line)
+        try:
+            pois, _ = _fetch_overpass(area, categories or POI_CATEGORIES, limit=OVERPASS_RESULT_LIMIT)
+        except Exception as e:
+            print(f"Error finding POIs along route: {str(e)}")
+            metrics.record_error('find_pois_along')
+            resilience.mark_degraded('find_pois_along')
+            return []
+        if not pois:
+            return []
+
+    distances = polyline_distances([[poi['lat'], poi['lon']] for poi in pois], line) * 1000
+    order = [i for i in distances.argsort(kind='stable') if distances[i] <= width]
+    pois = [dict(pois[i], corridor_distance=round(float(distances[i]), 1)) for i in order]
+
+    metrics.increment('pois_found_total', 'stage', 'find_pois_along', len(pois))
+    return pois
+
+def _resolve_cells(missing: List[str]) -> Tuple[Dict[str, List[POI]], bool]:
+    """
+    Load cells from the database and fetch the rest from Overpass, filling both cache tiers
+    Both tiers are checked again first: another search may have stored the cells meanwhile.
+    Returns ({cell: [poi, ...]} for the cells that could be resolved, whether the fetch failed)
+    """
+    found = {}
+    for cell in missing:
+        cached = _cell_cache.get(cell)
+        if cached is not MISSING:
+            found[cell] = cached
+    loaded = _load_cells([cell for cell in missing if cell not in found])
+    for cell, pois in loaded.items():
+        _cell_cache.set(cell, pois)
+    found.update(loaded)
+    missing = [cell for cell in missing if cell not in found]
+    if not missing:
+        return found, False
+
+    try:
+        result = _fetch_cells(missing)
+    except Exception as e:
+        print(f"Error finding POIs: {str(e)}")
+        metrics.record_error('find_nearby_pois')
+        result = None
+
+    if result is None:
+        return found, True
+
+    fetched, complete = result
+    found.update(fetched)
+    # Truncated results are served but never cached as the full content of a cell
+    if complete:
+        for cell, pois in fetched.items():
+            _cell_cache.set(cell, pois)
+        _store_cells(fetched)
+    return found, False
+
+def _within_radius(candidates: List[POI], lat: float, lon: float, radius: int) -> List[POI]:
+    """
+    Keep POIs inside the search radius, sorted by distance from the center point
+    The records are shared with the cache (they are never modified), so nothing is copied
+    """
+    if not candidates:
+        return []
+
+    distances = distances_from([lat, lon], [[poi.lat, poi.lon] for poi in candidates])
+    return [candidates[i] for i in distances.argsort(kind='stable') if distances[i] * 1000 <= radius]
+
+def _build_overpass_query(area: str, categories: Dict[str, List[str]] = POI_CATEGORIES,
+                          limit: Optional[int] = None) -> str:
+    """
+    Overpass query for the POI categories inside an area filter, e.g. "south,west,north,east"
+    Nodes are printed with coordinates and tags, ways with tags and their center only,
+    so no member nodes or way geometry are transferred. With a limit, each output statement
+    prints at most that many elements
+    """
+    filters = [f'["{key}"~"{"|".join(values)}"]' for key, values in categories.items() if values]
+    nodes = "\n".join(f"      node{tag_filter}({area});" for tag_filter in filters)
+    ways = "\n".join(f"      way{tag_filter}({area});" for tag_filter in filters)
+    count = f" {limit}" if limit else ""
+    return f"""
     [out:json][timeout:25];
     (
-      node["amenity"~"cafe|restaurant|fast_food|pub|bar"](around:{radius},{lat},{lon});
-      node["shop"~"mall|supermarket|convenience"](around:{radius},{lat},{lon});
-      node["leisure"~"park|fitness_centre"](around:{radius},{lat},{lon});
-      way["amenity"~"cafe|restaurant|fast_food|pub|bar"](around:{radius},{lat},{lon});
-      way["shop"~"mall|supermarket|convenience"](around:{radius},{lat},{lon});
-      way["leisure"~"park|fitness_centre"](around:{radius},{lat},{lon});
+{nodes}
     );
-    out body;
-    >;
-    out skel qt;
+    out qt{count};
+    (
+{ways}
+    );
+    out tags center qt{count};
     """
 
+def _fetch_overpass(area: str, categories: Dict[str, List[str]] = POI_CATEGORIES,
+                    limit: Optional[int] = None) -> Tuple[Optional[List[POI]], bool]:
+    """
+    Run a POI query and build POIs while the response streams in
+    limit caps each output statement (nodes, ways). Returns (pois, complete) where complete is
+    False if the result may have been truncated, or (None, False) if the response had no elements
+    """
+    response = upstream.post(
+        OVERPASS_URL,
+        data={"data": _build_overpass_query(area, categories, limit)},
+        timeout=OVERPASS_TIMEOUT,
+        stream=True
+    )
     try:
-        # Make the API request
-        response = requests.post(overpass_url, data={"data": overpass_query})
-        data = response.json()
+        response.raise_for_status()
+        stream = JSONArrayStream(response.iter_content(chunk_size=16384), "elements")
+        pois = []
+        seen = set()
+        # Elements printed by each output statement
+        counts = {'node': 0, 'way': 0}
+        for element in stream:
+            if element.get('type') in counts:
+                counts[element['type']] += 1
+            poi = parse_element(element)
+            if not poi or poi['osm_id'] in seen:
+                continue
+            seen.add(poi['osm_id'])
+            pois.append(poi)
+            if resilience.expired():
+                # Out of time: serve what has arrived, as a truncated (uncached) result
+                resilience.mark_degraded('overpass')
+                break
+        tail = stream.read_tail() if stream.finished else ''
+    finally:
+        response.close()
 
-        if "elements" not in data:
-            print("No POIs found in response")
-            return _get_fallback_pois(lat, lon)
+    if not stream.found:
+        return None, False
 
-        pois = []
-        for element in data["elements"]:
-            if "tags" in element:
-                tags = element["tags"]
-
-                # Extract POI details
-                name = tags.get("name", "Unnamed Location")
-                poi_type = None
-
-                # Determine POI type
-                if "amenity" in tags:
-                    poi_type = tags["amenity"].title()
-                elif "shop" in tags:
-                    poi_type = tags["shop"].title()
-                elif "leisure" in tags:
-                    poi_type = tags["leisure"].title()
-
-                if poi_type and name != "Unnamed Location":
-                    address_parts = []
-                    if "addr:street" in tags:
-                        address_parts.append(tags["addr:street"])
-                    if "addr:housenumber" in tags:
-                        address_parts.append(tags["addr:housenumber"])
-                    if "addr:city" in tags:
-                        address_parts.append(tags["addr:city"])
-
-                    address = ", ".join(address_parts) if address_parts else "Address not available"
-
-                    # Get coordinates
-                    if element["type"] == "node":
-                        poi_lat = element["lat"]
-                        poi_lon = element["lon"]
-                    else:
-                        # For ways (areas), use the center coordinates
-                        poi_lat = element.get("center", {}).get("lat", lat)
-                        poi_lon = element.get("center", {}).get("lon", lon)
-
-                    poi = {
-                        'name': name,
-                        'type': poi_type,
-                        'lat': poi_lat,
-                        'lon': poi_lon,
-                        'address': address,
-                        'details': {
-                            'cuisine': tags.get('cuisine', ''),
-                            'opening_hours': tags.get('opening_hours', ''),
-                            'website': tags.get('website', '')
-                        }
-                    }
-                    pois.append(poi)
-
-        # Sort POIs by distance from the center point
-        pois.sort(key=lambda x: ((x['lat'] - lat) ** 2 + (x['lon'] - lon) ** 2) ** 0.5)
-
-        print(f"Found {len(pois)} POIs")
-        return pois
+    # Overpass reports timeouts and memory exhaustion in a "remark" after the elements
+    failed = '"remark"' in tail and 'error' in tail
+    if failed and not pois:
+        raise Exception(f"Overpass query failed: {tail.strip()[:200]}")
 
-    except Exception as e:
-        print(f"Error finding POIs: {str(e)}")
-        return _get_fallback_pois(lat, lon)
+    # Each output statement stops at the limit, so reaching it means there may be more
+    truncated = limit is not None and any(count >= limit for count in counts.values())
+    complete = stream.finished and not failed and not truncated
+    return pois, complete
+
+def _fetch_cells(cells: List[str]) -> Optional[Tuple[Dict[str, List[POI]], bool]]:
+    """
+    Fetch POIs for the given cells with one Overpass query over their combined bounding box
+    The query is not limited, so complete responses hold every POI of the cells and can be cached
+    Returns ({cell: [poi, ...]} for every requested cell (empty cells included), complete),
+    or None if the response had no elements
+    """
+    south, west, north, east = geohash.union_bbox(cells)
+    pois, complete = _fetch_overpass(f"{south},{west},{north},{east}")
+    if pois is None:
+        print("No POIs found in response")
+        return None
+
+    fetched = {cell: [] for cell in cells}
+    for poi in pois:
+        cell = geohash.encode(poi['lat'], poi['lon'], POI_CELL_PRECISION)
+        if cell in fetched:
+            fetched[cell].append(poi)
+    return fetched, complete
+
+def match_category(tags: Dict[str, str], categories: Dict[str, List[str]] = POI_CATEGORIES) -> Optional[str]:
+    """
+    "key=value" of the first tag matching a category filter (same unanchored regex as the
+    Overpass query), or None
+    """
+    for key, values in categories.items():
+        if values and key in tags and re.search("|".join(values), tags[key]):
+            return f"{key}={tags[key]}"
+    return None
+
+def category_tags(tags: Dict[str, str], categories: Dict[str, List[str]] = POI_CATEGORIES) -> List[str]:
+    """
+    "key=value" of every tag whose key is a category key, matching or not, e.g. for the offline
+    index, whose searches may filter on other values of those keys
+    """
+    return [f"{key}={tags[key]}" for key in categories if key in tags]
+
+def parse_element(element: Dict[str, Any]) -> Optional[POI]:
+    """
+    Convert an Overpass element into a POI record, or None if it is not a usable POI
+    """
+    if "tags" not in element:
+        return None
+    tags = element["tags"]
+
+    # Extract POI details
+    name = tags.get("name", "Unnamed Location")
+    poi_type = None
+
+    # Determine POI type
+    if "amenity" in tags:
+        poi_type = tags["amenity"].title()
+    elif "shop" in tags:
+        poi_type = tags["shop"].title()
+    elif "leisure" in tags:
+        poi_type = tags["leisure"].title()
+
+    if not poi_type or name == "Unnamed Location":
+        return None
+
+    address_parts = []
+    if "addr:street" in tags:
+        address_parts.append(tags["addr:street"])
+    if "addr:housenumber" in tags:
+        address_parts.append(tags["addr:housenumber"])
+    if "addr:city" in tags:
+        address_parts.append(tags["addr:city"])
+
+    address = ", ".join(address_parts) if address_parts else "Address not available"
+
+    # Get coordinates
+    if element["type"] == "node":
+        poi_lat = element["lat"]
+        poi_lon = element["lon"]
+    elif "center" in element:
+        # For ways (areas), use the center coordinates
+        poi_lat = element["center"]["lat"]
+        poi_lon = element["center"]["lon"]
+    else:
+        return None
+
+    return POI(
+        f"{element['type']}/{element['id']}",
+        name,
+        poi_type,
+        poi_lat,
+        poi_lon,
+        address,
+        cuisine=tags.get('cuisine', ''),
+        opening_hours=tags.get('opening_hours', ''),
+        website=tags.get('website', '')
+    )
+
+def _load_cells(cells: List[str]) -> Dict[str, List[POI]]:
+    """
+    Read fresh cells from the persistent POI cache
+    """
+    if not cells or not has_app_context():
+        return {}
+
+    try:
+        with Session(db.engine) as session:
+            rows = (
+                session.query(PoiCell)
+                .options(selectinload(PoiCell.pois))
+                .filter(PoiCell.geohash.in_(cells), PoiCell.expires_at > datetime.utcnow())
+                .all()
+            )
+            return {
+                row.geohash: [
+                    POI.from_dict({
+                        'osm_id': poi.osm_id,
+                        'name': poi.name,
+                        'type': poi.type,
+                        'lat': poi.lat,
+                        'lon': poi.lon,
+                        'address': poi.address,
+                        'details': poi.details
+                    })
+                    for poi in row.pois
+                ]
+                for row in rows
+            }
+    except SQLAlchemyError as e:
+        print(f"Error reading POI cache: {str(e)}")
+        return {}
+
+def _store_cells(fetched: Dict[str, List[POI]]) -> None:
+    """
+    Replace the given cells in the persistent POI cache
+    """
+    if not has_app_context() or not fetched:
+        return
+
+    now = datetime.utcnow()
+    try:
+        with Session(db.engine) as session:
+            session.query(CachedPOI).filter(CachedPOI.geohash.in_(fetched)).delete(synchronize_session=False)
+            session.query(PoiCell).filter(PoiCell.geohash.in_(fetched)).delete(synchronize_session=False)
+            for cell, pois in fetched.items():
+                session.add(PoiCell(
+                    geohash=cell,
+                    fetched_at=now,
+                    expires_at=now + timedelta(seconds=POI_CELL_TTL),
+                    pois=[CachedPOI(geohash=cell, **poi) for poi in pois]
+                ))
+            session.commit()
+    except SQLAlchemyError as e:
+        # Another worker may have stored the same cells; the cache is best effort
+        print(f"Error writing POI cache: {str(e)}")
 
-def _get_fallback_pois(lat: float, lon: float) -> List[Dict[str, Any]]:
+def _get_fallback_pois(lat: float, lon: float) -> List[POI]:
     """
-    Provide fallback POIs in case the API fails
+    Provide fallback POIs in case the API fails and no offline index is configured
     """
+    resilience.record_fallback('find_nearby_pois')
     return [
-        {
-            'name': 'Local Cafe',
-            'type': 'Cafe',
-            'lat': lat + 0.001,
-            'lon': lon + 0.001,
-            'address': 'Nearby Location',
-            'details': {}
-        },
-        {
-            'name': 'Public Park',
-            'type': 'Park',
-            'lat': lat - 0.001,
-            'lon': lon - 0.001,
-            'address': 'Nearby Location',
-            'details': {}
-        }
-    ]
\ No newline at end of file
+        POI(None, 'Local Cafe', 'Cafe', lat + 0.001, lon + 0.001, 'Nearby Location'),
+        POI(None, 'Public Park', 'Park', lat - 0.001, lon - 0.001, 'Nearby Location')
+    ]
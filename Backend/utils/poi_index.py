@@ -0,0 +1,344 @@
+import json
+import math
+import mmap
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from utils.distance import polyline_distances
+from utils.records import POI
+
+EARTH_RADIUS_M = 6371008.8
+# Points per KD-tree leaf; leaves are scanned with one vectorized distance check
+POI_INDEX_LEAF_SIZE = 64
+
+# Array files making up a POI index directory, all in KD-tree order
+POI_INDEX_ARRAYS = [
+    'lat',            # (n,) float64
+    'lon',            # (n,) float64
+    'xyz',            # (n, 3) float64 unit-sphere coordinates the tree is built on
+    'tag',            # (m,) uint16 indices into meta['tags'] ("key=value" category tags of every point)
+    'tag_offsets',    # (n + 1,) int64 [start, end) of every point's tags in 'tag'
+    'type',           # (n,) uint16 index into meta['types']
+    'osm_id',         # (n,) int64
+    'osm_type',       # (n,) uint8 index into OSM_TYPES
+    'node_bounds',    # (2 * leaves - 1, 6) float64 min xyz, max xyz of every tree node (heap order)
+    'node_ranges'     # (2 * leaves - 1, 2) int64 [start, end) of every tree node's points
+]
+# Variable-length text columns, each stored as <name>.bin (concatenated UTF-8) and <name>_offsets.npy (n + 1 int64)
+POI_INDEX_TEXT = ['name', 'address', 'cuisine', 'opening_hours', 'website']
+
+OSM_TYPES = ['node', 'way', 'relation']
+
+def _to_xyz(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """
+    Project [lat, lon] in degrees onto the unit sphere, where straight-line (chord)
+    distance grows monotonically with great-circle distance
+    """
+    phi, lam = np.radians(lat), np.radians(lon)
+    return np.column_stack((np.cos(phi) * np.cos(lam), np.cos(phi) * np.sin(lam), np.sin(phi)))
+
+def _extent(lat: np.ndarray, lon: np.ndarray) -> Optional[List[float]]:
+    """
+    [south, west, north, east] of the points, or None without points
+    """
+    if not len(lat):
+        return None
+    return [float(np.min(lat)), float(np.min(lon)), float(np.max(lat)), float(np.max(lon))]
+
+def _chord(radius_m: float) -> float:
+    return 2 * math.sin(min(radius_m / EARTH_RADIUS_M, math.pi) / 2)
+
+def _pack_text(values: Sequence[str]):
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return b''.join(encoded), offsets
+
+def _map_text(path: str):
+    with open(path, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+class POIIndex:
+    """
+    Static POI store with a balanced KD-tree over unit-sphere coordinates, built offline
+    (see tools.build_poi_index) and loaded from memory-mapped .npy files
+    The tree is implicit: points are reordered so every node covers a contiguous range,
+    and nodes are stored in heap order with their bounding boxes
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], text: Dict[str, Any], meta: Dict[str, Any]):
+        self.arrays = arrays
+        self.text = text
+        self.meta = meta
+        self.tags = meta['tags']
+        self.types = meta['types']
+        self.depth = meta['depth']
+        # [south, west, north, east] covered by the extract; indexes built before it was
+        # recorded fall back to the extent of their POIs
+        self.bbox = meta.get('bbox') or _extent(arrays['lat'], arrays['lon'])
+
+    def __len__(self) -> int:
+        return len(self.arrays['lat'])
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'POIIndex':
+        """
+        Load an index directory written by save(); arrays are memory-mapped by default
+        """
+        mode = 'r' if mmap else None
+        names = POI_INDEX_ARRAYS + [f"{name}_offsets" for name in POI_INDEX_TEXT]
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode)
+                  for name in names if name != 'tag_offsets' or os.path.exists(os.path.join(path, f"{name}.npy"))}
+        if 'tag_offsets' not in arrays:
+            # Built before points kept every category tag: one tag per point
+            arrays['tag_offsets'] = np.arange(len(arrays['tag']) + 1, dtype=np.int64)
+        text = {name: _map_text(os.path.join(path, f"{name}.bin")) for name in POI_INDEX_TEXT}
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        return cls(arrays, text, meta)
+
+    @classmethod
+    def from_pois(cls, pois: Sequence[Dict[str, Any]], leaf_size: int = POI_INDEX_LEAF_SIZE,
+                  bbox: Optional[Sequence[float]] = None) -> 'POIIndex':
+        """
+        Build an index from POI dicts as produced by utils.poi.parse_element, each with an extra
+        'tags' (the "key=value" tags of its element whose key is a category key, see
+        utils.poi.category_tags), so that searches with other categories match on any of them
+        bbox ([south, west, north, east]) is the area covered by the extract; it defaults to the
+        extent of the POIs
+        """
+        count = len(pois)
+        lat = np.array([poi['lat'] for poi in pois], dtype=np.float64)
+        lon = np.array([poi['lon'] for poi in pois], dtype=np.float64)
+        xyz = _to_xyz(lat, lon) if count else np.zeros((0, 3))
+
+        # Balanced tree: split the widest axis at the median until leaves hold at most leaf_size points
+        depth = 0
+        while count > leaf_size * (2 ** depth):
+            depth += 1
+        leaves = 2 ** depth
+        order = np.arange(count)
+        node_ranges = np.zeros((2 * leaves - 1, 2), dtype=np.int64)
+        node_bounds = np.empty((2 * leaves - 1, 6), dtype=np.float64)
+        node_ranges[0] = (0, count)
+        for node in range(2 * leaves - 1):
+            start, end = node_ranges[node]
+            points = xyz[order[start:end]]
+            if end > start:
+                node_bounds[node, :3] = points.min(axis=0)
+                node_bounds[node, 3:] = points.max(axis=0)
+            else:
+                node_bounds[node, :3], node_bounds[node, 3:] = np.inf, -np.inf  # Never matches
+
+            if node < leaves - 1:
+                middle = (start + end) // 2
+                if end - start > 1:
+                    axis = int(np.argmax(node_bounds[node, 3:] - node_bounds[node, :3]))
+                    order[start:end] = order[start:end][np.argpartition(points[:, axis], middle - start)]
+                node_ranges[2 * node + 1] = (start, middle)
+                node_ranges[2 * node + 2] = (middle, end)
+
+        tags = sorted({tag for poi in pois for tag in poi['tags']})
+        types = sorted({poi['type'] for poi in pois})
+        tag_codes = {tag: i for i, tag in enumerate(tags)}
+        type_codes = {poi_type: i for i, poi_type in enumerate(types)}
+        pois = [pois[i] for i in order]
+        tag_offsets = np.zeros(len(pois) + 1, dtype=np.int64)
+        np.cumsum([len(poi['tags']) for poi in pois], out=tag_offsets[1:])
+
+        arrays = {
+            'lat': lat[order],
+            'lon': lon[order],
+            'xyz': xyz[order],
+            'tag': np.array([tag_codes[tag] for poi in pois for tag in poi['tags']], dtype=np.uint16),
+            'tag_offsets': tag_offsets,
+            'type': np.array([type_codes[poi['type']] for poi in pois], dtype=np.uint16),
+            'osm_id': np.array([int(poi['osm_id'].split('/')[1]) for poi in pois], dtype=np.int64),
+            'osm_type': np.array([OSM_TYPES.index(poi['osm_id'].split('/')[0]) for poi in pois], dtype=np.uint8),
+            'node_bounds': node_bounds,
+            'node_ranges': node_ranges
+        }
+        text = {}
+        for name in POI_INDEX_TEXT:
+            values = [poi[name] if name in ('name', 'address') else poi['details'].get(name, '') for poi in pois]
+            text[name], arrays[f"{name}_offsets"] = _pack_text(values)
+
+        meta = {'count': len(pois), 'depth': depth, 'leaf_size': leaf_size, 'tags': tags, 'types': types,
+                'bbox': [float(value) for value in bbox] if bbox is not None else _extent(lat, lon)}
+        return cls(arrays, text, meta)
+
+    def save(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        for name, array in self.arrays.items():
+            np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(array))
+        for name, blob in self.text.items():
+            with open(os.path.join(path, f"{name}.bin"), 'wb') as f:
+                f.write(blob)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(self.meta, f)
+
+    def covers(self, points: Sequence[Sequence[float]], margin: float = 0.0) -> bool:
+        """
+        Whether every [lat, lon] point, with margin meters around it, lies inside the area of the
+        extract, so that a search there finds everything an Overpass query would
+        """
+        if self.bbox is None:
+            return False
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        south, west, north, east = self.bbox
+        margin_lat = np.degrees(margin / EARTH_RADIUS_M)
+        margin_lon = margin_lat / np.maximum(np.cos(np.radians(points[:, 0])), 1e-6)
+        return bool(np.all(
+            (points[:, 0] - margin_lat >= south) & (points[:, 0] + margin_lat <= north) &
+            (points[:, 1] - margin_lon >= west) & (points[:, 1] + margin_lon <= east)
+        ))
+
+    def _texts(self, name: str, indices: np.ndarray) -> List[str]:
+        offsets = self.arrays[f"{name}_offsets"]
+        blob = self.text[name]
+        return [blob[start:end].decode('utf-8') for start, end in zip(offsets[indices].tolist(), offsets[indices + 1].tolist())]
+
+    def _box_distances2(self, nodes: np.ndarray, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+        """
+        Squared distance between the bounding box of each node and the box [low, high] (0 if they overlap)
+        """
+        boxes = self.arrays['node_bounds'][nodes]
+        gap = np.maximum(np.maximum(boxes[:, :3] - high, low - boxes[:, 3:]), 0)
+        return np.einsum('ij,ij->i', gap, gap)
+
+    def _candidates(self, low: np.ndarray, high: np.ndarray, reach2: float) -> np.ndarray:
+        """
+        Indices of all points in leaves whose box is within sqrt(reach2) of the box [low, high]
+        All nodes halfway down the tree are tested at once, then all leaves below the ones that
+        pass, so a search takes two vectorized steps instead of one per level
+        """
+        # In heap order the descendants of a node n, d levels down, are the contiguous ids
+        # (n + 1) * 2**d - 1 ... (n + 2) * 2**d - 2
+        middle = self.depth // 2
+        span = 2 ** (self.depth - middle)
+        nodes = np.arange(2 ** middle - 1, 2 ** (middle + 1) - 1)
+        nodes = nodes[self._box_distances2(nodes, low, high) <= reach2]
+        leaves = ((nodes[:, None] + 1) * span - 1 + np.arange(span)).ravel()
+        leaves = leaves[self._box_distances2(leaves, low, high) <= reach2]
+
+        ranges = self.arrays['node_ranges'][leaves]
+        lengths = ranges[:, 1] - ranges[:, 0]
+        # Concatenation of all leaf ranges without a Python loop
+        return np.arange(lengths.sum()) + np.repeat(ranges[:, 0] - np.cumsum(lengths) + lengths, lengths)
+
+    def nearby(self, lat: float, lon: float, radius: float) -> np.ndarray:
+        """
+        Indices of the points within radius meters, nearest first
+        """
+        if not len(self):
+            return np.zeros(0, dtype=np.int64)
+
+        point = _to_xyz(np.array([lat]), np.array([lon]))[0]
+        chord2 = _chord(radius) ** 2
+        candidates = self._candidates(point, point, chord2)
+        offsets = self.arrays['xyz'][candidates] - point
+        distances2 = np.einsum('ij,ij->i', offsets, offsets)
+        inside = distances2 <= chord2
+        return candidates[inside][np.argsort(distances2[inside], kind='stable')]
+
+    def along(self, line: Sequence[Sequence[float]], width: float):
+        """
+        Points within width meters of a [lat, lon] polyline, nearest to the line first
+        Returns (indices, distances in meters)
+        """
+        line = np.asarray(line, dtype=float).reshape(-1, 2)
+        if not len(self) or not len(line):
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        vertices = _to_xyz(line[:, 0], line[:, 1])
+        reach = _chord(width)
+        reference_lat = float(line[:, 0].mean())
+        # One box per segment: a single box around a diagonal line covers far more than the
+        # corridor, and every point inside it would be measured against every segment
+        found, found_distances = [], []
+        for start in range(max(len(line) - 1, 1)):
+            segment = vertices[start:start + 2]
+            # Segments bow away from their chords by at most length^2 / 8 on the unit sphere
+            bow = float(np.sum((segment[-1] - segment[0]) ** 2)) / 8
+            candidates = self._candidates(segment.min(axis=0), segment.max(axis=0), (reach + bow) ** 2)
+            points = np.column_stack((self.arrays['lat'][candidates], self.arrays['lon'][candidates]))
+            distances = polyline_distances(points, line[start:start + 2], reference_lat) * 1000
+            inside = distances <= width
+            found.append(candidates[inside])
+            found_distances.append(distances[inside])
+
+        # Points near several segments keep the distance to the nearest one
+        indices = np.concatenate(found)
+        distances = np.concatenate(found_distances)
+        order = np.lexsort((distances, indices))
+        indices, distances = indices[order], distances[order]
+        first = np.ones(len(indices), dtype=bool)
+        first[1:] = indices[1:] != indices[:-1]
+        order = np.argsort(distances[first], kind='stable')
+        return indices[first][order], distances[first][order]
+
+    def _filter(self, indices: np.ndarray, categories: Optional[Dict[str, List[str]]]) -> np.ndarray:
+        """
+        Keep the points with any category tag matching the filters ({tag key: [values]}),
+        with the same unanchored regex semantics as the Overpass query
+        """
+        if categories is None:
+            return indices
+        patterns = {key: re.compile("|".join(values)) for key, values in categories.items() if values}
+        allowed = np.array([
+            key in patterns and patterns[key].search(value) is not None
+            for key, value in (tag.split('=', 1) for tag in self.tags)
+        ], dtype=bool)
+
+        offsets = self.arrays['tag_offsets']
+        starts = offsets[indices]
+        counts = offsets[indices + 1] - starts
+        # Tag positions of all points concatenated, and the point each one belongs to
+        positions = np.arange(counts.sum()) + np.repeat(starts - np.cumsum(counts) + counts, counts)
+        owners = np.repeat(np.arange(len(indices)), counts)
+        matches = np.bincount(owners, weights=allowed[self.arrays['tag'][positions]], minlength=len(indices))
+        return indices[matches > 0]
+
+    def records(self, indices: np.ndarray) -> List[POI]:
+        """
+        POI records, in the format returned by utils.poi.find_nearby_pois, for the given points
+        """
+        text = {name: self._texts(name, indices) for name in POI_INDEX_TEXT}
+        osm_types = self.arrays['osm_type'][indices].tolist()
+        osm_ids = self.arrays['osm_id'][indices].tolist()
+        types = self.arrays['type'][indices].tolist()
+        lats = self.arrays['lat'][indices].tolist()
+        lons = self.arrays['lon'][indices].tolist()
+        return [
+            POI(
+                f"{OSM_TYPES[osm_types[k]]}/{osm_ids[k]}",
+                text['name'][k],
+                self.types[types[k]],
+                lats[k],
+                lons[k],
+                text['address'][k],
+                cuisine=text['cuisine'][k],
+                opening_hours=text['opening_hours'][k],
+                website=text['website'][k]
+            )
+            for k in range(len(indices))
+        ]
+
+    def query(self, lat: float, lon: float, radius: float = 1500,
+              categories: Optional[Dict[str, List[str]]] = None, limit: Optional[int] = None) -> List[POI]:
+        """
+        Up to limit POIs within radius meters, sorted by distance; categories ({tag key: [values]})
+        matches like the Overpass regex filters
+        """
+        return self.records(self._filter(self.nearby(lat, lon, radius), categories)[:limit])
+
+    def query_along(self, line: Sequence[Sequence[float]], width: float,
+                    categories: Optional[Dict[str, List[str]]] = None, limit: Optional[int] = None) -> List[POI]:
+        """
+        Up to limit POIs within width meters of a polyline, nearest to the line first
+        """
+        indices, _ = self.along(line, width)
+        return self.records(self._filter(indices, categories)[:limit])
@@ -0,0 +1,69 @@
+import heapq
+from typing import Any, Dict, List, Optional
+from utils.routing import calculate_travel_time_matrix
+
+# OSRM's default max-table-size is 100 coordinates: 2 origins + 98 POIs
+POI_RANKING_MAX_CANDIDATES = 98
+POI_TOP_K = 10
+
+# Score = FAIRNESS_WEIGHT * |t1 - t2| + TOTAL_TIME_WEIGHT * (t1 + t2), in minutes; lower is better
+FAIRNESS_WEIGHT = 1.0
+TOTAL_TIME_WEIGHT = 0.25
+
+def rank_pois_by_fairness(pois: List[Dict[str, Any]], origin1: List[float], origin2: List[float],
+                          k: int = POI_TOP_K, fairness_weight: float = FAIRNESS_WEIGHT,
+                          total_weight: float = TOTAL_TIME_WEIGHT) -> List[Dict[str, Any]]:
+    """
+    Rank POIs by how evenly and how quickly both people can reach them
+    Driving times from both origins to every candidate come from one travel-time matrix
+    request; the best k are picked with heap selection. Each returned POI gets
+    'travel_time1', 'travel_time2' (minutes) and 'score'. POIs that cannot be reached are
+    dropped. If the matrix request fails, the first k POIs are returned as plain dicts.
+    """
+    # Candidates arrive sorted by distance, so the nearest ones are kept when capping
+    candidates = pois[:POI_RANKING_MAX_CANDIDATES]
+    if not candidates:
+        return []
+
+    matrix = calculate_travel_time_matrix([origin1, origin2], [[poi['lat'], poi['lon']] for poi in candidates])
+    if not matrix:
+        return [dict(poi) for poi in pois[:k]]
+
+    scored = []
+    for index, (time1, time2) in enumerate(zip(matrix[0], matrix[1])):
+        if time1 is None or time2 is None:
+            continue
+        score = fairness_weight * abs(time1 - time2) + total_weight * (time1 + time2)
+        scored.append((score, index, time1, time2))
+
+    ranked = []
+    for score, index, time1, time2 in heapq.nsmallest(k, scored):
+        poi = dict(candidates[index])
+        poi['travel_time1'] = round(time1)
+        poi['travel_time2'] = round(time2)
+        poi['score'] = round(score, 2)
+        ranked.append(poi)
+    return ranked
+
+# Corridor ranking: score = detour + DETOUR_FAIRNESS_WEIGHT * |t1 - t2|, in minutes
+DETOUR_FAIRNESS_WEIGHT = 0.25
+
+def rank_pois_by_detour(pois: List[Dict[str, Any]], origin1: List[float], origin2: List[float],
+                        route_minutes: Optional[float] = None, k: int = POI_TOP_K,
+                        fairness_weight: float = DETOUR_FAIRNESS_WEIGHT) -> List[Dict[str, Any]]:
+    """
+    Rank POIs along a route by how much they lengthen the trip between both origins
+    The detour is t1 + t2 minus the driving time of the route (or, when it is unknown, minus
+    the smallest t1 + t2 among the candidates). Same matrix request and output as
+    rank_pois_by_fairness, plus 'detour' (minutes) on every ranked POI.
+    """
+    ranked = rank_pois_by_fairness(pois, origin1, origin2, k, fairness_weight=fairness_weight, total_weight=1.0)
+    totals = [poi['travel_time1'] + poi['travel_time2'] for poi in ranked if 'travel_time1' in poi]
+    if not totals:
+        return ranked
+
+    baseline = route_minutes if route_minutes is not None else min(totals)
+    for poi in ranked:
+        if 'travel_time1' in poi:
+            poi['detour'] = max(round(poi['travel_time1'] + poi['travel_time2'] - baseline), 0)
+    return ranked
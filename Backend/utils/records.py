@@ -0,0 +1,154 @@
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
+import numpy as np
+
+# Keys a POI exposes through the mapping interface, in the order of the former POI dicts
+POI_KEYS = ('osm_id', 'name', 'type', 'lat', 'lon', 'address', 'details')
+POI_DETAILS = ('cuisine', 'opening_hours', 'website')
+
+def _readonly(array: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    if array is not None:
+        array.flags.writeable = False
+    return array
+
+class Route:
+    """
+    Immutable [lat, lon] polyline backed by one contiguous (n, 2) float64 array, with the
+    per-segment durations (seconds) and distances (meters) of a routing response when known
+    Slices are views sharing the arrays; nested lists are only built on demand by tolist(),
+    a new one per call, so callers may modify it. np.asarray(route) returns the coordinate
+    array without copying.
+    """
+    __slots__ = ('coordinates', 'durations', 'distances')
+
+    def __init__(self, coordinates: Union[np.ndarray, Sequence[Sequence[float]]],
+                 durations: Optional[Sequence[float]] = None, distances: Optional[Sequence[float]] = None):
+        coordinates = np.ascontiguousarray(coordinates, dtype=np.float64).reshape(-1, 2)
+        segments = max(len(coordinates) - 1, 0)
+
+        # Annotations are only usable when they line up with the geometry segments
+        annotated = durations is not None and distances is not None and len(durations) == len(distances) == segments
+        self._set(
+            coordinates,
+            np.asarray(durations, dtype=np.float64) if annotated else None,
+            np.asarray(distances, dtype=np.float64) if annotated else None
+        )
+
+    def _set(self, coordinates: np.ndarray, durations: Optional[np.ndarray], distances: Optional[np.ndarray]) -> None:
+        self.coordinates = _readonly(coordinates)
+        self.durations = _readonly(durations)
+        self.distances = _readonly(distances)
+
+    @classmethod
+    def _view(cls, coordinates: np.ndarray, durations: Optional[np.ndarray], distances: Optional[np.ndarray]) -> 'Route':
+        route = cls.__new__(cls)
+        route._set(coordinates, durations, distances)
+        return route
+
+    @classmethod
+    def coerce(cls, route: Union['Route', np.ndarray, Sequence[Sequence[float]]],
+               durations: Optional[Sequence[float]] = None) -> 'Route':
+        """
+        The route itself, or a Route built from a list or array of [lat, lon] points
+        Durations alone (without distances) are kept as given
+        """
+        if isinstance(route, Route):
+            return route
+        result = cls(route)
+        if durations is not None and len(durations) == max(len(result) - 1, 0):
+            result.durations = _readonly(np.asarray(durations, dtype=np.float64))
+        return result
+
+    def __len__(self) -> int:
+        return len(self.coordinates)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[List[float], 'Route']:
+        if not isinstance(index, slice):
+            return self.coordinates[index].tolist()
+
+        start, stop, step = index.indices(len(self))
+        if step != 1:
+            # Not consecutive segments, so the annotations do not apply
+            return Route._view(self.coordinates[index], None, None)
+        end = max(stop - 1, start)
+        return Route._view(
+            self.coordinates[start:stop],
+            self.durations[start:end] if self.durations is not None else None,
+            self.distances[start:end] if self.distances is not None else None
+        )
+
+    def __iter__(self) -> Iterator[List[float]]:
+        return iter(self.tolist())
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        if dtype is not None and np.dtype(dtype) != self.coordinates.dtype:
+            return self.coordinates.astype(dtype)
+        return self.coordinates.copy() if copy else self.coordinates
+
+    def __repr__(self) -> str:
+        return f"Route({len(self)} points, annotated={self.durations is not None})"
+
+    def tolist(self) -> List[List[float]]:
+        """
+        Nested [lat, lon] lists (e.g. for JSON or map rendering), owned by the caller
+        """
+        return self.coordinates.tolist()
+
+    @property
+    def duration(self) -> Optional[float]:
+        """
+        Total travel time in seconds, when the route is annotated
+        """
+        return float(self.durations.sum()) if self.durations is not None else None
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in (self.coordinates, self.durations, self.distances) if array is not None)
+
+class POI(Mapping):
+    """
+    POI record with slots instead of a dict per POI (and another for its details)
+    Records are shared by the caches and never modified in place. They read like the former
+    POI dicts (poi['name'], poi.get('details'), dict(poi), **poi); callers that add keys
+    (rankings, distances) copy them into a dict first with dict(poi, ...).
+    """
+    __slots__ = ('osm_id', 'name', 'type', 'lat', 'lon', 'address') + POI_DETAILS
+
+    def __init__(self, osm_id: Optional[str], name: str, type: str, lat: float, lon: float, address: str,
+                 cuisine: str = '', opening_hours: str = '', website: str = ''):
+        self.osm_id = osm_id
+        self.name = name
+        self.type = type
+        self.lat = lat
+        self.lon = lon
+        self.address = address
+        self.cuisine = cuisine
+        self.opening_hours = opening_hours
+        self.website = website
+
+    @classmethod
+    def from_dict(cls, poi: Dict[str, Any]) -> 'POI':
+        details = poi.get('details') or {}
+        return cls(poi.get('osm_id'), poi['name'], poi['type'], poi['lat'], poi['lon'], poi['address'],
+                   *(details.get(name, '') for name in POI_DETAILS))
+
+    @property
+    def details(self) -> Dict[str, str]:
+        return {name: getattr(self, name) for name in POI_DETAILS}
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in POI_KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(POI_KEYS)
+
+    def __len__(self) -> int:
+        return len(POI_KEYS)
+
+    def __repr__(self) -> str:
+        return f"POI({self.osm_id!r}, {self.name!r}, {self.type!r}, {self.lat}, {self.lon})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: self[key] for key in POI_KEYS}
@@ -0,0 +1,235 @@
+import contextlib
+import contextvars
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional, Set, Tuple
+from utils import metrics
+
+# End-to-end latency budget of one request or search, in seconds; every upstream call made on its
+# behalf gets at most the time that is left
+REQUEST_SLO_SECONDS = float(os.environ.get('REQUEST_SLO_SECONDS', '10'))
+
+# A host's circuit opens after this many consecutive failed or slow calls...
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', '5'))
+# ...where calls slower than this count as failures even when they succeed
+BREAKER_SLOW_CALL_SECONDS = float(os.environ.get('BREAKER_SLOW_CALL_SECONDS', '5'))
+# Time an open circuit rejects calls before a single probe call is let through
+BREAKER_RESET_SECONDS = float(os.environ.get('BREAKER_RESET_SECONDS', '30'))
+
+class DeadlineExceeded(Exception):
+    pass
+
+class CircuitOpenError(Exception):
+    pass
+
+class Budget:
+    """
+    Deadline of the current request, shared with worker threads through the context variable
+    that holds it, plus the stages that had to serve a degraded result
+    """
+
+    def __init__(self, seconds: float, parent: Optional['Budget'] = None):
+        self.deadline = time.monotonic() + seconds
+        if parent is not None:
+            self.deadline = min(self.deadline, parent.deadline)
+        self.parent = parent
+        self.degraded: Set[str] = set()
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+    def mark_degraded(self, stage: str) -> None:
+        budget = self
+        while budget is not None:
+            budget.degraded.add(stage)
+            budget = budget.parent
+
+_current_budget: contextvars.ContextVar[Optional[Budget]] = contextvars.ContextVar('budget', default=None)
+# Stage sets of the enclosing track_degraded() blocks
+_degraded_scopes: contextvars.ContextVar[Tuple[Set[str], ...]] = contextvars.ContextVar('degraded_scopes', default=())
+
+def start_deadline(seconds: float = REQUEST_SLO_SECONDS) -> Budget:
+    """
+    Give the current context a budget of seconds (never beyond an enclosing one)
+    """
+    budget = Budget(seconds, _current_budget.get())
+    budget.token = _current_budget.set(budget)
+    return budget
+
+def finish_deadline(budget: Budget) -> None:
+    try:
+        _current_budget.reset(budget.token)
+    except ValueError:
+        # Finished from a different context: restore the enclosing budget there, if this one is current
+        if _current_budget.get() is budget:
+            _current_budget.set(budget.parent)
+
+@contextlib.contextmanager
+def deadline(seconds: float = REQUEST_SLO_SECONDS) -> Iterator[Budget]:
+    budget = start_deadline(seconds)
+    try:
+        yield budget
+    finally:
+        finish_deadline(budget)
+
+def call_with_deadline(seconds: float, fn: Callable, *args, **kwargs) -> Any:
+    """
+    Run fn with a budget of its own, e.g. for one pair of a batch on a worker thread
+    """
+    with deadline(seconds):
+        return fn(*args, **kwargs)
+
+def remaining() -> Optional[float]:
+    """
+    Seconds left in the current budget, or None without one
+    """
+    budget = _current_budget.get()
+    return budget.remaining() if budget is not None else None
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+def clamp_timeout(timeout: float, host: str = '') -> float:
+    """
+    The timeout, shortened to the time left in the current budget
+    Raises DeadlineExceeded when the budget is already spent
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        metrics.increment('deadline_exceeded_total', 'host', host)
+        raise DeadlineExceeded(f"Request deadline exceeded before calling {host or 'upstream'}")
+    return min(timeout, left)
+
+def can_wait(seconds: float) -> bool:
+    """
+    Whether sleeping for seconds (e.g. a retry backoff) still leaves time in the current budget
+    """
+    left = remaining()
+    return left is None or seconds < left
+
+def mark_degraded(stage: str) -> None:
+    """
+    Note that the current request served a degraded result (so it should not be cached)
+    """
+    budget = _current_budget.get()
+    if budget is not None:
+        budget.mark_degraded(stage)
+    for stages in _degraded_scopes.get():
+        stages.add(stage)
+
+def is_degraded(stage: Optional[str] = None) -> bool:
+    """
+    Whether the current request served a degraded result, for the given stage or any stage
+    """
+    budget = _current_budget.get()
+    if budget is None:
+        return False
+    return stage in budget.degraded if stage is not None else bool(budget.degraded)
+
+@contextlib.contextmanager
+def track_degraded() -> Iterator[Set[str]]:
+    """
+    Collect the stages marked as degraded inside the block, e.g. so that callers sharing a
+    coalesced result can be marked as well
+    """
+    stages: Set[str] = set()
+    token = _degraded_scopes.set(_degraded_scopes.get() + (stages,))
+    try:
+        yield stages
+    finally:
+        _degraded_scopes.reset(token)
+
+def record_fallback(stage: str) -> None:
+    metrics.record_fallback(stage)
+    mark_degraded(stage)
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker
+    Closed: calls pass, consecutive failures (errors, retryable statuses or slow calls) are counted.
+    Open: calls are rejected immediately with CircuitOpenError, so callers go straight to their
+    fallback. After BREAKER_RESET_SECONDS one probe call is let through (half-open); its outcome
+    closes or re-opens the circuit.
+    """
+
+    def __init__(self, host: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 slow_call_seconds: float = BREAKER_SLOW_CALL_SECONDS, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.host = host
+        self.failure_threshold = max(failure_threshold, 1)
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            if self.probing or time.monotonic() - self.opened_at >= self.reset_seconds:
+                return 'half-open'
+            return 'open'
+
+    def allow(self, probe: bool = True) -> bool:
+        """
+        Raise CircuitOpenError unless a call may be made now
+        Returns True when the caller took the half-open probe slot; it must then report the outcome
+        with record() or give the slot back with release(). With probe=False the slot is not taken,
+        so callers can check the circuit before their local pre-checks (rate limit, deadline).
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            if not self.probing and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.probing = probe
+                return probe
+        metrics.increment('circuit_breaker_rejections_total', 'host', self.host)
+        raise CircuitOpenError(f"Circuit open for {self.host}")
+
+    def release(self) -> None:
+        """
+        Give back the probe slot of a call that ended without an outcome (e.g. a local error)
+        """
+        with self._lock:
+            self.probing = False
+
+    def record(self, success: bool, seconds: float = 0.0) -> None:
+        """
+        Outcome of a call let through by allow()
+        """
+        failed = not success or seconds > self.slow_call_seconds
+        with self._lock:
+            probe = self.probing
+            self.probing = False
+            if not failed:
+                self.failures = 0
+                self.opened_at = None
+                return
+
+            self.failures += 1
+            tripped = probe or (self.opened_at is None and self.failures >= self.failure_threshold)
+            if tripped:
+                self.opened_at = time.monotonic()
+        if tripped:
+            metrics.increment('circuit_breaker_trips_total', 'host', self.host)
+            print(f"Error: circuit opened for {self.host} after {self.failures} failed or slow calls")
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(host: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+        return _breakers[host]
+
+def breaker_states() -> Dict[str, str]:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.host: breaker.state for breaker in breakers}
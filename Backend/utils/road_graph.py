@@ -0,0 +1,288 @@
+import heapq
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from utils.distance import EARTH_RADIUS_KM, distances_from, haversine_distances
+
+# Array files making up a preprocessed road graph directory
+GRAPH_ARRAYS = [
+    'nodes',          # (n, 2) float64 [lat, lon]
+    'indptr',         # (n + 1,) int64 CSR offsets of outgoing edges
+    'targets',        # (m,) int64 edge heads
+    'durations',      # (m,) float32 edge travel times in seconds
+    'distances',      # (m,) float32 edge lengths in meters
+    'rev_indptr',     # (n + 1,) int64 CSR offsets of incoming edges
+    'rev_sources',    # (m,) int64 edge tails, grouped by head
+    'rev_edges'       # (m,) int64 forward edge index of every incoming edge
+]
+
+# Average number of nodes per cell of the grid used to snap points to the graph
+SNAP_NODES_PER_CELL = 8
+
+class RoadGraph:
+    """
+    Directed road graph in compressed sparse row form, loaded from memory-mapped .npy files
+    Forward and reverse adjacency are both stored so that searches can run from either end.
+    A grid over the nodes is built at load time for nearest_node
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        for name in GRAPH_ARRAYS:
+            setattr(self, name, arrays[name])
+        self._build_snap_grid()
+
+    def _build_snap_grid(self) -> None:
+        """
+        Bucket the nodes into a lat/lon grid of cells holding about SNAP_NODES_PER_CELL nodes each
+        Only occupied cells are stored, as sorted keys with CSR offsets into the sorted nodes
+        """
+        nodes = np.asarray(self.nodes, dtype=np.float64).reshape(-1, 2)
+        low = nodes.min(axis=0) if len(nodes) else np.zeros(2)
+        extent = nodes.max(axis=0) - low if len(nodes) else np.zeros(2)
+        # Roughly square cells on the ground
+        lon_scale = max(float(np.cos(np.radians(low[0] + extent[0] / 2))), 0.01)
+        cells = max(len(nodes) / SNAP_NODES_PER_CELL, 1.0)
+        lat_step = max(float(np.sqrt(extent[0] * extent[1] * lon_scale / cells)),
+                       max(extent[0], extent[1] * lon_scale) / cells, 1e-7)
+
+        self._snap_low = low
+        self._snap_step = np.array([lat_step, lat_step / lon_scale])
+        self._snap_dims = (extent // self._snap_step).astype(np.int64) + 1
+        keys = self._snap_keys_of(np.floor((nodes - low) / self._snap_step).astype(np.int64))
+        self._snap_order = np.argsort(keys, kind='stable')
+        self._snap_keys, counts = np.unique(keys[self._snap_order], return_counts=True)
+        self._snap_indptr = np.concatenate(([0], np.cumsum(counts)))
+
+    def _snap_keys_of(self, cells: np.ndarray) -> np.ndarray:
+        return cells[:, 0] * self._snap_dims[1] + cells[:, 1]
+
+    @property
+    def node_count(self) -> int:
+        return len(self.nodes)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'RoadGraph':
+        """
+        Load a graph directory written by save(); arrays are memory-mapped by default
+        """
+        mode = 'r' if mmap else None
+        return cls({name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in GRAPH_ARRAYS})
+
+    @classmethod
+    def from_edges(cls, nodes: Sequence[Sequence[float]], edges: Iterable[Tuple[int, int, float, float]]) -> 'RoadGraph':
+        """
+        Build a graph from [lat, lon] nodes and directed (source, target, seconds, meters) edges
+        """
+        nodes = np.asarray(nodes, dtype=np.float64).reshape(-1, 2)
+        edge_array = np.asarray(list(edges), dtype=np.float64).reshape(-1, 4)
+        sources = edge_array[:, 0].astype(np.int64)
+        targets = edge_array[:, 1].astype(np.int64)
+
+        order = np.argsort(sources, kind='stable')
+        sources, targets, edge_array = sources[order], targets[order], edge_array[order]
+        indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(nodes)), out=indptr[1:])
+
+        rev_order = np.argsort(targets, kind='stable')
+        rev_indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(targets, minlength=len(nodes)), out=rev_indptr[1:])
+
+        return cls({
+            'nodes': nodes,
+            'indptr': indptr,
+            'targets': targets,
+            'durations': edge_array[:, 2].astype(np.float32),
+            'distances': edge_array[:, 3].astype(np.float32),
+            'rev_indptr': rev_indptr,
+            'rev_sources': sources[rev_order],
+            'rev_edges': rev_order.astype(np.int64)
+        })
+
+    def save(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        for name in GRAPH_ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'nodes': self.node_count, 'edges': int(len(self.targets))}, f)
+
+    def _unvisited_distance(self, lat: float, lon: float, low: np.ndarray, high: np.ndarray) -> float:
+        """
+        Lower bound in kilometers on the distance from a point to the grid cells outside the box of
+        cells [low, high] (the strips on each side of it that still hold cells), inf when none are left
+        """
+        grid_low = self._snap_low
+        grid_high = grid_low + self._snap_dims * self._snap_step
+        bound = np.inf
+        for axis in range(2):
+            strips = []
+            if low[axis] > 0:
+                strips.append((grid_low[axis], grid_low[axis] + low[axis] * self._snap_step[axis]))
+            if high[axis] < self._snap_dims[axis] - 1:
+                strips.append((grid_low[axis] + (high[axis] + 1) * self._snap_step[axis], grid_high[axis]))
+            for start, end in strips:
+                box_low, box_high = grid_low.copy(), grid_high.copy()
+                box_low[axis], box_high[axis] = start, end
+                gap = np.radians(np.maximum(np.maximum(box_low - [lat, lon], [lat, lon] - box_high), 0))
+                # hav(d) = hav(dlat) + cos(lat1) cos(lat2) hav(dlon), with cos(lat2) at its smallest in the strip
+                min_cos = max(float(np.cos(np.radians(max(abs(box_low[0]), abs(box_high[0]))))), 0.0)
+                h = np.sin(gap[0] / 2) ** 2 + np.cos(np.radians(lat)) * min_cos * np.sin(gap[1] / 2) ** 2
+                bound = min(bound, 2 * EARTH_RADIUS_KM * float(np.arcsin(np.sqrt(min(h, 1.0)))))
+        return bound
+
+    def nearest_node(self, lat: float, lon: float) -> int:
+        """
+        Index of the node closest to a point
+        Grid cells are visited in rings around the point's cell (clamped to the grid) until the
+        closest node found is nearer than every cell not visited yet
+        """
+        dims = self._snap_dims
+        center = np.clip(np.floor(([lat, lon] - self._snap_low) / self._snap_step).astype(np.int64), 0, dims - 1)
+        best, best_distance = -1, np.inf
+
+        for ring in range(int(dims.max())):
+            low = np.maximum(center - ring, 0)
+            high = np.minimum(center + ring, dims - 1)
+            rows, cols = np.mgrid[low[0]:high[0] + 1, low[1]:high[1] + 1]
+            cells = np.column_stack((rows.ravel(), cols.ravel()))
+            cells = cells[np.abs(cells - center).max(axis=1) == ring]
+
+            keys = self._snap_keys_of(cells)
+            positions = np.searchsorted(self._snap_keys, keys)
+            occupied = positions < len(self._snap_keys)
+            occupied[occupied] = self._snap_keys[positions[occupied]] == keys[occupied]
+            spans = [(self._snap_indptr[i], self._snap_indptr[i + 1]) for i in positions[occupied].tolist()]
+            if spans:
+                nodes = np.concatenate([self._snap_order[start:end] for start, end in spans])
+                distances = distances_from([lat, lon], self.nodes[nodes])
+                nearest = int(np.argmin(distances))
+                if distances[nearest] < best_distance:
+                    best, best_distance = int(nodes[nearest]), float(distances[nearest])
+
+            if best >= 0 and best_distance <= self._unvisited_distance(lat, lon, low, high):
+                break
+        return best
+
+    def _neighbours(self, node: int, reverse: bool):
+        """
+        Yield (neighbour, forward edge index) pairs in the requested direction
+        """
+        if reverse:
+            start, end = self.rev_indptr[node], self.rev_indptr[node + 1]
+            for neighbour, edge in zip(self.rev_sources[start:end], self.rev_edges[start:end]):
+                yield int(neighbour), int(edge)
+        else:
+            start, end = self.indptr[node], self.indptr[node + 1]
+            for edge in range(start, end):
+                yield int(self.targets[edge]), edge
+
+    def dijkstra(self, source: int, max_cost: Optional[float] = None, targets: Optional[Iterable[int]] = None,
+                 reverse: bool = False) -> Dict[int, float]:
+        """
+        Travel times in seconds from source to every settled node (to source when reverse=True)
+        Stops once max_cost is exceeded or all targets have been settled
+        """
+        remaining = set(targets) if targets is not None else None
+        costs = {source: 0.0}
+        settled = {}
+        heap = [(0.0, source)]
+        while heap:
+            cost, node = heapq.heappop(heap)
+            if node in settled:
+                continue
+            if max_cost is not None and cost > max_cost:
+                break
+            settled[node] = cost
+            if remaining is not None:
+                remaining.discard(node)
+                if not remaining:
+                    break
+
+            for neighbour, edge in self._neighbours(node, reverse):
+                new_cost = cost + float(self.durations[edge])
+                if new_cost < costs.get(neighbour, float('inf')):
+                    costs[neighbour] = new_cost
+                    heapq.heappush(heap, (new_cost, neighbour))
+        return settled
+
+    def shortest_path(self, source: int, target: int) -> Optional[Tuple[float, List[int]]]:
+        """
+        Bidirectional Dijkstra; returns (seconds, forward edge indices) or None if unreachable
+        """
+        if source == target:
+            return 0.0, []
+
+        costs = ({source: 0.0}, {target: 0.0})
+        parents = ({source: None}, {target: None})
+        settled = (set(), set())
+        heaps = ([(0.0, source)], [(0.0, target)])
+        best = float('inf')
+        meeting = None
+
+        while heaps[0] and heaps[1]:
+            if heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+
+            # Expand the direction with the smaller frontier
+            side = 0 if len(heaps[0]) <= len(heaps[1]) else 1
+            cost, node = heapq.heappop(heaps[side])
+            if node in settled[side]:
+                continue
+            settled[side].add(node)
+
+            for neighbour, edge in self._neighbours(node, reverse=side == 1):
+                new_cost = cost + float(self.durations[edge])
+                if new_cost < costs[side].get(neighbour, float('inf')):
+                    costs[side][neighbour] = new_cost
+                    parents[side][neighbour] = (node, edge)
+                    heapq.heappush(heaps[side], (new_cost, neighbour))
+
+                    other = costs[1 - side].get(neighbour)
+                    if other is not None and new_cost + other < best:
+                        best = new_cost + other
+                        meeting = neighbour
+
+        if meeting is None:
+            return None
+
+        forward = []
+        node = meeting
+        while parents[0][node] is not None:
+            node, edge = parents[0][node]
+            forward.append(edge)
+        forward.reverse()
+
+        node = meeting
+        while parents[1][node] is not None:
+            node, edge = parents[1][node]
+            forward.append(edge)
+        return best, forward
+
+    def path_nodes(self, source: int, edges: List[int]) -> List[int]:
+        nodes = [source]
+        for edge in edges:
+            nodes.append(int(self.targets[edge]))
+        return nodes
+
+def make_grid_graph(rows: int = 20, cols: int = 20, origin: Tuple[float, float] = (40.0, -75.0),
+                    spacing: float = 0.01, speed_kmh: float = 50.0) -> RoadGraph:
+    """
+    Synthetic two-way grid road network, used as an offline fixture for the local routing backend
+    """
+    lat0, lon0 = origin
+    nodes = [[lat0 + r * spacing, lon0 + c * spacing] for r in range(rows) for c in range(cols)]
+    edges = []
+    for r in range(rows):
+        for c in range(cols):
+            node = r * cols + c
+            neighbours = []
+            if c + 1 < cols:
+                neighbours.append(node + 1)
+            if r + 1 < rows:
+                neighbours.append(node + cols)
+            for other in neighbours:
+                meters = float(haversine_distances(*nodes[node], *nodes[other])) * 1000
+                seconds = meters / (speed_kmh / 3.6)
+                edges.append((node, other, seconds, meters))
+                edges.append((other, node, seconds, meters))
+    return RoadGraph.from_edges(nodes, edges)
@@ -0,0 +1,131 @@
+import base64
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from utils import metrics
+from utils.cache import MISSING, TTLCache
+from utils.records import Route
+
+# Endpoints are snapped to this many decimal places (3 ~ 110 m) before building the key
+ROUTE_CACHE_PRECISION = int(os.environ.get('ROUTE_CACHE_PRECISION', '3'))
+ROUTE_CACHE_TTL = float(os.environ.get('ROUTE_CACHE_TTL', str(24 * 3600)))
+ROUTE_CACHE_MAX_BYTES = int(os.environ.get('ROUTE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+ROUTE_CACHE_MAX_ENTRIES = int(os.environ.get('ROUTE_CACHE_MAX_ENTRIES', '10000'))
+# Optional on-disk tier; disabled when empty
+ROUTE_CACHE_DIR = os.environ.get('ROUTE_CACHE_DIR', '')
+
+# A packed route: float32 [lat, lon] pairs plus float32 durations/distances (b'' when absent)
+PackedRoute = Tuple[bytes, bytes, bytes]
+
+def route_cache_key(point1: List[float], point2: List[float], alternatives: bool,
+                    precision: int = ROUTE_CACHE_PRECISION) -> str:
+    """
+    Cache key of a routing request: both endpoints snapped to the configured precision
+    plus the alternatives flag
+    """
+    def snap(point):
+        return f"{round(point[0], precision):.{precision}f},{round(point[1], precision):.{precision}f}"
+    return f"{snap(point1)};{snap(point2)};alt={int(bool(alternatives))}"
+
+def pack_route(route: Route) -> PackedRoute:
+    """
+    Pack a route (as returned by calculate_route_annotated) into float32 byte strings
+    """
+    def pack(values):
+        return b'' if values is None else np.asarray(values, dtype=np.float32).tobytes()
+    return pack(route.coordinates), pack(route.durations), pack(route.distances)
+
+def unpack_route(packed: PackedRoute) -> Route:
+    coordinates, durations, distances = packed
+
+    def unpack(data):
+        return np.frombuffer(data, dtype=np.float32) if data else None
+    return Route(unpack(coordinates), unpack(durations), unpack(distances))
+
+def _packed_size(routes: List[PackedRoute]) -> int:
+    return sum(len(part) for packed in routes for part in packed)
+
+class RouteCache:
+    """
+    Memoizes routing results by quantized endpoints
+    Routes are stored packed; the in-memory LRU is bounded by a byte budget and an optional
+    directory holds a second tier that survives restarts and is shared between workers
+    """
+
+    def __init__(self, max_bytes: int = ROUTE_CACHE_MAX_BYTES, ttl: float = ROUTE_CACHE_TTL,
+                 directory: str = ROUTE_CACHE_DIR):
+        self.ttl = ttl
+        self.directory = directory
+        self.memory = TTLCache(maxsize=ROUTE_CACHE_MAX_ENTRIES, ttl=ttl, max_bytes=max_bytes, sizeof=_packed_size)
+        self.disk_hits = 0
+        self.disk_misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.json')
+
+    def get(self, point1: List[float], point2: List[float], alternatives: bool) -> Optional[List[Route]]:
+        key = route_cache_key(point1, point2, alternatives)
+        packed = self.memory.get(key)
+        if packed is MISSING:
+            entry = self._read_disk(key)
+            if entry is None:
+                return None
+            packed, ttl = entry
+            # Expire from memory together with the file, not a full TTL after this read
+            self.memory.set(key, packed, ttl=ttl)
+        return [unpack_route(route) for route in packed]
+
+    def set(self, point1: List[float], point2: List[float], alternatives: bool, routes: List[Route]) -> None:
+        key = route_cache_key(point1, point2, alternatives)
+        packed = [pack_route(route) for route in routes]
+        self.memory.set(key, packed)
+        self._write_disk(key, packed)
+
+    def _read_disk(self, key: str) -> Optional[Tuple[List[PackedRoute], float]]:
+        """
+        Routes stored on disk for the key and the seconds until they expire, or None
+        """
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            ttl = self.ttl - (time.time() - os.path.getmtime(path))
+            if ttl <= 0:
+                self.disk_misses += 1
+                return None
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            self.disk_misses += 1
+            return None
+
+        self.disk_hits += 1
+        return [tuple(base64.b64decode(part) for part in route) for route in data['routes']], ttl
+
+    def _write_disk(self, key: str, packed: List[PackedRoute]) -> None:
+        if not self.directory:
+            return
+        path = self._path(key)
+        try:
+            # Write to a temporary file first so readers never see a partial entry
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'key': key, 'routes': [[base64.b64encode(part).decode() for part in route] for route in packed]}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing route cache: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'memory': self.memory.stats(),
+            'disk': {'hits': self.disk_hits, 'misses': self.disk_misses, 'enabled': bool(self.directory)}
+        }
+
+route_cache = RouteCache()
+metrics.register_cache('route_memory', route_cache.memory.stats)
+metrics.register_cache('route_disk', lambda: route_cache.stats()['disk'])
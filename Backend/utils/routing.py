@@ -1,106 +1,257 @@
 import numpy as np
-from geopy.distance import geodesic
-import requests
-from typing import List, Tuple, Optional, Dict, Any
+from typing import List, Tuple, Optional, Dict, Any, Union
+from utils import metrics, resilience
+from utils.distance import distance as geo_distance
+from utils.records import Route
+from utils.routing_backends import RoutingError, get_routing_backend
+from utils.route_cache import route_cache, route_cache_key
+from utils.singleflight import SingleFlight
 
-def calculate_midpoint(route: List[List[float]]) -> Optional[List[float]]:
+# Fractions of the route sampled in the first (coarse) midpoint round trip
+MIDPOINT_PERCENTAGES = [0.3, 0.4, 0.45, 0.5, 0.55, 0.6, 0.7]
+# Number of candidates evaluated inside the bracketing interval in each refinement round trip
+MIDPOINT_REFINE_SAMPLES = 16
+# Refinement stops once the time difference at a bracket end is within this many minutes...
+MIDPOINT_TOLERANCE_MINUTES = 0.25
+# ...or the bracket is down to two neighbouring route points, or after this many round trips
+MIDPOINT_MAX_REFINE_ROUNDS = 4
+# Travel times are coalesced for endpoints equal to this many decimal places (~1 m)
+TRAVEL_TIME_KEY_PRECISION = 5
+
+# Concurrent identical requests share one routing call; routes use the route cache key
+_route_flight = SingleFlight('route', cross_process=True)
+_travel_time_flight = SingleFlight('travel_time')
+
+@metrics.timed('calculate_midpoint')
+def calculate_midpoint(route: Union[Route, List[List[float]]], durations: Optional[List[float]] = None) -> Optional[List[float]]:
     """
-    Calculate a meeting point along the actual route that minimizes travel time difference
+    Calculate a meeting point along the actual route that minimizes travel time difference.
+    When the per-segment OSRM durations of the route are given, the exact equal-time point is
+    interpolated locally without any network I/O. Otherwise durations from both endpoints to
+    every candidate come from a single OSRM table request, followed by a bracketing search:
+    each further request samples MIDPOINT_REFINE_SAMPLES points inside the interval where the
+    time difference changes sign (a k-section search, so a route of thousands of points takes
+    two or three round trips rather than a dozen one-point bisection steps) until the
+    difference is within MIDPOINT_TOLERANCE_MINUTES or the interval cannot be split further.
+    A Route brings its own durations; plain lists are wrapped without building per-point objects,
+    and only the sampled candidates are converted to lists.
     """
-    if not route or len(route) < 2:
+    if route is None or len(route) < 2:
         return None
+    route = Route.coerce(route, durations)
 
-    # Try different points along the route to find the most equitable point
-    best_point = None
-    min_time_diff = float('inf')
+    if route.durations is not None:
+        point = _interpolate_equal_time_point(route.coordinates, route.durations)
+        if point:
+            return point
 
-    # Test points at different percentages along the route
-    percentages = [0.3, 0.4, 0.45, 0.5, 0.55, 0.6, 0.7]
+    last = len(route) - 1
+    candidates = sorted({min(int(len(route) * p), last) for p in MIDPOINT_PERCENTAGES})
+    diffs = _travel_time_differences(route.coordinates, candidates)
+    if not diffs:
+        resilience.record_fallback('calculate_midpoint')
+        return route[len(route)//2]
 
-    for p in percentages:
-        index = int(len(route) * p)
-        test_point = route[index]
+    bracket = _find_bracket(diffs)
+    for _ in range(MIDPOINT_MAX_REFINE_ROUNDS):
+        if bracket is None or resilience.expired():
+            break
+        lo, hi = bracket
+        if hi - lo <= 1 or min(abs(diffs[lo]), abs(diffs[hi])) <= MIDPOINT_TOLERANCE_MINUTES:
+            break
 
-        if not test_point:
-            continue
+        if hi - lo - 1 <= MIDPOINT_REFINE_SAMPLES:
+            refine = list(range(lo + 1, hi))
+        else:
+            step = (hi - lo) / (MIDPOINT_REFINE_SAMPLES + 1)
+            refine = sorted({int(round(lo + step * k)) for k in range(1, MIDPOINT_REFINE_SAMPLES + 1)} - {lo, hi})
+        found = _travel_time_differences(route.coordinates, refine)
+        if not found:
+            break
+        diffs.update(found)
+        bracket = _find_bracket(diffs, lo, hi)
 
-        # Calculate travel times from both endpoints to this point
-        time1 = calculate_travel_time(route[0], test_point)
-        time2 = calculate_travel_time(route[-1], test_point)
+    best_index = min(diffs, key=lambda i: abs(diffs[i]))
+    return route[best_index]
+
+def _find_bracket(diffs: Dict[int, float], lo: int = 0, hi: Optional[int] = None) -> Optional[Tuple[int, int]]:
+    """
+    Two neighbouring evaluated indices (within lo..hi) on either side of the equal-time point
+    """
+    evaluated = sorted((i, diff) for i, diff in diffs.items() if lo <= i and (hi is None or i <= hi))
+    for (left, left_diff), (right, right_diff) in zip(evaluated, evaluated[1:]):
+        if left_diff <= 0 <= right_diff or right_diff <= 0 <= left_diff:
+            return left, right
+    return None
 
+def _travel_time_differences(coords: np.ndarray, indices: List[int]) -> Dict[int, float]:
+    """
+    Return {index: time_from_start - time_from_end} for the given route indices,
+    using one OSRM table request. Unreachable candidates are left out.
+    """
+    points = coords[indices].tolist()
+    matrix = calculate_travel_time_matrix([coords[0].tolist(), coords[-1].tolist()], points)
+    if not matrix:
+        return {}
+
+    diffs = {}
+    for column, index in enumerate(indices):
+        time1 = matrix[0][column]
+        time2 = matrix[1][column]
         if time1 is None or time2 is None:
             continue
+        diffs[index] = time1 - time2
+    return diffs
 
-        # Calculate the difference in travel times
-        time_diff = abs(time1 - time2)
+def _interpolate_equal_time_point(route: np.ndarray, durations: np.ndarray) -> Optional[List[float]]:
+    """
+    Find the point where the travel time along the route from both ends is equal,
+    using the cumulative segment durations and a binary search
+    """
+    coords = np.asarray(route, dtype=float)
+    seconds = np.asarray(durations, dtype=float)
+    cumulative = np.concatenate(([0.0], np.cumsum(seconds)))
+    total = cumulative[-1]
+    if not np.isfinite(total) or total <= 0:
+        return None
 
-        # Update best point if this gives more equal times
-        if time_diff < min_time_diff:
-            min_time_diff = time_diff
-            best_point = test_point
+    half = total / 2
+    segment = int(np.searchsorted(cumulative, half, side='right')) - 1
+    segment = min(max(segment, 0), len(seconds) - 1)
 
-    return best_point if best_point else route[len(route)//2]
+    fraction = (half - cumulative[segment]) / seconds[segment] if seconds[segment] > 0 else 0.0
+    point = coords[segment] + fraction * (coords[segment + 1] - coords[segment])
+    return [float(point[0]), float(point[1])]
 
 def calculate_route(point1: List[float], point2: List[float], alternatives: bool = False) -> List[List[List[float]]]:
     """
-    Calculate driving routes between two points using OSRM
+    Calculate driving routes between two points using the configured routing backend
     Returns a list of routes, each containing a list of coordinates
     """
     if not point1 or not point2:
         return [[point1, point2]]  # Return direct route if points are invalid
 
-    # Format coordinates for OSRM
-    coords = f"{point1[1]},{point1[0]};{point2[1]},{point2[0]}"
+    return [route.tolist() for route in calculate_route_annotated(point1, point2, alternatives)]
+
+@metrics.timed('calculate_route')
+def calculate_route_annotated(point1: List[float], point2: List[float], alternatives: bool = False) -> List[Route]:
+    """
+    Calculate driving routes between two points with the configured routing backend (OSRM by default),
+    keeping the per-segment annotations
+    Returns a list of Routes with 'coordinates' (n x 2 array of [lat, lon]), 'durations'
+    (n-1 segment durations in seconds) and 'distances' (n-1 segment distances in meters).
+    The annotation arrays are None for the direct-line fallback route.
+    """
+    if not point1 or not point2:
+        return []
+
+    # Popular city pairs are served from the route cache (endpoints snapped to a grid)
+    cached = route_cache.get(point1, point2, alternatives)
+    if cached:
+        return cached
+
+    try:
+        routes = _route_flight.do(route_cache_key(point1, point2, alternatives),
+                                  lambda: _fetch_routes(point1, point2, alternatives))
+    except resilience.DeadlineExceeded as e:
+        # Another request is still fetching these routes and this one ran out of time waiting
+        print(f"Error calculating route: {str(e)}")
+        resilience.record_fallback('calculate_route')
+        return [_direct_route(point1, point2)]
+    # Routes are immutable, so coalesced callers can share them; each gets its own list
+    return list(routes)
+
+def _fetch_routes(point1: List[float], point2: List[float], alternatives: bool) -> List[Route]:
+    # Another worker process may have just stored the same routes
+    cached = route_cache.get(point1, point2, alternatives)
+    if cached:
+        return cached
 
-    # Call OSRM service
-    url = f"http://router.project-osrm.org/route/v1/driving/{coords}?overview=full&geometries=geojson&alternatives={'true' if alternatives else 'false'}"
     try:
-        response = requests.get(url, timeout=10)
-        data = response.json()
-
-        if data.get("code") == "Ok" and data.get("routes"):
-            routes = []
-            for route in data["routes"]:
-                if "geometry" in route and "coordinates" in route["geometry"]:
-                    # OSRM returns [lon, lat], we need [lat, lon]
-                    coords = [[coord[1], coord[0]] for coord in route["geometry"]["coordinates"]]
-                    routes.append(coords)
-            return routes if routes else [[point1, point2]]
+        routes = get_routing_backend().routes(point1, point2, alternatives)
+        if routes:
+            route_cache.set(point1, point2, alternatives, routes)
+            return routes
     except Exception as e:
         print(f"Error calculating route: {str(e)}")
+        metrics.record_error('calculate_route')
 
-    return [[point1, point2]]  # Fallback to direct route if OSRM fails
+    resilience.record_fallback('calculate_route')
+    return [_direct_route(point1, point2)]  # Fallback to direct route if routing fails
 
+def _direct_route(point1: List[float], point2: List[float]) -> Route:
+    """
+    Straight-line fallback route without annotations
+    """
+    return Route([point1[:2], point2[:2]])
+
+@metrics.timed('calculate_travel_time')
 def calculate_travel_time(point1: List[float], point2: List[float]) -> Optional[float]:
     """
-    Calculate driving time between two points using OSRM
+    Calculate driving time between two points using the configured routing backend
     Returns estimated time in minutes, adjusted for typical driving speeds (10% above limit)
     """
     if not point1 or not point2:
         return None
 
-    coords = f"{point1[1]},{point1[0]};{point2[1]},{point2[0]}"
-    url = f"http://router.project-osrm.org/route/v1/driving/{coords}"
+    key = tuple(round(float(value), TRAVEL_TIME_KEY_PRECISION) for value in (*point1[:2], *point2[:2]))
+    try:
+        return _travel_time_flight.do(key, lambda: _fetch_travel_time(point1, point2))
+    except resilience.DeadlineExceeded as e:
+        print(f"Error calculating travel time: {str(e)}")
+        resilience.record_fallback('calculate_travel_time')
+        return _estimate_travel_time(point1, point2)
 
+def _fetch_travel_time(point1: List[float], point2: List[float]) -> Optional[float]:
     try:
-        response = requests.get(url, timeout=10)
-        data = response.json()
-
-        if data.get("code") == "Ok" and data.get("routes"):
-            # OSRM returns duration in seconds, convert to minutes
-            # Apply 10% reduction to account for driving above speed limit
-            duration_minutes = data["routes"][0]["duration"] / 60
-            adjusted_duration = duration_minutes * 0.91  # Reduce time by ~10%
-            return round(adjusted_duration)
+        # Durations are in seconds, convert to minutes
+        # Apply 10% reduction to account for driving above speed limit
+        duration_minutes = get_routing_backend().duration(point1, point2) / 60
+        adjusted_duration = duration_minutes * 0.91  # Reduce time by ~10%
+        return round(adjusted_duration)
+    except RoutingError as e:
+        # The backend answered but found no route
+        print(f"Error calculating travel time: {str(e)}")
+        metrics.record_error('calculate_travel_time')
+        return None
     except Exception as e:
         print(f"Error calculating travel time: {str(e)}")
-        # Fallback to simple distance-based estimation
-        try:
-            distance = geodesic(point1, point2).kilometers
-            # Assume average speed of 66 km/h (10% above 60 km/h)
-            return round(distance / 66 * 60)  # Convert to minutes
-        except Exception as e:
-            print(f"Error calculating distance: {str(e)}")
-            return None
-
-    return None
\ No newline at end of file
+        metrics.record_error('calculate_travel_time')
+        resilience.record_fallback('calculate_travel_time')
+        return _estimate_travel_time(point1, point2)
+
+def _estimate_travel_time(point1: List[float], point2: List[float]) -> Optional[float]:
+    """
+    Fallback to simple distance-based estimation
+    """
+    try:
+        distance = geo_distance(point1, point2, method='ellipsoidal')
+        # Assume average speed of 66 km/h (10% above 60 km/h)
+        return round(distance / 66 * 60)  # Convert to minutes
+    except Exception as e:
+        print(f"Error calculating distance: {str(e)}")
+        return None
+
+@metrics.timed('calculate_travel_time_matrix')
+def calculate_travel_time_matrix(sources: List[List[float]], destinations: List[List[float]]) -> Optional[List[List[Optional[float]]]]:
+    """
+    Calculate driving times from every source to every destination with one table request
+    to the configured routing backend
+    Returns a len(sources) x len(destinations) matrix in minutes (same adjustment as
+    calculate_travel_time, not rounded); unreachable pairs are None
+    """
+    if not sources or not destinations:
+        return None
+
+    try:
+        durations = get_routing_backend().table(sources, destinations)
+        return [
+            [duration / 60 * 0.91 if duration is not None else None for duration in row]
+            for row in durations
+        ]
+    except Exception as e:
+        print(f"Error calculating travel time matrix: {str(e)}")
+        metrics.record_error('calculate_travel_time_matrix')
+        resilience.mark_degraded('calculate_travel_time_matrix')
+
+    return None
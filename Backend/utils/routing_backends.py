@@ -0,0 +1,176 @@
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+import numpy as np
+from utils import upstream
+from utils.records import Route
+from utils.road_graph import RoadGraph
+
+# "osrm" (public or self-hosted OSRM over HTTP) or "local" (in-process road graph)
+ROUTING_BACKEND = os.environ.get('ROUTING_BACKEND', 'osrm')
+OSRM_BASE_URL = os.environ.get('OSRM_URL', 'http://router.project-osrm.org').rstrip('/')
+# Per-call timeout in seconds; calls made for a request are also cut to its remaining deadline
+OSRM_TIMEOUT = float(os.environ.get('OSRM_TIMEOUT', '10'))
+ROAD_GRAPH_PATH = os.environ.get('ROAD_GRAPH_PATH', '')
+
+class RoutingError(Exception):
+    pass
+
+class RoutingBackend(ABC):
+    """
+    Interface behind calculate_route, calculate_travel_time and calculate_travel_time_matrix
+    All durations are raw seconds; the routing module applies its own adjustments
+    """
+
+    @abstractmethod
+    def routes(self, point1: List[float], point2: List[float], alternatives: bool = False) -> List[Route]:
+        """
+        Routes with their per-segment durations and distances (seconds and meters) when known
+        """
+
+    @abstractmethod
+    def duration(self, point1: List[float], point2: List[float]) -> float:
+        """
+        Driving time in seconds from point1 to point2
+        """
+
+    @abstractmethod
+    def table(self, sources: List[List[float]], destinations: List[List[float]]) -> List[List[Optional[float]]]:
+        """
+        len(sources) x len(destinations) matrix of driving times in seconds, None when unreachable
+        """
+
+class OSRMBackend(RoutingBackend):
+    """
+    OSRM HTTP API, either the public demo server or a self-hosted instance
+    """
+
+    def __init__(self, base_url: str = OSRM_BASE_URL, profile: str = 'driving', timeout: float = OSRM_TIMEOUT):
+        self.base_url = base_url.rstrip('/')
+        self.profile = profile
+        self.timeout = timeout
+
+    def _get(self, service: str, points: List[List[float]], params: str = '') -> Dict[str, Any]:
+        coords = ";".join(f"{point[1]},{point[0]}" for point in points)
+        url = f"{self.base_url}/{service}/v1/{self.profile}/{coords}"
+        if params:
+            url = f"{url}?{params}"
+
+        data = upstream.get(url, timeout=self.timeout).json()
+        if data.get("code") != "Ok":
+            raise RoutingError(f"OSRM {service} request failed: {data.get('code')} {data.get('message', '')}".strip())
+        return data
+
+    def routes(self, point1, point2, alternatives=False):
+        data = self._get(
+            'route', [point1, point2],
+            f"overview=full&geometries=geojson&annotations=duration,distance&alternatives={'true' if alternatives else 'false'}"
+        )
+        return [
+            _parse_osrm_route(route) for route in data.get("routes", [])
+            if "geometry" in route and "coordinates" in route["geometry"]
+        ]
+
+    def duration(self, point1, point2):
+        data = self._get('route', [point1, point2])
+        if not data.get("routes"):
+            raise RoutingError("OSRM returned no route")
+        return data["routes"][0]["duration"]
+
+    def table(self, sources, destinations):
+        points = list(sources) + list(destinations)
+        source_ids = ";".join(str(i) for i in range(len(sources)))
+        destination_ids = ";".join(str(i) for i in range(len(sources), len(points)))
+        data = self._get('table', points, f"sources={source_ids}&destinations={destination_ids}&annotations=duration")
+        if not data.get("durations"):
+            raise RoutingError("OSRM returned no durations")
+        return data["durations"]
+
+def _parse_osrm_route(route: Dict[str, Any]) -> Route:
+    """
+    Convert an OSRM route object into a Route with its annotation arrays
+    """
+    # OSRM returns [lon, lat], we need [lat, lon]
+    coordinates = np.asarray(route["geometry"]["coordinates"], dtype=float).reshape(-1, 2)[:, ::-1].copy()
+
+    durations = []
+    distances = []
+    for leg in route.get("legs", []):
+        annotation = leg.get("annotation", {})
+        durations.extend(annotation.get("duration", []))
+        distances.extend(annotation.get("distance", []))
+
+    # Route drops annotations that do not line up with the geometry segments
+    return Route(coordinates, durations, distances)
+
+class LocalGraphBackend(RoutingBackend):
+    """
+    In-process routing on a preprocessed road graph (see utils.road_graph), no network I/O
+    Points are snapped to the nearest graph node; routes use bidirectional Dijkstra and
+    tables one bounded Dijkstra per source
+    """
+
+    def __init__(self, graph: RoadGraph):
+        self.graph = graph
+
+    @classmethod
+    def from_path(cls, path: str) -> 'LocalGraphBackend':
+        return cls(RoadGraph.load(path))
+
+    def _path(self, point1, point2):
+        source = self.graph.nearest_node(point1[0], point1[1])
+        target = self.graph.nearest_node(point2[0], point2[1])
+        result = self.graph.shortest_path(source, target)
+        if result is None:
+            raise RoutingError("No route found in the local road graph")
+        return source, result
+
+    def routes(self, point1, point2, alternatives=False):
+        # The local engine computes a single (shortest) route; alternatives are not supported
+        source, (_, edges) = self._path(point1, point2)
+        nodes = self.graph.path_nodes(source, edges)
+        return [Route(self.graph.nodes[nodes], self.graph.durations[edges], self.graph.distances[edges])]
+
+    def duration(self, point1, point2):
+        _, (seconds, _) = self._path(point1, point2)
+        return seconds
+
+    def table(self, sources, destinations):
+        targets = [self.graph.nearest_node(point[0], point[1]) for point in destinations]
+        matrix = []
+        for point in sources:
+            source = self.graph.nearest_node(point[0], point[1])
+            settled = self.graph.dijkstra(source, targets=targets)
+            matrix.append([settled.get(target) for target in targets])
+        return matrix
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def create_routing_backend(kind: str = ROUTING_BACKEND) -> RoutingBackend:
+    if kind == 'osrm':
+        return OSRMBackend(OSRM_BASE_URL)
+    if kind == 'local':
+        if not ROAD_GRAPH_PATH:
+            raise RoutingError("ROAD_GRAPH_PATH must be set for the local routing backend")
+        return LocalGraphBackend.from_path(ROAD_GRAPH_PATH)
+    raise RoutingError(f"Unknown routing backend: {kind}")
+
+def get_routing_backend() -> RoutingBackend:
+    """
+    Process-wide routing backend configured by ROUTING_BACKEND / OSRM_URL / ROAD_GRAPH_PATH
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_routing_backend()
+    return _backend
+
+def set_routing_backend(backend: Optional[RoutingBackend]) -> None:
+    """
+    Override the configured backend (None restores the configured default on next use)
+    """
+    global _backend
+    _backend = backend
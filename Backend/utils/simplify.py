@@ -0,0 +1,127 @@
+import heapq
+import math
+from typing import List, Optional, Sequence
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+# Web Mercator ground resolution at the equator for zoom level 0, in meters per pixel
+METERS_PER_PIXEL_Z0 = 156543.03392
+
+def tolerance_for_zoom(zoom: float, lat: float = 0.0, pixels: float = 1.0) -> float:
+    """
+    Simplification tolerance in meters that is invisible at the given map zoom level
+    """
+    return pixels * METERS_PER_PIXEL_Z0 * math.cos(math.radians(lat)) / (2 ** zoom)
+
+def _project(coords: np.ndarray) -> np.ndarray:
+    """
+    Local equirectangular projection of [lat, lon] points to meters
+    """
+    lat0 = math.radians(float(coords[:, 0].mean()))
+    radians = np.radians(coords)
+    return np.column_stack((radians[:, 1] * math.cos(lat0), radians[:, 0])) * EARTH_RADIUS_M
+
+def douglas_peucker_mask(coords: Sequence[Sequence[float]], tolerance_m: float) -> np.ndarray:
+    """
+    Boolean mask of the points kept by Douglas-Peucker simplification
+    Each split evaluates the distances of all points in the range in one vectorized step
+    """
+    points = np.asarray(coords, dtype=float).reshape(-1, 2)
+    keep = np.zeros(len(points), dtype=bool)
+    if len(points) <= 2:
+        keep[:] = True
+        return keep
+
+    xy = _project(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+
+        segment = xy[end] - xy[start]
+        offsets = xy[start + 1:end] - xy[start]
+        length2 = float(segment @ segment)
+        if length2 > 0:
+            t = np.clip(offsets @ segment / length2, 0.0, 1.0)
+            offsets = offsets - t[:, None] * segment
+        distances = np.hypot(offsets[:, 0], offsets[:, 1])
+
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance_m:
+            index = start + 1 + farthest
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return keep
+
+def visvalingam_mask(coords: Sequence[Sequence[float]], min_area_m2: float) -> np.ndarray:
+    """
+    Boolean mask of the points kept by Visvalingam-Whyatt simplification
+    Points are removed smallest effective triangle area first until all remaining areas exceed min_area_m2
+    """
+    points = np.asarray(coords, dtype=float).reshape(-1, 2)
+    keep = np.ones(len(points), dtype=bool)
+    if len(points) <= 2:
+        return keep
+
+    xy = _project(points)
+
+    def area(a, b, c):
+        return abs((xy[b, 0] - xy[a, 0]) * (xy[c, 1] - xy[a, 1]) - (xy[c, 0] - xy[a, 0]) * (xy[b, 1] - xy[a, 1])) / 2
+
+    # Initial areas of every interior point, vectorized
+    a, b, c = xy[:-2], xy[1:-1], xy[2:]
+    areas = np.abs((b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (c[:, 0] - a[:, 0]) * (b[:, 1] - a[:, 1])) / 2
+
+    previous = np.arange(-1, len(points) - 1)
+    following = np.arange(1, len(points) + 1)
+    current = np.full(len(points), np.inf)
+    current[1:-1] = areas
+    heap = [(float(value), i) for i, value in enumerate(areas, start=1)]
+    heapq.heapify(heap)
+
+    while heap:
+        value, index = heapq.heappop(heap)
+        if not keep[index] or value != current[index]:
+            continue  # Stale entry
+        if value >= min_area_m2:
+            break
+
+        keep[index] = False
+        before, after = previous[index], following[index]
+        following[before] = after
+        previous[after] = before
+
+        # Recompute the neighbours; an area never drops below the one just removed
+        for neighbour in (before, after):
+            if 0 < neighbour < len(points) - 1:
+                current[neighbour] = max(area(previous[neighbour], neighbour, following[neighbour]), value)
+                heapq.heappush(heap, (float(current[neighbour]), int(neighbour)))
+    return keep
+
+def simplify_route(route: Sequence[Sequence[float]], zoom: Optional[float] = None, tolerance_m: Optional[float] = None,
+                   method: str = 'douglas-peucker') -> List[List[float]]:
+    """
+    Simplify a [lat, lon] polyline for rendering or storage
+    The tolerance is given in meters or derived from the map zoom level it will be shown at.
+    Only use the result for display or storage; midpoint and cost calculations need the full geometry.
+    """
+    points = np.asarray(route, dtype=float).reshape(-1, 2)
+    if len(points) <= 2:
+        return points.tolist()
+
+    if tolerance_m is None:
+        if zoom is None:
+            raise ValueError("Either zoom or tolerance_m is required")
+        tolerance_m = tolerance_for_zoom(zoom, float(points[:, 0].mean()))
+
+    if method == 'douglas-peucker':
+        keep = douglas_peucker_mask(points, tolerance_m)
+    elif method == 'visvalingam':
+        # A triangle with base 2*tolerance and height tolerance
+        keep = visvalingam_mask(points, tolerance_m ** 2)
+    else:
+        raise ValueError(f"Unknown simplification method: {method}")
+    return points[keep].tolist()
@@ -0,0 +1,239 @@
+import contextlib
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Sequence
+from utils import metrics, resilience
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; coalescing is then per process only
+    fcntl = None
+
+# Directory for the lock files that coalesce calls across worker processes; disabled when empty
+SINGLEFLIGHT_LOCK_DIR = os.environ.get('SINGLEFLIGHT_LOCK_DIR', '')
+# Keys are spread over this many lock files per group, so the directory stays bounded
+SINGLEFLIGHT_LOCK_STRIPES = int(os.environ.get('SINGLEFLIGHT_LOCK_STRIPES', '256'))
+# Longest wait for another process's lock when the caller has no deadline; after it (or the
+# deadline) the call runs without the lock, since it re-checks the shared cache anyway
+SINGLEFLIGHT_LOCK_WAIT_SECONDS = float(os.environ.get('SINGLEFLIGHT_LOCK_WAIT_SECONDS', '30'))
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'degraded')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.degraded = set()
+
+class _Stripe:
+    __slots__ = ('file', 'holders')
+
+    def __init__(self):
+        self.file = None
+        self.holders = 0
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution
+    The first caller (the leader) runs the function; callers arriving while it is in flight
+    wait and receive the same result or exception. Results are not kept afterwards. Waiters wait
+    no longer than their own deadline, whatever the leader's; do() then raises DeadlineExceeded.
+    Stages the leader marks as degraded (fallbacks) are marked in every waiter's request too.
+    With cross_process set and SINGLEFLIGHT_LOCK_DIR configured, leaders in different worker
+    processes also take an exclusive file lock on each key, so the function must re-check a
+    cache shared between processes (database, disk) before calling upstream. Keys share a fixed
+    number of lock files (stripes); threads of one process share a stripe's lock instead of
+    queueing on it, and no caller waits for one beyond its deadline.
+    """
+
+    def __init__(self, name: str, cross_process: bool = False, lock_dir: str = SINGLEFLIGHT_LOCK_DIR):
+        self.name = name
+        self.lock_dir = lock_dir if cross_process and fcntl else ''
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._stripes: Dict[int, _Stripe] = {}
+        self._stripes_changed = threading.Condition()
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            metrics.increment('singleflight_shared_total', 'group', self.name)
+            if not self._wait(call):
+                raise resilience.DeadlineExceeded(f"Request deadline exceeded waiting for {self.name}")
+            for stage in call.degraded:
+                resilience.mark_degraded(stage)
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            with self._process_lock([key]), resilience.track_degraded() as degraded:
+                call.degraded = degraded
+                call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def do_many(self, keys: Sequence[Hashable], fn: Callable[[List[Hashable]], Dict[Hashable, Any]]) -> Dict[Hashable, Any]:
+        """
+        Coalesce a batched lookup key by key
+        Keys already in flight in another call are awaited; the rest are claimed and passed to fn in
+        one call, which returns {key: value} for the keys it could resolve. Returns the values of all
+        keys that were resolved, by this call or the ones it waited for (whose errors are not raised
+        here; their keys are just left out, as are keys still in flight when the deadline runs out).
+        """
+        with self._lock:
+            waiting = {key: self._calls[key] for key in keys if key in self._calls}
+            claimed = [key for key in dict.fromkeys(keys) if key not in waiting]
+            call = _Call()
+            for key in claimed:
+                self._calls[key] = call
+
+        results = {}
+        if claimed:
+            try:
+                with self._process_lock(claimed), resilience.track_degraded() as degraded:
+                    call.degraded = degraded
+                    call.result = fn(claimed)
+                results.update(call.result)
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    for key in claimed:
+                        del self._calls[key]
+                call.done.set()
+
+        for key, other in waiting.items():
+            metrics.increment('singleflight_shared_total', 'group', self.name)
+            if not self._wait(other):
+                continue
+            for stage in other.degraded:
+                resilience.mark_degraded(stage)
+            if other.error is None and key in other.result:
+                results[key] = other.result[key]
+        return results
+
+    def _wait(self, call: _Call) -> bool:
+        """
+        Wait for another caller's call, for at most the time left in the current budget
+        """
+        left = resilience.remaining()
+        if left is None:
+            call.done.wait()
+            return True
+        if call.done.wait(max(left, 0.0)):
+            return True
+        metrics.increment('singleflight_wait_timeouts_total', 'group', self.name)
+        return False
+
+    @contextlib.contextmanager
+    def _process_lock(self, keys: Sequence[Hashable]) -> Iterator[None]:
+        if not self.lock_dir:
+            yield
+            return
+
+        wait = SINGLEFLIGHT_LOCK_WAIT_SECONDS
+        left = resilience.remaining()
+        if left is not None:
+            wait = min(wait, max(left, 0.0))
+        give_up_at = time.monotonic() + wait
+
+        # Always in ascending order, so that callers locking several stripes cannot deadlock
+        held = []
+        for stripe in sorted({self._stripe(key) for key in keys}):
+            if not self._acquire_stripe(stripe, give_up_at):
+                metrics.increment('singleflight_lock_timeouts_total', 'group', self.name)
+                for other in reversed(held):
+                    self._release_stripe(other)
+                held = []
+                break
+            held.append(stripe)
+
+        try:
+            yield
+        finally:
+            for stripe in reversed(held):
+                self._release_stripe(stripe)
+
+    def _stripe(self, key: Hashable) -> int:
+        # Stable across processes, unlike hash()
+        return int(hashlib.sha1(repr(key).encode()).hexdigest(), 16) % SINGLEFLIGHT_LOCK_STRIPES
+
+    def _acquire_stripe(self, stripe: int, give_up_at: float) -> bool:
+        """
+        Hold the stripe's file lock, sharing it with the threads of this process already holding it
+        Returns False when the lock could not be taken by give_up_at
+        """
+        with self._stripes_changed:
+            while True:
+                entry = self._stripes.get(stripe)
+                if entry is None:
+                    entry = self._stripes[stripe] = _Stripe()
+                    break
+                if entry.file is not None:
+                    entry.holders += 1
+                    return True
+                # Another thread of this process is taking the file lock
+                left = give_up_at - time.monotonic()
+                if left <= 0:
+                    return False
+                self._stripes_changed.wait(left)
+
+        lock_file = self._lock_file(stripe, give_up_at)
+        with self._stripes_changed:
+            if lock_file is not None:
+                entry.file = lock_file
+                entry.holders = 1
+            else:
+                del self._stripes[stripe]
+            self._stripes_changed.notify_all()
+        return lock_file is not None
+
+    def _lock_file(self, stripe: int, give_up_at: float):
+        try:
+            lock_file = open(os.path.join(self.lock_dir, f"{self.name}-{stripe}.lock"), 'a')
+        except OSError as e:
+            print(f"Error opening single-flight lock: {str(e)}")
+            return None
+
+        # Polled rather than blocking, so the wait is bounded
+        delay = 0.005
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return lock_file
+            except BlockingIOError:
+                pass
+            left = give_up_at - time.monotonic()
+            if left <= 0:
+                lock_file.close()
+                return None
+            time.sleep(min(delay, left))
+            delay = min(delay * 2, 0.1)
+
+    def _release_stripe(self, stripe: int) -> None:
+        with self._stripes_changed:
+            entry = self._stripes[stripe]
+            entry.holders -= 1
+            if entry.holders:
+                return
+            del self._stripes[stripe]
+        fcntl.flock(entry.file, fcntl.LOCK_UN)
+        entry.file.close()
@@ -0,0 +1,224 @@
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from utils import metrics, resilience
+
+# Defaults for every upstream call; individual calls may override the timeout
+HTTP_TIMEOUT = float(os.environ.get('HTTP_TIMEOUT', '10'))
+HTTP_MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', '2'))
+HTTP_BACKOFF_BASE = float(os.environ.get('HTTP_BACKOFF_BASE', '0.25'))
+HTTP_BACKOFF_MAX = float(os.environ.get('HTTP_BACKOFF_MAX', '4'))
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '16'))
+
+# Maximum time a caller waits for a rate-limit token before giving up
+RATE_LIMIT_WAIT = float(os.environ.get('HTTP_RATE_LIMIT_WAIT', '30'))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Per-host token buckets as (requests per second, burst size).
+# Nominatim's usage policy allows at most 1 request per second.
+HOST_RATE_LIMITS = {
+    'nominatim.openstreetmap.org': (1.0, 1),
+    'router.project-osrm.org': (5.0, 5),
+    'overpass-api.de': (1.0, 2)
+}
+
+class RateLimitExceeded(Exception):
+    pass
+
+class TokenBucket:
+    """
+    Thread-safe token bucket; acquire() blocks until a token is available
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+def _parse_rate_limits(value: str) -> Dict[str, Tuple[float, int]]:
+    """
+    Parse HTTP_RATE_LIMITS, e.g. "osrm.example.com=50:100,overpass-api.de=0.5:1"
+    """
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        host, _, spec = item.partition('=')
+        rate, _, burst = spec.partition(':')
+        limits[host.strip()] = (float(rate), int(burst or 1))
+    return limits
+
+HOST_RATE_LIMITS.update(_parse_rate_limits(os.environ.get('HTTP_RATE_LIMITS', '')))
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+_session = None
+_session_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """
+    Process-wide keep-alive session shared by all upstream clients
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers['User-Agent'] = 'meeting_point_finder'
+                _session = session
+    return _session
+
+def _bucket_for(host: str) -> Optional[TokenBucket]:
+    if host not in HOST_RATE_LIMITS:
+        return None
+    with _buckets_lock:
+        if host not in _buckets:
+            _buckets[host] = TokenBucket(*HOST_RATE_LIMITS[host])
+        return _buckets[host]
+
+def acquire(host: str, timeout: float = RATE_LIMIT_WAIT) -> None:
+    """
+    Wait for the host's rate limiter; raises RateLimitExceeded if no token arrives in time
+    (or before the current request deadline)
+    """
+    bucket = _bucket_for(host)
+    if bucket and not bucket.acquire(resilience.clamp_timeout(timeout, host)):
+        raise RateLimitExceeded(f"Rate limit for {host} exceeded")
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Exponential backoff with full jitter for the given retry attempt (0-based)
+    """
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt)))
+
+def call_with_retries(fn: Callable[[], Any], host: Optional[str] = None, retries: Optional[int] = None,
+                      retry_on: Tuple[type, ...] = (requests.ConnectionError, requests.Timeout)) -> Any:
+    """
+    Call fn, applying the host's rate limit and circuit breaker before every attempt and retrying
+    the given exceptions with exponential backoff and jitter while the request deadline allows
+    fn should bound its own I/O with call_timeout() so that it stays within the deadline
+    """
+    retries = HTTP_MAX_RETRIES if retries is None else retries
+    breaker = resilience.get_breaker(host) if host else None
+    for attempt in range(retries + 1):
+        probe = False
+        if host:
+            breaker.allow(probe=False)
+            acquire(host)
+            probe = breaker.allow()
+        start = time.perf_counter()
+        try:
+            result = fn()
+        except retry_on:
+            if breaker:
+                breaker.record(False)
+            delay = backoff_delay(attempt)
+            if attempt == retries or not resilience.can_wait(delay):
+                raise
+            time.sleep(delay)
+            continue
+        except BaseException:
+            # Not an upstream failure (e.g. the deadline ran out), but the probe slot must not leak
+            if probe:
+                breaker.release()
+            raise
+        if breaker:
+            breaker.record(True, time.perf_counter() - start)
+        return result
+
+def call_timeout(default: float = HTTP_TIMEOUT, host: str = '') -> float:
+    """
+    Timeout for one upstream call: the default, shortened to what is left of the request deadline
+    """
+    return resilience.clamp_timeout(default, host)
+
+def request(method: str, url: str, timeout: Optional[float] = None, retries: Optional[int] = None,
+            **kwargs) -> requests.Response:
+    """
+    Send a request through the shared session with rate limiting, retries and the host's
+    circuit breaker
+    Connection errors, timeouts and retryable statuses (429/5xx) are retried while the request
+    deadline allows; the last response is returned once retries are exhausted.
+    Raises CircuitOpenError while the host's circuit is open and DeadlineExceeded once the
+    deadline has passed, so that callers fall back right away
+    """
+    host = urlsplit(url).hostname or ''
+    retries = HTTP_MAX_RETRIES if retries is None else retries
+    timeout = HTTP_TIMEOUT if timeout is None else timeout
+    session = get_session()
+    breaker = resilience.get_breaker(host)
+
+    for attempt in range(retries + 1):
+        # Rejected calls fail fast; the probe slot is only taken once the local checks have passed
+        breaker.allow(probe=False)
+        acquire(host)
+        attempt_timeout = resilience.clamp_timeout(timeout, host)
+        probe = breaker.allow()
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=attempt_timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            metrics.increment('upstream_errors_total', 'host', host)
+            breaker.record(False)
+            delay = backoff_delay(attempt)
+            if attempt == retries or not resilience.can_wait(delay):
+                raise
+            time.sleep(delay)
+            continue
+        except BaseException:
+            if probe:
+                breaker.release()
+            raise
+        finally:
+            # Time to response headers; streamed bodies are read by the caller
+            metrics.observe('upstream_latency_seconds', 'host', host, time.perf_counter() - start)
+
+        retryable = response.status_code in RETRY_STATUSES
+        breaker.record(not retryable, time.perf_counter() - start)
+        if not retryable or attempt == retries:
+            return response
+
+        delay = backoff_delay(attempt)
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), HTTP_BACKOFF_MAX))
+        if not resilience.can_wait(delay):
+            return response
+
+        metrics.increment('upstream_retries_total', 'host', host)
+        response.close()
+        time.sleep(delay)
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request('GET', url, **kwargs)
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request('POST', url, **kwargs)